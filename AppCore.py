@@ -1,5 +1,6 @@
 # 软件主体
 
+import os
 import sys
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
@@ -12,12 +13,14 @@ from MapScene import MapScene
 from MapView import MapView
 from MapInterfaceDlg import MapInterfaceDlg
 from MapStatusBar import MapStatusBar
+from MapImportanceWidget import MapImportanceWidget
 
 class AppCore(QMainWindow):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         self.mapAttributeWidget = MapAttributeWidget()
+        self.mapImportanceWidget = MapImportanceWidget()
         self.mapView = MapView()
         self.mapScene = MapScene(self.mapAttributeWidget, self.mapView.viewport())
         self.mapView.setScene(self.mapScene)
@@ -29,12 +32,19 @@ class AppCore(QMainWindow):
     def setUI(self) -> None:
         self.addToolBar(self.mapToolBar)
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.mapAttributeWidget)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.mapImportanceWidget)
         self.setCentralWidget(self.mapView)
         self.setStatusBar(self.mapStatusBar)
 
         self.mapToolBar.send.connect(self.mapScene.handle_toolbar_scene)
         self.mapScene.interfaceRequest.connect(self.call_interface_dlg)
         self.mapScene.callStatus.connect(lambda t : self.mapStatusBar.showMessage(t, 2500))
+        self.mapScene.simulationProgress.connect(self.mapStatusBar.showSimulation)
+        self.mapScene.simulationOver.connect(self.mapStatusBar.finishSimulation)
+        self.mapScene.importanceOver.connect(self.mapImportanceWidget.setMeasures)
+        self.mapImportanceWidget.itemRequest.connect(self.mapScene.selectComponent)
+        # 自动保存，启动时恢复上次的场景
+        self.mapScene.enableAutosave(os.path.join(os.path.expanduser('~'), '.suture', 'autosave'))
 
     def contextMenuEvent(self, event : QContextMenuEvent):
         """禁用右键菜单"""
@@ -45,6 +55,17 @@ class AppCore(QMainWindow):
         dlg.exec_()
 
     def closeEvent(self, a0):
+        # 等待后台仿真在当前批次结束后退出
+        thread = self.mapScene.simulationThread
+        if thread is not None:
+            thread.requestInterruption()
+            thread.wait()
+        if self.mapScene.importanceThread is not None:
+            self.mapScene.importanceThread.wait()
+        if self.mapScene.adequacyThread is not None:
+            self.mapScene.adequacyThread.wait()
+        if self.mapScene.journal is not None:
+            self.mapScene.journal.close()
         super().closeEvent(a0)
 
 if __name__ == '__main__':
@@ -0,0 +1,111 @@
+# 元件重要度：Birnbaum重要度、关键重要度、风险增加当量（RAW）
+# 系统性能取每个样本的停气用户数L。同一批样本按元件状态分组求条件期望：
+#   A_i = E[L | 元件i失效]，B_i = E[L | 元件i正常]
+#   Birnbaum  I_B = A_i - B_i
+#   关键重要度 I_C = I_B * q_i / E[L]
+#   RAW       = A_i / E[L]
+# 全部元件一次算完，不需要逐个删除元件重新仿真。
+# 失效率很低时可以传入重要性抽样的偏置失效率（见MonteCarloEngine.cross_entropy_bias），
+# 条件期望按似然比加权自归一化，未抽到失效的元件结果为nan
+
+from typing import Optional, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+from ReliabilityEngine import MonteCarloEngine
+
+# 只含加权和，可以按分片合并
+@dataclass
+class ImportanceMeasures:
+    errorp : np.ndarray  # 元件失效率，元件顺序同MonteCarloEngine.errorp
+    samples : int
+    weightSum : float = 0.0  # Σ w
+    lossSum : float = 0.0  # Σ w·L
+    failWeight : Optional[np.ndarray] = None  # Σ w·x_i
+    failLoss : Optional[np.ndarray] = None  # Σ w·L·x_i
+
+    @classmethod
+    def empty(cls, errorp : np.ndarray) -> 'ImportanceMeasures':
+        C = len(errorp)
+        return cls(errorp=errorp, samples=0, failWeight=np.zeros(C), failLoss=np.zeros(C))
+
+    def merge(self, other : 'ImportanceMeasures') -> 'ImportanceMeasures':
+        return ImportanceMeasures(
+            errorp=self.errorp,
+            samples=self.samples + other.samples,
+            weightSum=self.weightSum + other.weightSum,
+            lossSum=self.lossSum + other.lossSum,
+            failWeight=self.failWeight + other.failWeight,
+            failLoss=self.failLoss + other.failLoss
+        )
+
+    # 平均停气用户数 E[L]
+    @property
+    def expectedLost(self) -> float:
+        return self.lossSum / self.weightSum if self.weightSum else float('nan')
+
+    # E[L | 元件失效]
+    @property
+    def lostIfFailed(self) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.failWeight > 0, self.failLoss / self.failWeight, np.nan)
+
+    # E[L | 元件正常]
+    @property
+    def lostIfWorking(self) -> np.ndarray:
+        work = self.weightSum - self.failWeight
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(work > 0, (self.lossSum - self.failLoss) / work, np.nan)
+
+    @property
+    def birnbaum(self) -> np.ndarray:
+        return self.lostIfFailed - self.lostIfWorking
+
+    @property
+    def criticality(self) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.birnbaum * self.errorp / self.expectedLost
+
+    @property
+    def raw(self) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.lostIfFailed / self.expectedLost
+
+    # 按某个指标从大到小排列的元件下标，nan排在最后
+    def ranking(self, measure : str = 'birnbaum') -> np.ndarray:
+        values = getattr(self, measure)
+        return np.argsort(np.where(np.isnan(values), -np.inf, -values), kind='stable')
+
+class ComponentImportance:
+    def __init__(self, engine : MonteCarloEngine, bias : Optional[Sequence[float]] = None):
+        self.engine = engine
+        self.bias = engine.errorp if bias is None else np.asarray(bias, dtype=np.float64)
+
+    def run_shard(self, seedSeq : np.random.SeedSequence, n : int, batch : int = 1 << 12) -> ImportanceMeasures:
+        rng = np.random.default_rng(seedSeq)
+        C = self.engine.componentCount
+        result = ImportanceMeasures.empty(self.engine.errorp)
+        done = 0
+        while done < n:
+            m = min(batch, n - done)
+            failComp, failSample, out, logw = self.engine._weighted_batch(rng, m, self.bias)
+            w = np.exp(logw)
+            wl = w * out.sum(axis=0)
+            result = result.merge(ImportanceMeasures(
+                errorp=self.engine.errorp,
+                samples=m,
+                weightSum=float(w.sum()),
+                lossSum=float(wl.sum()),
+                failWeight=np.bincount(failComp, weights=w[failSample], minlength=C),
+                failLoss=np.bincount(failComp, weights=wl[failSample], minlength=C)
+            ))
+            done += m
+        return result
+
+    # 分片方式与MonteCarloEngine.run相同，同一seed下结果可复现
+    def run(self, samples : int, seed : Optional[int] | np.random.SeedSequence = None, batch : int = 1 << 12, shardSize : int = 1 << 15) -> ImportanceMeasures:
+        result = ImportanceMeasures.empty(self.engine.errorp)
+        for seedSeq, n in self.engine._shards(samples, seed, shardSize):
+            result = result.merge(self.run_shard(seedSeq, n, batch))
+        return result
@@ -0,0 +1,350 @@
+# 气源到用户的连通性索引
+# 并查集维护当前拓扑的连通分量：加管线是一次合并，删管线只把所在分量标记为脏，
+# 下次查询时只重建这些分量。每个分量按需计算桥和桥树（欧拉序区间），
+# 只有桥或气源失效的查询不需要遍历管网
+
+from typing import Hashable, Iterable
+from dataclasses import dataclass
+from bisect import bisect_left, bisect_right
+
+# 一个连通分量的桥树分析结果
+@dataclass
+class _Analysis:
+    gasTotal : int  # 分量内气源个数
+    block : dict  # 节点 -> 所在的二边连通块
+    bridgeChild : dict  # 桥（管线键） -> 桥树中靠下的那个块
+    tin : list[int]  # 块的先序编号
+    tout : list[int]  # 块的子树区间右端（不含）
+    gasSub : list[int]  # 块子树内的气源个数
+    userTins : list[int]  # 用户所在块的先序编号，升序
+    userKeys : list  # 与userTins对应的用户
+
+class ConnectivityIndex:
+    def __init__(self):
+        self._isGas : dict[Hashable, bool] = {}  # 节点 -> 是否气源
+        self._pipes : dict[Hashable, tuple[Hashable, Hashable]] = {}  # 管线 -> 两端节点
+        self._incident : dict[Hashable, set] = {}  # 节点 -> 相连的管线
+        # 并查集
+        self._parent : dict[Hashable, Hashable] = {}
+        self._members : dict[Hashable, list] = {}  # 根 -> 分量内全部节点
+        self._gasCount : dict[Hashable, int] = {}  # 根 -> 分量内气源个数
+        self._dirty : set = set()  # 删除过管线或节点、需要重建的分量的根
+        self._stale : set = set()  # 已删除但父指针还没清理的节点
+        self._analysis : dict[Hashable, _Analysis] = {}  # 根 -> 桥树分析缓存
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def __contains__(self, key : Hashable) -> bool:
+        return key in self._isGas or key in self._pipes
+
+    # ---------------- 拓扑变更 ----------------
+
+    def add_node(self, node : Hashable, isGas : bool) -> None:
+        if node in self._isGas:
+            return
+        # 重新加入刚删除的节点对象（例如复用的图元）时，先清理还经过它的父指针
+        if node in self._stale:
+            self._flush()
+        self._isGas[node] = bool(isGas)
+        self._incident[node] = set()
+        self._parent[node] = node
+        self._members[node] = [node]
+        self._gasCount[node] = int(bool(isGas))
+
+    def remove_node(self, node : Hashable) -> None:
+        if node not in self._isGas:
+            return
+        for pipe in list(self._incident[node]):
+            self.remove_pipe(pipe)
+        root = self._find(node)
+        self._members[root].remove(node)
+        self._dirty.add(root)
+        self._analysis.pop(root, None)
+        # 其它节点的父指针可能还经过它，等重建时再清理
+        self._stale.add(node)
+        del self._isGas[node], self._incident[node]
+
+    def add_pipe(self, pipe : Hashable, a : Hashable, b : Hashable) -> None:
+        if pipe in self._pipes:
+            return
+        self._pipes[pipe] = (a, b)
+        self._incident[a].add(pipe)
+        self._incident[b].add(pipe)
+        ra, rb = self._find(a), self._find(b)
+        # 同一分量内多一条边会改变桥，不同分量则合并
+        self._analysis.pop(ra, None)
+        self._analysis.pop(rb, None)
+        if ra != rb:
+            self._union(ra, rb)
+
+    def remove_pipe(self, pipe : Hashable) -> None:
+        if pipe not in self._pipes:
+            return
+        a, b = self._pipes.pop(pipe)
+        self._incident[a].discard(pipe)
+        self._incident[b].discard(pipe)
+        root = self._find(a)
+        self._dirty.add(root)
+        self._analysis.pop(root, None)
+
+    # ---------------- 并查集 ----------------
+
+    def _find(self, node : Hashable) -> Hashable:
+        parent = self._parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    # 小分量并入大分量，成员列表一起搬过去
+    def _union(self, ra : Hashable, rb : Hashable) -> Hashable:
+        if len(self._members[ra]) < len(self._members[rb]):
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        self._members[ra].extend(self._members.pop(rb))
+        self._gasCount[ra] += self._gasCount.pop(rb)
+        if rb in self._dirty:
+            self._dirty.discard(rb)
+            self._dirty.add(ra)
+        self._analysis.pop(ra, None)
+        return ra
+
+    # 批量重建被删除操作影响的分量，其它分量保持不动
+    def _flush(self) -> None:
+        if not self._dirty:
+            return
+        groups = [self._members.pop(root) for root in self._dirty]
+        for root in self._dirty:
+            self._gasCount.pop(root)
+        self._dirty.clear()
+        for nodes in groups:
+            for n in nodes:
+                self._parent[n] = n
+                self._members[n] = [n]
+                self._gasCount[n] = int(self._isGas[n])
+        for n in self._stale:
+            self._parent.pop(n, None)
+        self._stale.clear()
+        for nodes in groups:
+            for n in nodes:
+                for pipe in self._incident[n]:
+                    a, b = self._pipes[pipe]
+                    ra, rb = self._find(a), self._find(b)
+                    if ra != rb:
+                        self._union(ra, rb)
+
+    # ---------------- 桥树 ----------------
+
+    def _analyze(self, root : Hashable) -> _Analysis:
+        if root in self._analysis:
+            return self._analysis[root]
+        nodes = self._members[root]
+        # 迭代版Tarjan求桥，按管线键跳过来时的边以正确处理重边
+        order : dict[Hashable, int] = {}
+        low : dict[Hashable, int] = {}
+        bridges : set = set()
+        start = nodes[0]
+        order[start] = low[start] = 0
+        stack = [(start, None, iter(self._incident[start]))]
+        while stack:
+            u, inPipe, it = stack[-1]
+            advanced = False
+            for pipe in it:
+                if pipe == inPipe:
+                    continue
+                a, b = self._pipes[pipe]
+                v = b if a == u else a
+                if v not in order:
+                    order[v] = low[v] = len(order)
+                    stack.append((v, pipe, iter(self._incident[v])))
+                    advanced = True
+                    break
+                low[u] = min(low[u], order[v])
+            if not advanced:
+                stack.pop()
+                if stack:
+                    p = stack[-1][0]
+                    low[p] = min(low[p], low[u])
+                    if low[u] > order[p]:
+                        bridges.add(inPipe)
+        # 去掉桥之后的连通块即二边连通块
+        block : dict[Hashable, int] = {}
+        blockGas : list[int] = []
+        for n in nodes:
+            if n in block:
+                continue
+            b = len(blockGas)
+            block[n] = b
+            blockGas.append(0)
+            todo = [n]
+            while todo:
+                u = todo.pop()
+                blockGas[b] += int(self._isGas[u])
+                for pipe in self._incident[u]:
+                    if pipe in bridges:
+                        continue
+                    a, c = self._pipes[pipe]
+                    v = c if a == u else a
+                    if v not in block:
+                        block[v] = b
+                        todo.append(v)
+        # 桥树的先序编号与子树气源数
+        treeAdj : list[list[tuple[int, Hashable]]] = [[] for _ in blockGas]
+        for pipe in bridges:
+            a, c = self._pipes[pipe]
+            treeAdj[block[a]].append((block[c], pipe))
+            treeAdj[block[c]].append((block[a], pipe))
+        count = len(blockGas)
+        tin, tout, gasSub = [0] * count, [0] * count, list(blockGas)
+        bridgeChild : dict[Hashable, int] = {}
+        visited = [False] * count
+        visited[0] = True
+        clock = 1
+        stack2 = [(0, iter(treeAdj[0]))]
+        while stack2:
+            b, it = stack2[-1]
+            for c, pipe in it:
+                if not visited[c]:
+                    visited[c] = True
+                    bridgeChild[pipe] = c
+                    tin[c] = clock
+                    clock += 1
+                    stack2.append((c, iter(treeAdj[c])))
+                    break
+            else:
+                stack2.pop()
+                tout[b] = clock
+                if stack2:
+                    gasSub[stack2[-1][0]] += gasSub[b]
+        users = sorted((tin[block[n]], i) for i, n in enumerate(nodes) if not self._isGas[n])
+        analysis = _Analysis(
+            gasTotal=self._gasCount[root],
+            block=block,
+            bridgeChild=bridgeChild,
+            tin=tin,
+            tout=tout,
+            gasSub=gasSub,
+            userTins=[t for t, _ in users],
+            userKeys=[nodes[i] for _, i in users]
+        )
+        self._analysis[root] = analysis
+        return analysis
+
+    # ---------------- 查询 ----------------
+
+    def is_gas(self, node : Hashable) -> bool:
+        return self._isGas[node]
+
+    def endpoints(self, pipe : Hashable) -> tuple[Hashable, Hashable]:
+        return self._pipes[pipe]
+
+    # 全部连通分量（节点列表）
+    def components(self) -> list[list]:
+        self._flush()
+        return [list(nodes) for nodes in self._members.values()]
+
+    # 节点所在的连通分量：(节点列表, 管线集合)
+    def component(self, node : Hashable) -> tuple[list, set]:
+        self._flush()
+        nodes = list(self._members[self._find(node)])
+        pipes = set()
+        for n in nodes:
+            pipes.update(self._incident[n])
+        return nodes, pipes
+
+    # 完好管网下用户是否有气
+    def is_supplied(self, user : Hashable) -> bool:
+        self._flush()
+        return self._gasCount[self._find(user)] > 0
+
+    # 完好管网下没有气的用户
+    def unsupplied_users(self) -> set:
+        self._flush()
+        return {n for n, gas in self._isGas.items() if not gas and not self._gasCount[self._find(n)]}
+
+    # 管线集合S（以及气源集合）失效后，原本有气、此时失去全部气源的用户
+    def lost_users(self, failedPipes : Iterable[Hashable] = (), failedGas : Iterable[Hashable] = ()) -> set:
+        self._flush()
+        byRoot : dict[Hashable, tuple[list, list]] = {}
+        for pipe in failedPipes:
+            if pipe in self._pipes:
+                byRoot.setdefault(self._find(self._pipes[pipe][0]), ([], []))[0].append(pipe)
+        for gas in failedGas:
+            if self._isGas.get(gas):
+                byRoot.setdefault(self._find(gas), ([], []))[1].append(gas)
+        lost = set()
+        for root, (pipes, gases) in byRoot.items():
+            if not self._gasCount[root]:
+                continue
+            analysis = self._analyze(root)
+            if all(p in analysis.bridgeChild for p in pipes):
+                lost.update(self._lost_on_tree(analysis, pipes, gases))
+            else:
+                lost.update(self._lost_by_rebuild(root, set(pipes), set(gases)))
+        return lost
+
+    # 只有桥失效：桥树被切成若干片，按欧拉序区间的嵌套关系统计每片剩余的气源
+    @staticmethod
+    def _lost_on_tree(analysis : _Analysis, pipes : list, gases : list) -> list:
+        tin, tout = analysis.tin, analysis.tout
+        cuts = sorted({analysis.bridgeChild[p] for p in pipes}, key=lambda c: tin[c])
+        ROOT = -1
+        parent : dict[int, int] = {}
+        gas : dict[int, int] = {ROOT: analysis.gasTotal}
+        stack : list[int] = []
+        for c in cuts:
+            while stack and tout[stack[-1]] <= tin[c]:
+                stack.pop()
+            parent[c] = stack[-1] if stack else ROOT
+            gas[c] = analysis.gasSub[c]
+            gas[parent[c]] -= analysis.gasSub[c]
+            stack.append(c)
+        cutTins = [tin[c] for c in cuts]
+        for g in gases:
+            t = tin[analysis.block[g]]
+            i = bisect_right(cutTins, t) - 1
+            piece = cuts[i] if i >= 0 else ROOT
+            while piece != ROOT and tout[piece] <= t:
+                piece = parent[piece]
+            gas[piece] -= 1
+        # 没有气源的片中的用户 = 片的区间减去嵌套在里面的下一级片
+        children : dict[int, list[int]] = {}
+        for c in cuts:
+            children.setdefault(parent[c], []).append(c)
+        span = lambda lo, hi: (bisect_left(analysis.userTins, lo), bisect_left(analysis.userTins, hi))
+        lost = []
+        for piece, left in gas.items():
+            if left > 0:
+                continue
+            lo, hi = (0, len(analysis.userTins)) if piece == ROOT else span(tin[piece], tout[piece])
+            for c in children.get(piece, []):
+                clo, chi = span(tin[c], tout[c])
+                lost.extend(analysis.userKeys[lo:clo])
+                lo = chi
+            lost.extend(analysis.userKeys[lo:hi])
+        return lost
+
+    # 有非桥管线失效：只在受影响的分量内部重新做一次并查集
+    def _lost_by_rebuild(self, root : Hashable, pipes : set, gases : set) -> list:
+        nodes = self._members[root]
+        parent = {n: n for n in nodes}
+
+        def find(n):
+            while parent[n] != n:
+                parent[n] = parent[parent[n]]
+                n = parent[n]
+            return n
+
+        for n in nodes:
+            for pipe in self._incident[n]:
+                if pipe in pipes:
+                    continue
+                a, b = self._pipes[pipe]
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[ra] = rb
+        alive = {find(n) for n in nodes if self._isGas[n] and n not in gases}
+        return [n for n in nodes if not self._isGas[n] and find(n) not in alive]
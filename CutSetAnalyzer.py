@@ -0,0 +1,282 @@
+# 最小割集与解析法供气不可用度
+# 失效率很低时抽样几乎全部浪费在无失效的场景上，这里直接枚举用户与全部气源之间的最小割集：
+# 在图上加一个超级源点S，S到每个气源连一条虚边代表气源失效，于是气源和管线都是"边"，
+# 一阶割集就是把S和用户分开的桥，k阶割集在路径经过的2-边连通块内去掉k-1条边后再求桥得到。
+# 割集只与拓扑有关，按连通分量的拓扑签名缓存；失效率在求值时才读取
+
+from typing import Hashable, Callable, Optional
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from itertools import combinations
+
+from ConnectivityIndex import ConnectivityIndex
+
+@dataclass
+class Unavailability:
+    estimate : float  # 已枚举割集的并的概率（割集少时精确，否则为Esary-Proschan上界）
+    lower : float  # 真值下界（Bonferroni）
+    upper : float  # 真值上界，包含未枚举的高阶割集的截断误差
+    exact : bool  # estimate是否为已枚举割集并的精确值
+    cutSets : list = field(default_factory=list)  # 最小割集，元素为管线或气源的键
+
+# 一个连通分量内部的割集枚举
+class _ComponentCuts:
+    def __init__(self, index : ConnectivityIndex, nodes : list, pipes : set):
+        self.nodes = nodes
+        local = {n: i for i, n in enumerate(nodes)}
+        S = len(nodes)
+        # 边：管线 + 气源虚边（S -> 气源）
+        self.keys : list[Hashable] = []
+        ends : list[tuple[int, int]] = []
+        for pipe in pipes:
+            a, b = index.endpoints(pipe)
+            self.keys.append(pipe)
+            ends.append((local[a], local[b]))
+        for n in nodes:
+            if index.is_gas(n):
+                self.keys.append(n)
+                ends.append((S, local[n]))
+        self.ends = ends
+        self.adjacency : list[list[tuple[int, int]]] = [[] for _ in range(S + 1)]
+        for e, (a, b) in enumerate(ends):
+            self.adjacency[a].append((b, e))
+            self.adjacency[b].append((a, e))
+        self.S = S
+        self.users = [i for i, n in enumerate(nodes) if not index.is_gas(n)]
+
+    # 从root出发、不经过removed中的边（edges不为None时只走其中的边）做DFS，
+    # 返回 到达的顶点 -> root到它的树路径上的桥（从root往下的顺序）
+    def _bridge_paths(self, root : int, removed : frozenset, edges : Optional[set] = None) -> dict[int, list[int]]:
+        adjacency = self.adjacency
+        order = {root: 0}
+        low = {root: 0}
+        children : dict[int, list[tuple[int, int]]] = {}
+        bridges = set()
+        stack = [(root, -1, iter(adjacency[root]))]
+        while stack:
+            u, inEdge, it = stack[-1]
+            advanced = False
+            for v, e in it:
+                if e == inEdge or e in removed or (edges is not None and e not in edges):
+                    continue
+                if v not in order:
+                    order[v] = low[v] = len(order)
+                    children.setdefault(u, []).append((v, e))
+                    stack.append((v, e, iter(adjacency[v])))
+                    advanced = True
+                    break
+                low[u] = min(low[u], order[v])
+            if not advanced:
+                stack.pop()
+                if stack:
+                    p = stack[-1][0]
+                    low[p] = min(low[p], low[u])
+                    if low[u] > order[p]:
+                        bridges.add(inEdge)
+        # 沿DFS树往下走，记录路径上的桥
+        result : dict[int, list[int]] = {}
+        walk = [(root, ())]
+        while walk:
+            u, path = walk.pop()
+            result[u] = list(path)
+            for v, e in children.get(u, []):
+                walk.append((v, path + (e,) if e in bridges else path))
+        return result
+
+    # 枚举到maxOrder阶的全部最小割集
+    # 去掉桥后剩下的2-边连通块在S一侧只有一个入口，S到用户的路径依次经过若干块：
+    # 一阶割集是路径上的桥，高阶割集都落在某一个块内部，是把该块的入口与出口分开的边集，
+    # 所以高阶割集只在路径经过的块内枚举，每个块只算一次，不必在整个连通分量上组合
+    # 返回 (用户 -> 割集列表, 用户 -> 路径经过的各块的边集合)，割集与块都是边下标的frozenset
+    def enumerate(self, maxOrder : int) -> tuple[dict[Hashable, list[frozenset]], dict[Hashable, list[frozenset]]]:
+        S = self.S
+        paths = self._bridge_paths(S, frozenset())
+        bridges = {e for path in paths.values() for e in path}
+        # 各顶点所在块的入口；块经桥进入，第一个到达的顶点就是入口
+        entry = {S: S}
+        blockEdges : dict[int, set] = {S: set()}
+        stack = [S]
+        while stack:
+            u = stack.pop()
+            for v, e in self.adjacency[u]:
+                if e in bridges:
+                    if v not in entry:
+                        entry[v] = v
+                        blockEdges[v] = set()
+                        stack.append(v)
+                else:
+                    blockEdges[entry[u]].add(e)
+                    if v not in entry:
+                        entry[v] = entry[u]
+                        stack.append(v)
+        blockCuts : dict[int, dict[int, set[frozenset]]] = {}
+        cuts, blocks = {}, {}
+        for u in self.users:
+            if u not in paths:
+                continue
+            found = {frozenset((e,)) for e in paths[u]}
+            # 路径按块切成 (入口, 出口) 段：桥靠近S的一端是上一块的出口，另一端是下一块的入口
+            segments, cur = [], S
+            for e in paths[u]:
+                a, b = self.ends[e]
+                near, far = (a, b) if len(paths[a]) < len(paths[b]) else (b, a)
+                segments.append((cur, near))
+                cur = far
+            segments.append((cur, u))
+            blocks[self.nodes[u]] = []
+            for start, end in segments:
+                if start == end:
+                    continue
+                if start not in blockCuts:
+                    blockCuts[start] = self._block_cuts(start, blockEdges[start], maxOrder)
+                found.update(blockCuts[start].get(end, ()))
+                blocks[self.nodes[u]].append(frozenset(blockEdges[start]))
+            cuts[self.nodes[u]] = sorted(found, key=lambda c: (len(c), sorted(c)))
+        return cuts, blocks
+
+    # 块内从入口到每个顶点的2..maxOrder阶最小割集：去掉k-1条边后再求桥；块内没有一阶割集
+    def _block_cuts(self, entry : int, edges : set, maxOrder : int) -> dict[int, set[frozenset]]:
+        known : dict[int, set[frozenset]] = {}
+        for k in range(2, maxOrder + 1):
+            found : dict[int, set[frozenset]] = {}
+            for removed in combinations(sorted(edges), k - 1):
+                removed = frozenset(removed)
+                for v, path in self._bridge_paths(entry, removed, edges).items():
+                    for e in path:
+                        cut = removed | {e}
+                        if not self._contains_known(cut, known.get(v, set())):
+                            found.setdefault(v, set()).add(cut)
+            for v, cut in found.items():
+                known.setdefault(v, set()).update(cut)
+        return known
+
+    # 最小性检查：已知的低阶割集都不能是它的子集
+    @staticmethod
+    def _contains_known(cut : frozenset, known : set) -> bool:
+        for size in range(1, len(cut)):
+            for sub in combinations(cut, size):
+                if frozenset(sub) in known:
+                    return True
+        return False
+
+class CutSetAnalyzer:
+    def __init__(
+        self,
+        index : ConnectivityIndex,
+        errorp : Callable[[Hashable], float],
+        maxOrder : int = 2,
+        exactLimit : int = 12,
+        cacheSize : int = 256
+    ):
+        self.index = index
+        self.errorp = errorp  # 管线或气源的键 -> 失效率
+        self.maxOrder = maxOrder
+        self.exactLimit = exactLimit  # 割集数不超过它时用容斥原理精确求并
+        self.cacheSize = cacheSize
+        # 拓扑签名 -> (用户 -> 割集, 用户 -> 路径经过的各块的元件)
+        self._cache : OrderedDict[tuple, tuple[dict, dict]] = OrderedDict()
+
+    # 连通分量的拓扑签名：管线集合、气源集合，以及枚举阶数
+    def _signature(self, nodes : list, pipes : set) -> tuple:
+        return frozenset(pipes), frozenset(n for n in nodes if self.index.is_gas(n)), frozenset(nodes), self.maxOrder
+
+    def _component_cuts(self, nodes : list, pipes : set) -> tuple[dict, dict]:
+        key = self._signature(nodes, pipes)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        comp = _ComponentCuts(self.index, nodes, pipes)
+        found, paths = comp.enumerate(self.maxOrder)
+        cuts = {user: [frozenset(comp.keys[e] for e in cut) for cut in c] for user, c in found.items()}
+        # 同一个块被许多用户的路径经过，只转换一次
+        keyed : dict[frozenset, frozenset] = {}
+        blocks = {
+            user: [keyed.setdefault(b, frozenset(comp.keys[e] for e in b)) for b in bs]
+            for user, bs in paths.items()
+        }
+        # 两端都是气源或者没有用户的分量也缓存，避免重复构建
+        self._cache[key] = cuts, blocks
+        while len(self._cache) > self.cacheSize:
+            self._cache.popitem(last=False)
+        return cuts, blocks
+
+    def cut_sets(self, user : Hashable) -> list[frozenset]:
+        return self._component_cuts(*self.index.component(user))[0].get(user, [])
+
+    def _prob(self, elements) -> float:
+        p = 1.0
+        for key in elements:
+            p *= self.errorp(key)
+        return p
+
+    # 单个用户的供气不可用度
+    def unavailability(self, user : Hashable) -> Unavailability:
+        return self._unavailability(user, *self.index.component(user))
+
+    # 全部用户，每个连通分量只取一次
+    def analyze_all(self) -> dict[Hashable, Unavailability]:
+        result = {}
+        for nodes in self.index.components():
+            nodes, pipes = self.index.component(nodes[0])
+            for n in nodes:
+                if not self.index.is_gas(n):
+                    result[n] = self._unavailability(n, nodes, pipes)
+        return result
+
+    def _unavailability(self, user : Hashable, nodes : list, pipes : set) -> Unavailability:
+        found, blocks = self._component_cuts(nodes, pipes)
+        cuts = found.get(user, [])
+        gas = [n for n in nodes if self.index.is_gas(n)]
+        if not gas:
+            return Unavailability(1.0, 1.0, 1.0, True, cuts)
+        probs = [self._prob(c) for c in cuts]
+        exact = len(cuts) <= self.exactLimit
+        if exact:
+            estimate = self._inclusion_exclusion(cuts)
+        else:
+            # Esary-Proschan：独立元件的最小割集事件正相关，乘积形式给出上界
+            estimate = 1.0
+            for p in probs:
+                estimate *= 1.0 - p
+            estimate = 1.0 - estimate
+        if exact:
+            # 已枚举割集的并本身就是真值的下界
+            lower = estimate
+        else:
+            # Bonferroni下界 S1 - S2，与最大单个割集取大
+            lower = max(probs, default=0.0)
+            if len(cuts) <= 2000:
+                s2 = sum(self._prob(a | b) for a, b in combinations(cuts, 2))
+                lower = max(lower, sum(probs) - s2)
+        # 未枚举的割集落在路径经过的某一个块内，且至少有maxOrder+1个元件同时失效
+        truncation = sum(self._at_least(list(block), self.maxOrder + 1) for block in blocks.get(user, []))
+        upper = min(1.0, estimate + truncation)
+        return Unavailability(estimate, min(lower, upper), upper, exact, cuts)
+
+    # 容斥原理：P(∪C) = Σ(-1)^(|T|+1) P(∩_{C∈T} C)
+    def _inclusion_exclusion(self, cuts : list[frozenset]) -> float:
+        total = 0.0
+        # 按子集递推，同时记录并集，避免重复计算
+        terms : list[tuple[frozenset, int]] = []
+        for cut in cuts:
+            new = [(cut, 1)]
+            for union, sign in terms:
+                new.append((union | cut, -sign))
+            terms.extend(new)
+        for union, sign in terms:
+            total += sign * self._prob(union)
+        return total
+
+    # 元件集合中至少k个同时失效的概率上界：k阶初等对称多项式
+    def _at_least(self, keys : list, k : int) -> float:
+        if len(keys) < k:
+            return 0.0
+        e = [1.0] + [0.0] * k
+        for key in keys:
+            q = self.errorp(key)
+            for j in range(k, 0, -1):
+                e[j] += e[j - 1] * q
+        return min(1.0, e[k])
+
+    def clear(self) -> None:
+        self._cache.clear()
@@ -0,0 +1,209 @@
+# 自动保存：追加写的编辑日志 + 定期压缩成完整的mj5快照
+# 场景的每次修改记录为一行JSON，由后台线程批量追加写入，自动保存的开销只与编辑次数有关。
+# 压缩时在GUI线程取得只读快照，与日志记录排在同一个队列里交给后台线程：快照原子写入后再清空日志。
+# 每条记录带递增序号，快照记下已包含的最大序号，恢复时跳过序号不大于它的记录，
+# 因此即使在快照写完、日志尚未清空时崩溃也不会重复回放
+
+import os
+import json
+import queue
+from typing import Optional, Any
+
+from PyQt5.QtCore import *
+
+from NetworkModel import NetworkModel, read_mj5
+
+# 后台写线程，队列中的任务：('op', 记录) / ('compact', 快照, 序号) / ('stop',)
+class _JournalWriter(QThread):
+    failed = pyqtSignal(str)
+
+    def __init__(self, journalPath : str, snapshotPath : str, parent : Optional[QObject] = None):
+        super().__init__(parent)
+        self.journalPath = journalPath
+        self.snapshotPath = snapshotPath
+        self.queue : queue.Queue = queue.Queue()
+
+    def run(self) -> None:
+        f = None
+        try:
+            f = open(self.journalPath, 'a', encoding='utf-8')
+            while True:
+                # 一次取空队列，整批写入后只flush一次
+                tasks = [self.queue.get()]
+                while True:
+                    try:
+                        tasks.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                for task in tasks:
+                    if task[0] == 'op':
+                        f.write(json.dumps(task[1], ensure_ascii=False))
+                        f.write('\n')
+                    elif task[0] == 'compact':
+                        f.flush()
+                        task[1].to_file(self.snapshotPath, meta={'journalSeq': task[2]})
+                        f.close()
+                        f = open(self.journalPath, 'w', encoding='utf-8')
+                    else:
+                        return
+                f.flush()
+        except Exception as e:
+            # 磁盘写满、快照无法序列化等任何错误都要报告，线程随即退出
+            self.failed.emit(f'{type(e).__name__}: {e}')
+        finally:
+            if f is not None:
+                f.close()
+
+class EditJournal(QObject):
+    failed = pyqtSignal(str)  # 后台写入失败，日志已停用
+
+    # compactEvery：日志累计这么多条记录后压缩；interval：定时刷新拖动坐标、检查是否需要压缩（毫秒）
+    def __init__(self, bind_scene : 'MapScene', directory : str, compactEvery : int = 20000, interval : int = 2000):
+        super().__init__(bind_scene)
+        self.bind_scene = bind_scene
+        self.directory = directory
+        self.snapshotPath = os.path.join(directory, 'autosave.mj5')
+        self.journalPath = os.path.join(directory, 'autosave.journal')
+        self.compactEvery = compactEvery
+        self.seq = 0
+        self.pending = 0  # 上次压缩以来的记录数
+        # 拖动节点时moveEvent非常频繁，同一节点的坐标只保留最后一次，写其他记录前或定时写出
+        self.pendingMoves : dict[int, tuple[float, float]] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        # 写线程失败后停用日志，之后的记录直接丢弃，不再堆积在无人读取的队列里
+        self.active = True
+        self.writer = _JournalWriter(self.journalPath, self.snapshotPath, self)
+        self.writer.failed.connect(self._writerFailed)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(interval)
+
+    def start(self) -> None:
+        self.writer.start()
+
+    def _writerFailed(self, message : str) -> None:
+        self.active = False
+        self.timer.stop()
+        self.pendingMoves.clear()
+        self.writer.queue = queue.Queue()
+        self.failed.emit(message)
+
+    # 追加一条记录（GUI线程调用，只入队）
+    def record(self, op : str, **fields : Any) -> None:
+        if not self.active:
+            return
+        self._flush_moves()
+        self._put(op, fields)
+
+    def record_move(self, nodeId : int, x : float, y : float) -> None:
+        if self.active:
+            self.pendingMoves[nodeId] = (x, y)
+
+    def _put(self, op : str, fields : dict) -> None:
+        self.seq += 1
+        self.pending += 1
+        self.writer.queue.put(('op', {'seq': self.seq, 'op': op, **fields}))
+
+    def _flush_moves(self) -> None:
+        moves, self.pendingMoves = self.pendingMoves, {}
+        for nodeId, (x, y) in moves.items():
+            self._put('moveNode', {'id': nodeId, 'x': x, 'y': y})
+
+    def tick(self) -> None:
+        self._flush_moves()
+        if self.pending >= self.compactEvery:
+            self.compact()
+
+    # 在GUI线程取快照，交给后台线程写出
+    def compact(self) -> None:
+        if not self.active:
+            return
+        self._flush_moves()
+        model = NetworkModel.from_scene(self.bind_scene).freeze()
+        self.writer.queue.put(('compact', model, self.seq))
+        self.pending = 0
+
+    # 写出剩余记录并等待后台线程结束
+    def close(self) -> None:
+        self.timer.stop()
+        if self.active:
+            self._flush_moves()
+            self.writer.queue.put(('stop',))
+        self.active = False
+        self.writer.wait()
+
+    # 无法恢复的自动保存数据改名为*.bad留作排查，之后从空场景重新开始记录
+    # 只能在start之前调用：恢复失败时排队的记录和快照（半途载入的场景）一并丢弃
+    def quarantine(self) -> list[str]:
+        self.writer.queue = queue.Queue()
+        self.pendingMoves.clear()
+        self.pending = 0
+        moved = []
+        for path in (self.snapshotPath, self.journalPath):
+            if os.path.exists(path):
+                os.replace(path, path + '.bad')
+                moved.append(path + '.bad')
+        self.seq = 0
+        return moved
+
+    def exists(self) -> bool:
+        return os.path.exists(self.snapshotPath) or os.path.exists(self.journalPath)
+
+    # 读取快照并回放日志，得到mj5结构；回放在字典上进行，最后由场景一次性批量插入
+    def restore(self) -> dict[str, Any]:
+        data = read_mj5(self.snapshotPath) if os.path.exists(self.snapshotPath) else {'nodes': [], 'pipes': []}
+        base = data.get('journalSeq', 0)
+        nodes = {node['id']: node for node in data['nodes']}
+        pipes = {frozenset((pipe['a'], pipe['b'])): pipe for pipe in data['pipes']}
+        last = base
+        if os.path.exists(self.journalPath):
+            with open(self.journalPath, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 崩溃时最后一行可能只写了一半
+                        break
+                    # 缺少序号的记录无法判断是否已包含在快照中，跳过
+                    seq = entry.get('seq') if isinstance(entry, dict) else None
+                    if not isinstance(seq, int) or seq <= base:
+                        continue
+                    try:
+                        self._apply(entry, nodes, pipes)
+                    except (KeyError, TypeError, ValueError):
+                        # 字段不全的记录跳过，不影响其余记录的回放
+                        pass
+                    last = max(last, seq)
+        self.seq = last
+        return {'version': data.get('version', '1.0.0'), 'nodes': list(nodes.values()), 'pipes': list(pipes.values())}
+
+    # 回放一条记录；引用的节点或管线已不存在（例如对应的删除先被压缩进了快照）时忽略
+    @staticmethod
+    def _apply(entry : dict, nodes : dict, pipes : dict) -> None:
+        op = entry['op']
+        if op == 'addNode':
+            nodes[entry['id']] = {k: entry[k] for k in ('id', 'x', 'y', 'category', 'current', 'errorp') if k in entry}
+        elif op == 'moveNode':
+            node = nodes.get(entry['id'])
+            if node is not None:
+                node['x'], node['y'] = entry['x'], entry['y']
+        elif op == 'setNode':
+            node = nodes.get(entry['id'])
+            if node is not None:
+                node.update({k: entry[k] for k in ('current', 'errorp') if k in entry})
+        elif op == 'delNode':
+            nodes.pop(entry['id'], None)
+            for key in [key for key in pipes if entry['id'] in key]:
+                del pipes[key]
+        elif op == 'link':
+            pipes[frozenset((entry['a'], entry['b']))] = {k: entry[k] for k in ('a', 'b', 'bindIds', 'distance', 'errorp')}
+        elif op == 'setPipe':
+            pipe = pipes.get(frozenset((entry['a'], entry['b'])))
+            if pipe is not None:
+                pipe.update({k: entry[k] for k in ('distance', 'errorp') if k in entry})
+        elif op == 'unlink':
+            pipes.pop(frozenset((entry['a'], entry['b'])), None)
+        elif op == 'clear':
+            nodes.clear()
+            pipes.clear()
@@ -0,0 +1,331 @@
+# GIS导出数据的批量导入
+# 点要素为气源/用户，线要素为管线。GeoJSON按要素流式解析，不构建整个文件的对象树；CSV逐行读取。
+# 读到的坐标先按列累积，最后一次性投影到场景坐标，管线两端用网格空间索引吸附到最近的节点，
+# 得到NetworkModel后交给场景批量插入（节点很多时自动切换为虚拟模式）
+
+import os
+import csv
+import json
+from typing import Optional, Iterator, Any
+from dataclasses import dataclass
+
+import numpy as np
+
+from NetworkModel import NetworkModel, GAS, USER
+from SpatialGrid import SpatialGrid
+
+EARTH_RADIUS = 6371008.8  # 米
+
+# 与MapProxyItemWidget的默认属性一致
+DEFAULT_GAS_CURRENT = 10000.0
+DEFAULT_USER_CURRENT = 10.0
+DEFAULT_ERRORP = 0.05
+
+# 流式读取GeoJSON FeatureCollection中的要素
+# 逐个解析顶层对象的键，跳过其他成员的值，定位到顶层"features"数组后，用raw_decode逐个解码要素，
+# 缓冲区不足一个完整的值时再读下一块。要素的properties里同样可能出现"features"，不能按文本查找
+def iter_geojson_features(fp : str, chunkSize : int = 1 << 20) -> Iterator[dict[str, Any]]:
+    decoder = json.JSONDecoder()
+    with open(fp, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        # 丢掉已解析的部分并读入下一块，文件已读完时返回False
+        def more() -> bool:
+            nonlocal buffer, pos, eof
+            if eof:
+                return False
+            chunk = f.read(chunkSize)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return not eof
+
+        # 跳过空白（以及给出的分隔符），返回下一个字符，文件结束时返回''
+        def peek(separators : str = '') -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n' + separators:
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if not more():
+                    return ''
+
+        # 解码一个完整的JSON值；数字等值恰好停在缓冲区末尾时可能被截断，也要再读一块
+        def value() -> Any:
+            nonlocal pos
+            peek()
+            while True:
+                try:
+                    v, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return v
+                except json.JSONDecodeError:
+                    pass
+                if not more():
+                    try:
+                        v, pos = decoder.raw_decode(buffer, pos)
+                        return v
+                    except json.JSONDecodeError:
+                        raise ValueError(f'{fp}在第{pos}个字符附近不完整或格式错误')
+
+        if peek() != '{':
+            raise ValueError(f'{fp}不是GeoJSON FeatureCollection（顶层不是对象）')
+        pos += 1
+        # 找到顶层的features数组开头
+        while True:
+            c = peek(',')
+            if c != '"':
+                raise ValueError(f'{fp}不是GeoJSON FeatureCollection（缺少features）')
+            key = value()
+            if peek() != ':':
+                raise ValueError(f'{fp}在第{pos}个字符附近格式错误')
+            pos += 1
+            if key == 'features':
+                if peek() != '[':
+                    raise ValueError(f'{fp}的features不是数组')
+                pos += 1
+                break
+            value()
+        while True:
+            c = peek(',')
+            if c == ']':
+                return
+            if not c:
+                raise ValueError(f'{fp}在第{pos}个字符附近不完整或格式错误')
+            yield value()
+
+@dataclass
+class ImportReport:
+    nodes : int
+    pipes : int
+    unsnapped : int  # 端点附近没有节点而丢弃的管线
+    selfLoops : int  # 两端吸附到同一节点而丢弃的管线
+    duplicates : int  # 与已有管线连接同一对节点而丢弃的管线
+    skipped : int  # 不支持的几何类型或缺少坐标的要素
+
+    def __str__(self) -> str:
+        return (
+            f'导入{self.nodes}个节点、{self.pipes}条管线；丢弃管线：端点未吸附{self.unsnapped}条，'
+            f'自环{self.selfLoops}条，重复{self.duplicates}条；跳过要素{self.skipped}个'
+        )
+
+class GisImporter:
+    # geographic：坐标为经纬度，按数据中心做等距投影换算为米；否则视为已投影的平面坐标。
+    # 不按数值范围猜测：小范围的平面坐标同样落在经纬度范围内，误判后距离会放大十万倍
+    # scale：场景单位 / 米（或平面坐标单位），GIS坐标y轴向上，场景y轴向下，投影时翻转
+    # snapRadius：管线端点吸附到节点的最大距离（场景单位）
+    # categoryField、gasValues：属性中取该字段，值在gasValues中的点要素为气源，其余为用户
+    def __init__(
+        self,
+        geographic : bool = False,
+        scale : float = 1.0,
+        snapRadius : float = 50.0,
+        categoryField : str = 'category',
+        gasValues : tuple[str, ...] = ('Gas', 'gas', 'station', 'source')
+    ):
+        if scale <= 0 or snapRadius <= 0:
+            raise ValueError('缩放比例和吸附半径必须为正数')
+        self.geographic = geographic
+        self.scale = scale
+        self.snapRadius = snapRadius
+        self.categoryField = categoryField
+        self.gasValues = set(gasValues)
+        # 节点列
+        self.nodeX : list[float] = []
+        self.nodeY : list[float] = []
+        self.category : list[int] = []
+        self.current : list[float] = []
+        self.errorp : list[float] = []
+        self.nodeIds : list[Optional[int]] = []
+        # 管线：折线顶点按条拼接，vertexStart为每条管线第一个顶点的下标
+        self.vertexX : list[float] = []
+        self.vertexY : list[float] = []
+        self.vertexStart : list[int] = []
+        self.pipeDistance : list[float] = []  # nan表示按折线长度计算
+        self.pipeErrorp : list[float] = []
+        self.skipped = 0
+
+    # ---------------- 读取 ----------------
+
+    def add_node(self, x : float, y : float, props : dict[str, Any], nodeId : Optional[Any] = None) -> None:
+        isGas = str(props.get(self.categoryField, '')) in self.gasValues
+        self.nodeX.append(float(x))
+        self.nodeY.append(float(y))
+        self.category.append(GAS if isGas else USER)
+        current = props.get('current')
+        self.current.append(float(current) if current not in (None, '') else DEFAULT_GAS_CURRENT if isGas else DEFAULT_USER_CURRENT)
+        errorp = props.get('errorp')
+        self.errorp.append((float(errorp) if errorp not in (None, '') else DEFAULT_ERRORP) if isGas else np.nan)
+        self.nodeIds.append(int(nodeId) if isinstance(nodeId, (int, str)) and str(nodeId).lstrip('-').isdigit() else None)
+
+    def add_pipe(self, coords : list, props : dict[str, Any]) -> None:
+        if len(coords) < 2:
+            self.skipped += 1
+            return
+        self.vertexStart.append(len(self.vertexX))
+        for c in coords:
+            self.vertexX.append(float(c[0]))
+            self.vertexY.append(float(c[1]))
+        distance = props.get('distance', props.get('length'))
+        self.pipeDistance.append(float(distance) if distance not in (None, '') else np.nan)
+        errorp = props.get('errorp')
+        self.pipeErrorp.append(float(errorp) if errorp not in (None, '') else DEFAULT_ERRORP)
+
+    def read_geojson(self, fp : str) -> None:
+        for feature in iter_geojson_features(fp):
+            geometry = feature.get('geometry') or {}
+            props = feature.get('properties') or {}
+            kind = geometry.get('type')
+            coords = geometry.get('coordinates')
+            if not coords:
+                self.skipped += 1
+            elif kind == 'Point':
+                self.add_node(coords[0], coords[1], props, feature.get('id', props.get('id')))
+            elif kind == 'MultiPoint':
+                # 每个点各是一个节点，要素编号只给第一个点，其余点没有编号（构建时按顺序重新编号）
+                featureId = feature.get('id', props.get('id'))
+                for i, c in enumerate(coords):
+                    self.add_node(c[0], c[1], props, featureId if i == 0 else None)
+            elif kind == 'LineString':
+                self.add_pipe(coords, props)
+            elif kind == 'MultiLineString':
+                # 各段首尾相接视为一条管线
+                self.add_pipe([c for part in coords for c in part], props)
+            else:
+                self.skipped += 1
+
+    # 节点表需要x、y列（经纬度时为lon、lat也可），可选id、category、current、errorp；
+    # 管线表需要ax、ay、bx、by列，可选distance、errorp。按表头判断是哪一种
+    def read_csv(self, fp : str) -> None:
+        with open(fp, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            fields = set(reader.fieldnames or ())
+            if {'ax', 'ay', 'bx', 'by'} <= fields:
+                for row in reader:
+                    self.add_pipe([(row['ax'], row['ay']), (row['bx'], row['by'])], row)
+                return
+            xKey, yKey = ('x', 'y') if {'x', 'y'} <= fields else ('lon', 'lat')
+            if not {xKey, yKey} <= fields:
+                raise ValueError(f'{fp}缺少坐标列（x、y或lon、lat，管线为ax、ay、bx、by）')
+            for row in reader:
+                if row[xKey] in (None, '') or row[yKey] in (None, ''):
+                    self.skipped += 1
+                    continue
+                self.add_node(row[xKey], row[yKey], row, row.get('id'))
+
+    def read(self, fp : str) -> None:
+        if fp.lower().endswith('.csv'):
+            self.read_csv(fp)
+        else:
+            self.read_geojson(fp)
+
+    # ---------------- 构建 ----------------
+
+    # 投影到场景坐标，原点为节点范围的中心
+    def _project(self, x : np.ndarray, y : np.ndarray, cx : float, cy : float) -> tuple[np.ndarray, np.ndarray]:
+        if self.geographic:
+            x = EARTH_RADIUS * np.radians(x - cx) * np.cos(np.radians(cy))
+            y = EARTH_RADIUS * np.radians(y - cy)
+        else:
+            x, y = x - cx, y - cy
+        return x * self.scale, -y * self.scale
+
+    # 折线长度（米或平面坐标单位）
+    def _polyline_lengths(self, vx : np.ndarray, vy : np.ndarray, start : np.ndarray) -> np.ndarray:
+        if self.geographic:
+            lon, lat = np.radians(vx), np.radians(vy)
+            a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+            seg = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        else:
+            seg = np.hypot(np.diff(vx), np.diff(vy))
+        # 跨管线的“线段”不计入
+        seg = np.append(seg, 0.0)
+        seg[start[1:] - 1] = 0.0
+        return np.add.reduceat(seg, start) if len(start) else np.zeros(0)
+
+    # 端点连线方向决定使用哪两个端口：水平为主时右-左，竖直为主时下-上（上下左右 -> 0123）
+    @staticmethod
+    def _ports(dx : np.ndarray, dy : np.ndarray) -> np.ndarray:
+        horizontal = np.abs(dx) >= np.abs(dy)
+        a = np.where(horizontal, np.where(dx >= 0, 3, 2), np.where(dy >= 0, 1, 0))
+        b = np.where(horizontal, np.where(dx >= 0, 2, 3), np.where(dy >= 0, 0, 1))
+        return np.stack((a, b), axis=1).astype(np.int8)
+
+    def build(self, version : str = '1.1.0') -> tuple[NetworkModel, ImportReport]:
+        if not self.nodeX:
+            raise ValueError('没有读到任何节点（点要素）')
+        nx, ny = np.array(self.nodeX), np.array(self.nodeY)
+        cx, cy = (nx.min() + nx.max()) / 2, (ny.min() + ny.max()) / 2
+        x, y = self._project(nx, ny, cx, cy)
+
+        # 文件中的编号齐全且不重复时沿用，否则按顺序编号
+        ids = self.nodeIds
+        if None not in ids and len(set(ids)) == len(ids):
+            nodeIds = np.array(ids, dtype=np.int64)
+        else:
+            nodeIds = np.arange(len(ids), dtype=np.int64)
+
+        vx, vy = np.array(self.vertexX), np.array(self.vertexY)
+        start = np.array(self.vertexStart, dtype=np.int64)
+        # 每条管线最后一个顶点的下标；只有节点没有管线时为空
+        end = np.append(start[1:], len(vx))[:len(start)] - 1
+        distance = np.array(self.pipeDistance)
+        lengths = self._polyline_lengths(vx, vy, start)
+        distance = np.where(np.isnan(distance), lengths, distance)
+        pipeErrorp = np.array(self.pipeErrorp)
+
+        # 管线首尾顶点吸附到最近的节点
+        ex, ey = self._project(np.concatenate((vx[start], vx[end])), np.concatenate((vy[start], vy[end])), cx, cy)
+        grid = SpatialGrid(self.snapRadius, x, y)
+        snapped, _ = grid.nearest(ex, ey, self.snapRadius, x, y)
+        P = len(start)
+        src, dst = snapped[:P], snapped[P:]
+        unsnapped = (src < 0) | (dst < 0)
+        selfLoop = ~unsnapped & (src == dst)
+        keep = ~unsnapped & ~selfLoop
+        # 同一对节点之间只保留第一条
+        lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+        _, first = np.unique(np.stack((lo[keep], hi[keep]), axis=1), axis=0, return_index=True)
+        kept = np.flatnonzero(keep)
+        unique = np.zeros(P, dtype=bool)
+        unique[kept[first]] = True
+        duplicates = int(keep.sum() - unique.sum())
+        keep = unique
+
+        src, dst = src[keep], dst[keep]
+        model = NetworkModel(
+            x=x,
+            y=y,
+            category=np.array(self.category, dtype=np.int8),
+            current=np.array(self.current),
+            errorp=np.array(self.errorp),
+            src=src,
+            dst=dst,
+            bindIds=self._ports(x[dst] - x[src], y[dst] - y[src]),
+            distance=distance[keep],
+            pipeErrorp=pipeErrorp[keep],
+            version=version,
+            nodeIds=nodeIds
+        )
+        report = ImportReport(
+            nodes=model.nodeCount,
+            pipes=model.pipeCount,
+            unsnapped=int(unsnapped.sum()),
+            selfLoops=int(selfLoop.sum()),
+            duplicates=duplicates,
+            skipped=self.skipped
+        )
+        return model, report
+
+# 读取一组GeoJSON/CSV文件（节点和管线可以分在不同文件中）
+def import_files(paths : list[str], **kwargs) -> tuple[NetworkModel, ImportReport]:
+    importer = GisImporter(**kwargs)
+    for fp in paths:
+        if not os.path.exists(fp):
+            raise ValueError(f'文件不存在：{fp}')
+        importer.read(fp)
+    return importer.build()
@@ -0,0 +1,62 @@
+import sys
+import math
+
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+from PyQt5.QtGui import *
+
+# 数值列按数值排序，nan不论升序降序都排在最后
+class _ImportanceItem(QTreeWidgetItem):
+    def __lt__(self, other : QTreeWidgetItem) -> bool:
+        tree = self.treeWidget()
+        column = tree.sortColumn()
+        a, b = self.data(column, Qt.UserRole), other.data(column, Qt.UserRole)
+        if not isinstance(a, float) or not isinstance(b, float):
+            return super().__lt__(other)
+        descending = tree.header().sortIndicatorOrder() == Qt.DescendingOrder
+        if math.isnan(a) or math.isnan(b):
+            # 降序时Qt按 other < self 排列
+            return not math.isnan(b) and descending if math.isnan(a) else not descending
+        return a < b
+
+class MapImportanceWidget(QDockWidget):
+
+    itemRequest = pyqtSignal(object)  # 请求在场景中选中对应的图元
+
+    def __init__(self, **kwargs):
+        super().__init__("元件重要度", **kwargs)
+
+        self.treeWidget = QTreeWidget()
+        self.components : list = []  # 与列表行对应的图元
+
+        self.setUI()
+
+    def setUI(self) -> None:
+        self.setAllowedAreas(Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea)
+        self.setWidget(self.treeWidget)
+
+        self.treeWidget.setHeaderLabels(["元件", "Birnbaum", "关键重要度", "RAW"])
+        self.treeWidget.setRootIsDecorated(False)
+        self.treeWidget.setSortingEnabled(True)
+        self.treeWidget.itemClicked.connect(lambda item, _ : self.itemRequest.emit(self.components[item.data(0, Qt.UserRole)]))
+
+    # measures为ImportanceMeasures，components为元件对应的图元，names为显示名称
+    def setMeasures(self, measures, components : list, names : list[str]) -> None:
+        self.treeWidget.setSortingEnabled(False)
+        self.treeWidget.clear()
+        self.components = components
+        columns = (measures.birnbaum.tolist(), measures.criticality.tolist(), measures.raw.tolist())
+        for i, name in enumerate(names):
+            item = _ImportanceItem([name] + ['—' if math.isnan(v[i]) else f'{v[i]:.4g}' for v in columns])
+            item.setData(0, Qt.UserRole, i)
+            for col, values in enumerate(columns, start=1):
+                item.setData(col, Qt.UserRole, float(values[i]))
+            self.treeWidget.addTopLevelItem(item)
+        self.treeWidget.setSortingEnabled(True)
+        self.treeWidget.sortItems(1, Qt.DescendingOrder)
+
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    ui = MapImportanceWidget()
+    ui.show()
+    sys.exit(app.exec())
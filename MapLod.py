@@ -0,0 +1,11 @@
+# 细节层次（LOD）的分档，视图、图元和虚拟化共用
+# 只依赖缩放比例，不引用任何Qt类，图元模块导入它不会牵连视图模块
+
+LOD_FULL = 0  # 完整细节
+LOD_ICON = 1  # 只画外框和图标，不画坐标文字和端口
+LOD_DOT = 2  # 图元不再绘制，节点画成点、管线画成直线，由视图批量绘制
+LOD_ICON_SCALE = 0.5  # 缩放比例低于该值进入LOD_ICON
+LOD_DOT_SCALE = 0.25  # 缩放比例低于该值进入LOD_DOT
+
+def lod_tier(scale : float) -> int:
+    return LOD_FULL if scale >= LOD_ICON_SCALE else LOD_ICON if scale >= LOD_DOT_SCALE else LOD_DOT
@@ -6,6 +6,7 @@ from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 
 from MapProxyItemWidget import MixinPort
+from MapLod import LOD_DOT, lod_tier
 
 @dataclass
 class PipeAttr:
@@ -34,20 +35,72 @@ class PipeProxy(QGraphicsPathItem):
 
         self.setFlag(QGraphicsItem.ItemIsSelectable)
         self.setZValue(-1)
-        # 模拟管道长度，默认是两端点之间的欧几里得距离，可以手动设置新的长度
+        # 模拟管道长度，默认是两端点之间的欧几里得距离（创建管线时设置），可以手动设置新的长度
         self.distance = 0.0
         # 失效率
         self.errorp = 0.05
         # 自定义路径样子的函数
-        self.customPathFunc : Optional[Callable[[QPointF, QPointF], QPainterPath]] = None
+        self._customPathFunc : Optional[Callable[[QPointF, QPointF], QPainterPath]] = None
+        # 路径、选中形状和包围盒只在端点移动或路径函数改变时重算，重绘时直接使用
+        self._shape = QPainterPath()
+        self._boundingRect = QRectF()
+        self.update_geometry()
+
+    # 长度和失效率：已连接的管线修改时记录到自动保存日志（调试器注入的代码同样经过这里）
+    def _record_attr(self, **fields : float) -> None:
+        scene = self.scene()
+        if scene is None or self.endPort is None:
+            return
+        nodeA, nodeB = self.startPort.bind_node, self.endPort.bind_node
+        # 连接完成之前设置的初始值随link记录
+        if nodeA.records.get(nodeB) is self:
+            scene.recordEdit('setPipe', a=nodeA.nodeId, b=nodeB.nodeId, **fields)
+
+    @property
+    def distance(self) -> float:
+        return self._distance
+
+    @distance.setter
+    def distance(self, value : float) -> None:
+        self._distance = value
+        self._record_attr(distance=value)
+
+    @property
+    def errorp(self) -> float:
+        return self._errorp
+
+    @errorp.setter
+    def errorp(self, value : float) -> None:
+        self._errorp = value
+        self._record_attr(errorp=value)
+
+    @property
+    def customPathFunc(self) -> Optional[Callable[[QPointF, QPointF], QPainterPath]]:
+        return self._customPathFunc
+
+    @customPathFunc.setter
+    def customPathFunc(self, func : Optional[Callable[[QPointF, QPointF], QPainterPath]]) -> None:
+        self._customPathFunc = func
+        self.update_geometry()
 
     def set_dst(self, x, y):
         self.pos_dst = [x, y]
+        self.update_geometry()
+
+    # 重新计算并缓存路径、选中形状和包围盒
+    def update_geometry(self) -> None:
+        path = self.calc_path()
+        stroker = QPainterPathStroker()
+        stroker.setWidth(self.width + 5)  # 增加额外宽度，提高选中范围
+        # 包围盒改变之前必须先通知场景
+        self.prepareGeometryChange()
+        self._shape = stroker.createStroke(path)
+        self._boundingRect = self._shape.boundingRect()
+        self.setPath(path)
 
     def calc_path(self) -> QPainterPath:
         start_pos = QPointF(self.pos_src[0], self.pos_src[1])
         end_pos = QPointF(self.pos_dst[0], self.pos_dst[1])
-        self.distance = QLineF(start_pos, end_pos).length()
         if self.customPathFunc is None:
             buffer = 20  # 适当增加 buffer 让曲线更自然
             path = QPainterPath(start_pos)
@@ -63,16 +116,15 @@ class PipeProxy(QGraphicsPathItem):
             return self.customPathFunc(start_pos, end_pos)
 
     def boundingRect(self):
-        return self.shape().boundingRect()
+        return self._boundingRect
 
     def shape(self):
-        path = self.calc_path()
-        stroker = QPainterPathStroker()
-        stroker.setWidth(self.width + 5)  # 增加额外宽度，提高选中范围
-        return stroker.createStroke(path)  # 返回更宽的形状
+        return self._shape  # 比路径更宽的形状
 
     def paint(self, painter : QPainter, option : QStyleOptionGraphicsItem, widget : Optional[QWidget] = None):
-        self.setPath(self.calc_path())
+        # 远景时由视图批量画成直线
+        if lod_tier(option.levelOfDetailFromTransform(painter.worldTransform())) == LOD_DOT:
+            return
         path = self.path()
         if self.endPort is None:
             painter.setPen(QPen(Qt.red, self.width))
@@ -92,8 +144,16 @@ class PipeProxy(QGraphicsPathItem):
         p1, p2 = self.startPort.getPosInScene(), self.endPort.getPosInScene()
         self.pos_src = [p1.x(), p1.y()]
         self.pos_dst = [p2.x(), p2.y()]
-        self.setPath(self.calc_path())
-        self.update()  # 强制重新绘制管道路径
+        self.update_geometry()
+
+    # 端点节点移动时调用：只登记到场景的待更新集合，由场景每帧统一重算一次路径，
+    # 两端同时被拖动的管线也只重算一次
+    def mark_dirty(self) -> None:
+        scene = self.scene()
+        if scene is None:
+            self.update_pipe_path()
+        else:
+            scene.markPipeDirty(self)
 
     # 手动删除管线
     # 先要删除两端点的对这条边的记录，再删除本身
@@ -102,6 +162,8 @@ class PipeProxy(QGraphicsPathItem):
         self.endPort.bind_node.records.inverse.pop(self)
         # print(self.startPort.bind_node.records)
         # print(self.endPort.bind_node.records)
+        self.scene().connectivity.remove_pipe(self)
+        self.scene().recordEdit('unlink', a=self.startPort.bind_node.nodeId, b=self.endPort.bind_node.nodeId)
         self.scene().removeItem(self)
 
     # 拉成直线路径
@@ -132,8 +194,6 @@ class PipeProxy(QGraphicsPathItem):
             self.del_self()
         elif selected_action == toLine:
             self.customPathFunc = self.convertToLine
-            self.setPath(self.calc_path())
-            self.update()
 
     # 定位到绑定到两个端点的哪一个端口（分上下左右 --map--> 0123）
     def mapToPortIds(self) -> tuple[int, int]:
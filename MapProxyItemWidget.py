@@ -8,6 +8,20 @@ from PyQt5.QtWidgets import *
 from qtawesome import icon as QAwesomeIcon
 from bidict import bidict
 
+from MapLod import LOD_FULL, LOD_DOT, lod_tier
+
+# 进程内共享的图标缓存，按图标名和设备像素比区分，同一种图标在同一种屏幕上只渲染一次
+ICON_SIZE = 50
+_pixmapCache : dict[tuple[str, float], QPixmap] = {}
+
+def _icon_pixmap(iconName : str, dpr : float = 1.0) -> QPixmap:
+    key = (iconName, dpr)
+    if key not in _pixmapCache:
+        pixmap = QAwesomeIcon(iconName).pixmap(QSize(round(ICON_SIZE * dpr), round(ICON_SIZE * dpr)))
+        pixmap.setDevicePixelRatio(dpr)
+        _pixmapCache[key] = pixmap
+    return _pixmapCache[key]
+
 # 节点属性传参
 @dataclass
 class NodeAttr:
@@ -19,64 +33,59 @@ class NodeAttr:
     currentGasUser : Optional[float] = None
 
 # 连接点
-class MixinPort(QGraphicsEllipseItem):
-    def __init__(self, pos : QPointF, bind_scene, bind_node : 'MapProxyItemWidget'):  # pos是起始位置
-        super().__init__(pos.x(), pos.y(), 10, 10)  # 圆形端口的直径为 10，中心为给定位置
+# 不再是独立的图元，只记录在节点上的偏移，由节点绘制和做命中检测
+PORT_SIZE = 10
 
-        self.initPos = pos
+class MixinPort:
+    def __init__(self, offset : QPointF, bind_scene, bind_node : 'MapProxyItemWidget'):  # offset为端口左上角相对节点的位置
+        self.offset = offset
         self.bind_scene = bind_scene  # 场景
         self.bind_node = bind_node  # 绑定的图元
-        self.setParentItem(self.bind_node)
-
-        self.setFlags(QGraphicsItem.ItemIsSelectable)
-        self.setAcceptHoverEvents(True)
 
-    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = None) -> None:
-        painter.setRenderHint(QPainter.Antialiasing)
-        pen = QPen(Qt.blue, 2)
-        painter.setPen(pen)
-        painter.setBrush(QBrush(Qt.white))
-        painter.drawEllipse(self.rect())  # 绘制一个圆形端口
-
-        super().paint(painter, option, widget)
+    # 端口在节点坐标系中的范围
+    def rect(self) -> QRectF:
+        return QRectF(self.offset, QSizeF(PORT_SIZE, PORT_SIZE))
 
     # 有关于线宽的偏差，不影响
     def getPosInScene(self) -> QPointF:
-        return self.mapToScene(self.initPos)
+        return self.bind_node.pos() + self.offset
 
-class MapProxyItemWidget(QGraphicsWidget):
+    def pos(self) -> QPointF:
+        return self.getPosInScene()
+
+class MapProxyItemWidget(QGraphicsObject):
     attr = pyqtSignal(NodeAttr)  # 属性右键反馈
     pipePathUpdate = pyqtSignal()  # 更新管道位置
+
+    # 节点外框、图标和文字在节点坐标系中的位置
+    FRAME = QRectF(0, 0, 125, 67.5)
+    ICON_POS = QPointF(8, 8.75)
+    TEXT_POS = QPointF(66, 16)
+    # 外框画笔宽10，端口伸出外框10，包围盒按两者取最大并留出端口描边
+    BOUNDS = QRectF(-11, -11, 147, 89.5)
+    FONT = QFont()
+    FONT.setPixelSize(10)
+
     def __init__(self, iconName: str, init_pos: QPointF, bind_scene):
         super().__init__()
 
         self.bind_scene = bind_scene
+        self.iconName = iconName
         self.category: Literal['Gas', 'User'] | None = 'User' if iconName == 'fa5.user-circle' else 'Gas'
 
         # 实时追踪位置
         self.timing_pos = init_pos
+        # 节点编号，由场景分配，随地图文件保存，管线按编号引用两端节点
+        self.nodeId = -1
 
-        # 创建图标
-        pixmap = QAwesomeIcon(iconName).pixmap(50, 50)
-        icon_label = QLabel()
-        icon_label.setPixmap(pixmap)
-        icon_proxy = QGraphicsProxyWidget(self)
-        icon_proxy.setWidget(icon_label)
-
-        # 创建文本
-        self.text_label = QLabel(f"x: {round(init_pos.x(), 1)}\ny: {round(init_pos.y(), 1)}")
-        self.text_label.setFixedWidth(50)
-        text_proxy = QGraphicsProxyWidget(self)
-        text_proxy.setWidget(self.text_label)
+        # 坐标文本，移动后标记为过期，下次绘制时才重新排版，一帧内多次移动只排版一次
+        self.label = QStaticText()
+        self.label.setTextFormat(Qt.RichText)
+        self._set_label(init_pos)
+        self.labelDirty = False
 
-        # 使用布局管理
-        layout = QGraphicsLinearLayout(Qt.Horizontal)
-        layout.addItem(icon_proxy)
-        layout.addItem(text_proxy)
-        self.setLayout(layout)
-
-        # 设置节点可以移动和选择
-        self.setFlags(QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemIsMovable)
+        # 设置节点可以移动和选择，移动后通过itemChange更新坐标和管道
+        self.setFlags(QGraphicsItem.ItemIsSelectable | QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemSendsGeometryChanges)
 
         # 绑定的接口
         # 设置接口的位置偏移量
@@ -84,20 +93,10 @@ class MapProxyItemWidget(QGraphicsWidget):
         self.bottomPortOffset = QPointF(57.5, 67.5)
         self.leftPortOffset = QPointF(-10, 30)
         self.rightPortOffset = QPointF(125, 30)
-        # 创建接口端口并添加到场景
-        self.topPort = MixinPort(init_pos + self.topPortOffset, self.bind_scene, self)
-        self.bottomPort = MixinPort(init_pos + self.bottomPortOffset, self.bind_scene, self)
-        self.leftPort = MixinPort(init_pos + self.leftPortOffset, self.bind_scene, self)
-        self.rightPort = MixinPort(init_pos + self.rightPortOffset, self.bind_scene, self)
-        # Z来设置层级关系
-        self.topPort.setZValue(1)
-        self.bottomPort.setZValue(1)
-        self.leftPort.setZValue(1)
-        self.rightPort.setZValue(1)
-        self.bind_scene.addItem(self.topPort)
-        self.bind_scene.addItem(self.bottomPort)
-        self.bind_scene.addItem(self.leftPort)
-        self.bind_scene.addItem(self.rightPort)
+        self.topPort = MixinPort(self.topPortOffset, self.bind_scene, self)
+        self.bottomPort = MixinPort(self.bottomPortOffset, self.bind_scene, self)
+        self.leftPort = MixinPort(self.leftPortOffset, self.bind_scene, self)
+        self.rightPort = MixinPort(self.rightPortOffset, self.bind_scene, self)
         # 绑定的四个接口，可以用于验证任意两个接口连接时，是否属于同一个图元
         self.bindPorts = [self.topPort, self.bottomPort, self.leftPort, self.rightPort]
         # 记录MapProxyItemWidget绑定的图元与对应的管线
@@ -111,38 +110,92 @@ class MapProxyItemWidget(QGraphicsWidget):
         # 用户源的属性
         self.currentGasUser = 10
 
+    # 气源、用户的属性：在场景中修改时记录到自动保存日志（调试器注入的代码同样经过这里）
+    # 不在场景中（创建时、对象池中）的修改不记录，初始值随addNode一起记录
+    def _record_attr(self, **fields : float) -> None:
+        scene = self.scene()
+        if scene is not None:
+            scene.recordEdit('setNode', id=self.nodeId, **fields)
+
+    @property
+    def errorp(self) -> float:
+        return self._errorp
+
+    @errorp.setter
+    def errorp(self, value : float) -> None:
+        self._errorp = value
+        if self.category == 'Gas':
+            self._record_attr(errorp=value)
+
+    @property
+    def currentGasSource(self) -> float:
+        return self._currentGasSource
+
+    @currentGasSource.setter
+    def currentGasSource(self, value : float) -> None:
+        self._currentGasSource = value
+        if self.category == 'Gas':
+            self._record_attr(current=value)
+
+    @property
+    def currentGasUser(self) -> float:
+        return self._currentGasUser
+
+    @currentGasUser.setter
+    def currentGasUser(self, value : float) -> None:
+        self._currentGasUser = value
+        if self.category == 'User':
+            self._record_attr(current=value)
+
+    def _set_label(self, pos : QPointF) -> None:
+        self.label.setText(f"x: {round(pos.x(), 1)}<br>y: {round(pos.y(), 1)}")
+        self.labelDirty = False
+
+    def boundingRect(self) -> QRectF:
+        return self.BOUNDS
+
+    # 命中检测时落在哪个端口上，pos为节点坐标
+    def portAt(self, pos : QPointF) -> Optional[MixinPort]:
+        for port in self.bindPorts:
+            if port.rect().adjusted(-2, -2, 2, 2).contains(pos):
+                return port
+        return None
+
+    # 按缩放档位减少绘制内容，远景时由视图批量画成点
     def paint(self, painter, option, widget=None):
-        painter.setRenderHint(QPainter.Antialiasing)
-        pen = QPen(Qt.darkBlue, 10)
-        painter.setPen(pen)
-        painter.setBrush(QBrush(Qt.white))
-        painter.drawRoundedRect(self.rect(), 15, 15)
-
+        lod = lod_tier(option.levelOfDetailFromTransform(painter.worldTransform()))
+        if lod == LOD_DOT:
+            return
         # 被选中效果
-        if self.isSelected():
-            pen = QPen(Qt.red, 10)
-            painter.setPen(pen)
-            painter.drawRoundedRect(self.rect(), 15, 15)  # 绘制边框
-
-        super().paint(painter, option, widget)
+        painter.setPen(QPen(Qt.red if self.isSelected() else Qt.darkBlue, 10))
+        painter.setBrush(QBrush(Qt.white))
+        painter.drawRoundedRect(self.FRAME, 15, 15)
+
+        painter.drawPixmap(self.ICON_POS, _icon_pixmap(self.iconName, painter.device().devicePixelRatioF()))
+        if lod != LOD_FULL:
+            return
+        if self.labelDirty:
+            self._set_label(self.timing_pos)
+        painter.setPen(Qt.black)
+        painter.setFont(self.FONT)
+        painter.drawStaticText(self.TEXT_POS, self.label)
+
+        # 绘制四个圆形端口
+        painter.setPen(QPen(Qt.blue, 2))
+        for port in self.bindPorts:
+            painter.drawEllipse(port.rect())
 
     # 实时更新位置但是暂先不做无限拖动（即一直往边缘滑动进行场景更换）
-    def moveEvent(self, event: QGraphicsSceneMoveEvent):
-        new_pos = event.newPos()
-        delta_pos = new_pos - self.timing_pos
-        self.timing_pos = new_pos
-
-        # 更新文本
-        self.text_label.setText(f"x: {round(new_pos.x(), 1)}\ny: {round(new_pos.y(), 1)}")
-        # 更新四个接口
-        self.topPort.moveBy(delta_pos.x(), delta_pos.y())
-        self.bottomPort.moveBy(delta_pos.x(), delta_pos.y())
-        self.leftPort.moveBy(delta_pos.x(), delta_pos.y())
-        self.rightPort.moveBy(delta_pos.x(), delta_pos.y())
-
-        # 发出信号，通知管道更新
-        self.pipePathUpdate.emit()
-        super().moveEvent(event)
+    def itemChange(self, change : QGraphicsItem.GraphicsItemChange, value : Any) -> Any:
+        if change == QGraphicsItem.ItemPositionHasChanged:
+            self.timing_pos = QPointF(value)
+            # 文本在绘制时更新
+            self.labelDirty = True
+            # 发出信号，通知管道更新（管道登记到场景，每帧统一重算）
+            self.pipePathUpdate.emit()
+            if self.scene() is not None:
+                self.scene().recordMove(self)
+        return super().itemChange(change, value)
 
     # 右键菜单
     def contextMenuEvent(self, event: QGraphicsSceneContextMenuEvent):
@@ -161,15 +214,16 @@ class MapProxyItemWidget(QGraphicsWidget):
                 self.attr.emit(NodeAttr(x=self.x(), y=self.y(), category='User', currentGasUser=self.currentGasUser))
             print(f'四个端口位置：\n\t上：{self.topPort.getPosInScene()}\n\t下：{self.bottomPort.getPosInScene()}\n\t左：{self.leftPort.getPosInScene()}\n\t右：{self.rightPort.getPosInScene()}')
         elif selected_action == delAct:
-            # 删除要考虑：端口删掉、删除场景连接记录，如果有绑定管线也要跟着删掉，最后自身删掉
-            for it in self.bindPorts:
-                self.scene().removeItem(it)
-            self.bindPorts.clear()
-
-            for key_node in self.records.keys():
+            # 删除要考虑：删除场景连接记录，如果有绑定管线也要跟着删掉，最后自身删掉
+            for key_node, bindPipe in list(self.records.items()):
                 # key_node : 'MapProxyItemWidget'
-                bindPipe = key_node.records[self]
-                # print(bindPipe)
+                # 邻居节点的记录和位置信号也要断开，否则它仍认为与本节点相连，拖动时还会去更新已删除的管线
+                key_node.records.pop(self, None)
+                key_node.pipePathUpdate.disconnect(bindPipe.mark_dirty)
+                self.pipePathUpdate.disconnect(bindPipe.mark_dirty)
                 self.scene().removeItem(bindPipe)
+            self.records.clear()
 
+            self.scene().connectivity.remove_node(self)
+            self.scene().recordEdit('delNode', id=self.nodeId)
             self.scene().removeItem(self)
@@ -1,6 +1,5 @@
 from typing import Optional
 
-import json5
 import os
 
 from PyQt5.QtGui import *
@@ -9,71 +8,69 @@ from PyQt5.QtCore import *
 
 from MapPipeProxy import PipeProxy
 from MapProxyItemWidget import MapProxyItemWidget
+from NetworkModel import NetworkModel
+from GisImporter import ImportReport, import_files
+
+# 地图文件版本：1.1.0起节点带编号id，管线用a、b引用两端节点编号
+MAP_VERSION = '1.1.0'
+
 # from MapScene import MapScene
 
+# 导出线程只接触GUI线程中取得的只读快照，不访问任何图元
 class _ExportThread(QThread):
-    def __init__(self, all_pipes : list[PipeProxy], all_nodes : list[MapProxyItemWidget], fp : str, parent : 'MapReaderObj'):
-        super().__init__()
-        self.all_pipes = all_pipes
-        self.all_nodes = all_nodes
-        self.parent = parent
+    failed = pyqtSignal(str)
+
+    # .mj5总是写成严格JSON（仍然是合法的json5），再次载入时可以走json模块的快速路径
+    def __init__(self, model : NetworkModel, fp : str, parent : Optional[QObject] = None):
+        super().__init__(parent)
+        self.model = model
         self.fp = fp
 
     def run(self) -> None:
-        data = {
-            'version': '1.0.0',
-            'nodes': [self.parent.explain_node(node) for node in self.all_nodes],
-            'pipes': [self.parent.explain_pipe_path(pipe) for pipe in self.all_pipes]
-        }
-        json5.dump(data, open(self.fp, 'w', encoding='utf-8'), indent=4)
-
-class _LoadThread(QThread):
-    copeOver = pyqtSignal(list)
-    def __init__(self, fp : str, bind_scene : 'MapScene'):
-        super().__init__()
-
-        self.fp = fp
-        self.bind_scene = bind_scene
+        try:
+            self.model.to_file(self.fp)
+        except Exception as e:
+            # 序列化出错（ValueError、TypeError等）同样要报告，否则线程静默结束，界面仍提示导出成功
+            self.failed.emit(str(e))
+
+# GIS数据在后台线程中解析、投影、吸附，得到的模型回到GUI线程再插入场景
+class _ImportThread(QThread):
+    copeOver = pyqtSignal(object, object)  # NetworkModel, ImportReport
+    failed = pyqtSignal(str)
+
+    # geographic：坐标为经纬度，否则为平面坐标，由用户在导入时选择
+    def __init__(self, paths : list[str], geographic : bool = False, parent : Optional[QObject] = None):
+        super().__init__(parent)
+        self.paths = paths
+        self.geographic = geographic
 
     def run(self) -> None:
-        l = []
-        with open(self.fp, 'r', encoding='utf-8') as f:
-            data = json5.load(f)
-        nodes = data['nodes']
-        pipes = data['pipes']
-        for node in nodes:
-            l.append(self.bind_scene.addProxyItemWidget(
-                node['category'],
-                QPointF(node['x'], node['y']),
-                current=node['current'],
-                errorp=node.get('errorp', None)
-            ))
-        for pipe in pipes:
-            s = self.bind_scene.itemAt(QPointF(pipe['ax'], pipe['ay']), QTransform())
-            e = self.bind_scene.itemAt(QPointF(pipe['bx'], pipe['by']), QTransform())
-            l.append(self.bind_scene.addPipeAndLink(
-                s,
-                e,
-                pipe.get('distance', None),
-                pipe['errorp']
-            ))
-        self.copeOver.emit(l)
+        try:
+            model, report = import_files(self.paths, geographic=self.geographic)
+        except Exception as e:
+            # csv.Error等任何解析错误都要报告，否则线程静默结束，状态栏一直停在“正在导入”
+            self.failed.emit(str(e))
+        else:
+            self.copeOver.emit(model, report)
 
 class MapReaderObj(QObject):
     send = pyqtSignal(str)
+    # 以场景为父对象，导出线程运行期间不会随调用处的局部变量一起被回收
     def __init__(self, bind_scene : 'MapScene', parent : QWidget):
-        super().__init__()
+        super().__init__(bind_scene)
 
         self.bind_scene = bind_scene
         self.parent = parent
         self.export_thread: Optional[_ExportThread] = None
-        self.load_thread : Optional[_LoadThread] = None
+        self.exportError : Optional[str] = None
+        self.import_thread : Optional[_ImportThread] = None
 
     # 解析图元必要数据
     # 解析气源
     @staticmethod
     def explain_gas_node(node : MapProxyItemWidget) -> dict:
         return {
+            'id' : node.nodeId,
             'x' : node.timing_pos.x(),
             'y' : node.timing_pos.y(),
             'category' : 'Gas',
@@ -84,13 +81,15 @@ class MapReaderObj(QObject):
     @staticmethod
     def explain_user_node(node : MapProxyItemWidget) -> dict:
         return {
+            'id': node.nodeId,
             'x': node.timing_pos.x(),
             'y': node.timing_pos.y(),
             'category': 'User',
             'current': node.currentGasUser
         }
-    def explain_node(self, node : MapProxyItemWidget) -> dict:
-        return self.explain_gas_node(node) if  node.category == 'Gas' else self.explain_user_node(node)
+    @staticmethod
+    def explain_node(node : MapProxyItemWidget) -> dict:
+        return MapReaderObj.explain_gas_node(node) if node.category == 'Gas' else MapReaderObj.explain_user_node(node)
 
     # 解析管线
     # 管线和节点不直接绑定，而是通过端口，要记录在图元的哪个端口或者端口位置也行
@@ -99,6 +98,8 @@ class MapReaderObj(QObject):
         nodeA = pipe.startPort.bind_node.timing_pos
         nodeB = pipe.endPort.bind_node.timing_pos
         return {
+            'a' : pipe.startPort.bind_node.nodeId,
+            'b' : pipe.endPort.bind_node.nodeId,
             'bindIds' : pipe.mapToPortIds(),
             'ax' : nodeA.x(),
             'ay' : nodeA.y(),
@@ -109,42 +110,80 @@ class MapReaderObj(QObject):
         }
 
     # 纯导出功能的逻辑
+    # 在GUI线程中一次性取得管网快照，之后的序列化和写盘都在导出线程中进行
     def exporter_func(self):
-        # 通过管道找两端
-        all_pipes : list[PipeProxy] = self.bind_scene.findAllItems(PipeProxy)
-        all_nodes : list[MapProxyItemWidget] = self.bind_scene.findAllItems(MapProxyItemWidget)  # 这个要是空，管道肯定不存在
-        if not all_nodes:
+        # 虚拟模式下只有视野内的图元，快照统一经由from_scene取得
+        model = NetworkModel.from_scene(self.bind_scene)
+        if not model.nodeCount:
             QMessageBox.warning(self.parent, '不可行警告', '场景中无任何节点')
+            self.deleteLater()
         else:
             fileName, _ = QFileDialog.getSaveFileName(
                 self.parent,
                 '地图保存',
                 os.path.join(os.path.expanduser("~"), "Desktop"),
-                "mj5 文件 (*.mj5)"
-                ""
+                "mj5 文件 (*.mj5);;mjb 二进制地图 (*.mjb)"
             )
             if not fileName:
                 self.send.emit('取消选择！')
+                self.deleteLater()
             else:
-                self.export_thread = _ExportThread(all_pipes, all_nodes, fileName, self)
-                self.export_thread.start()
+                model.freeze()
+                model.version = MAP_VERSION
+                self.export_thread = _ExportThread(model, fileName, parent=self)
+                self.export_thread.failed.connect(self.export_failed)
                 self.export_thread.finished.connect(lambda : self.export_finish(fileName))
+                self.export_thread.start()
+
+    def export_failed(self, message : str) -> None:
+        self.exportError = message
 
     def export_finish(self, f : str) -> None:
-        QMessageBox.information(
-            self.parent,
-            '成功导出地图',
-            f'地图成功写入至：{f}'
-        )
+        if self.exportError is None:
+            QMessageBox.information(
+                self.parent,
+                '成功导出地图',
+                f'地图成功写入至：{f}'
+            )
+        else:
+            QMessageBox.critical(self.parent, '导出失败', f'地图写入失败：{self.exportError}')
         self.export_thread = None
+        self.deleteLater()
 
-    def load_finish(self, f : str) -> None:
-        QMessageBox.information(
+    # 导入GIS导出的GeoJSON/CSV，节点和管线可以分在多个文件中
+    def importer_func(self) -> None:
+        fileNames, _ = QFileDialog.getOpenFileNames(
             self.parent,
-            '成功导入地图',
-            f'地图读取文件：{f}'
+            '选择GIS数据',
+            os.path.join(os.path.expanduser("~"), "Desktop"),
+            "GIS数据 (*.geojson *.json *.csv);;GeoJSON (*.geojson *.json);;CSV (*.csv)"
         )
-        self.load_thread = None
+        if not fileNames:
+            self.send.emit('取消选择！')
+            self.deleteLater()
+            return
+        # 坐标类型无法从数值可靠判断，由用户指定
+        kinds = ['平面坐标（已投影，单位为米）', '经纬度（WGS84）']
+        kind, ok = QInputDialog.getItem(self.parent, '坐标类型', '数据的坐标类型：', kinds, 0, False)
+        if not ok:
+            self.send.emit('取消选择！')
+            self.deleteLater()
+            return
+        self.send.emit('正在导入GIS数据...')
+        self.import_thread = _ImportThread(fileNames, kind == kinds[1], parent=self)
+        self.import_thread.copeOver.connect(self.import_finish)
+        self.import_thread.failed.connect(self.import_failed)
+        self.import_thread.finished.connect(self.deleteLater)
+        self.import_thread.start()
+
+    def import_finish(self, model : NetworkModel, report : ImportReport) -> None:
+        self.bind_scene.loadModel(model)
+        self.send.emit(str(report))
+        QMessageBox.information(self.parent, '成功导入GIS数据', str(report))
+
+    def import_failed(self, message : str) -> None:
+        self.send.emit('GIS数据导入失败')
+        QMessageBox.critical(self.parent, '导入失败', f'GIS数据读取失败：{message}')
 
     # 载入地图文件
     def loader_func(self) -> None:
@@ -152,23 +191,16 @@ class MapReaderObj(QObject):
             self.parent,
             '选择地图文件',
             os.path.join(os.path.expanduser("~"), "Desktop"),
-            "mj5 文件 (*.mj5)"
+            "地图文件 (*.mj5 *.mjb);;mj5 文件 (*.mj5);;mjb 二进制地图 (*.mjb)"
         )
-        if not fileName:
-            self.send.emit('取消选择！')
-        elif not fileName.upper().endswith('.MJ5'):
-            QMessageBox.critical(self.parent, '不支持读取', '你必须选择mj5格式的文件')
-        else:
-            with open(fileName, 'r', encoding='utf-8') as f:
-                data = json5.load(f)
-            nodes = data['nodes']
-            for node in nodes:
-                self.bind_scene.addProxyItemWidget(
-                    node['category'],
-                    QPointF(node['x'], node['y']),
-                    current=node['current'],
-                    errorp=node.get('errorp', None)
-                )
-            pipes = data['pipes']
-            self.bind_scene.pipe_project(pipes)
+        try:
+            if not fileName:
+                self.send.emit('取消选择！')
+            elif not fileName.upper().endswith(('.MJ5', '.MJB')):
+                QMessageBox.critical(self.parent, '不支持读取', '你必须选择mj5或mjb格式的文件')
+            else:
+                self.bind_scene.loadModel(NetworkModel.from_file(fileName))
+        finally:
+            # 同步载入，没有后台线程需要等待，各分支结束后即可释放
+            self.deleteLater()
 
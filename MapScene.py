@@ -1,8 +1,10 @@
 # 场景编辑器
 
 import sys
+from contextlib import contextmanager
 
-from typing import Optional, Tuple, Union, Type
+from typing import Optional, Tuple, Union, Type, Iterator
+import numpy as np
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
@@ -11,14 +13,28 @@ from MapAttributeWidget import MapAttributeWidget
 from MapProxyItemWidget import MapProxyItemWidget, MixinPort
 from MapPipeProxy import PipeProxy
 from MapReaderObj import MapReaderObj
+from ConnectivityIndex import ConnectivityIndex
+from CutSetAnalyzer import CutSetAnalyzer
+from NetworkModel import NetworkModel, GAS, CATEGORIES
+from ReliabilityEngine import MonteCarloEngine, ENGINE_VERSION
+from MapSimulationThread import MapSimulationThread, MapImportanceThread, MapAdequacyThread
+from SupplyAdequacy import SupplyAdequacy
+from ResultCache import ResultCache, network_digest
+from EditJournal import EditJournal
+from MapVirtualizer import MapVirtualizer, NODE_W, NODE_H
 
 class MapScene(QGraphicsScene):
 
+    SCENE_RECT = QRectF(-10000, -10000, 20000, 20000)  # 默认场景范围
+
     interfaceRequest = pyqtSignal()  # 底层调用测试请求
     callStatus = pyqtSignal(str)  # 信息反馈给状态栏
+    simulationProgress = pyqtSignal(object, float)  # 仿真中间结果及完成比例
+    simulationOver = pyqtSignal(object)  # 仿真最终结果
+    importanceOver = pyqtSignal(object, list, list)  # 元件重要度, 对应图元, 显示名称
 
     def __init__(self, dock : MapAttributeWidget, view : QWidget):
-        super().__init__(-10000, -10000, 20000, 20000)
+        super().__init__(self.SCENE_RECT)
 
         # 创建 QGraphicsScene（无限扩展）
         self.dock = dock
@@ -36,18 +52,91 @@ class MapScene(QGraphicsScene):
         self.start_port = None
         self.current_pipe : Optional[PipeProxy] = None
 
+        # 气源到用户的连通性索引，随节点、管线的增删同步更新
+        # 虚拟模式下图元只是视野的缓存，索引改由模型维护，见rebuildConnectivity
+        self.connectivity = ConnectivityIndex()
+        # 最小割集解析，割集按连通分量的拓扑签名缓存，增删管线只会让所在分量重算
+        self.cutSets = CutSetAnalyzer(self.connectivity, lambda key: key.errorp)
+        # 节点编号 -> 节点，编号在场景内唯一，载入地图时沿用文件中的编号
+        self.nodeById : dict[int, MapProxyItemWidget] = {}
+        # 按类型、按节点类别登记的图元（dict当作有序集合），在addItem/removeItem中维护，查询不必遍历整个场景
+        self.registry : dict[type, dict[QGraphicsItem, None]] = {MapProxyItemWidget: {}, PipeProxy: {}}
+        self.nodesByCategory : dict[str, dict[MapProxyItemWidget, None]] = {'Gas': {}, 'User': {}}
+        self.nextNodeId = 0
+
+        # 批量插入的嵌套层数，大于0时暂停索引、重绘和逐条输出
+        self.bulkDepth = 0
+
+        # 可靠性仿真：结构上可达的用户，供气概率与停气概率中较小者的相对误差达到simRelError
+        # （或标准误差不超过simAbsError）即停止，最多simMaxSamples个样本
+        self.simRelError = 1e-2
+        self.simAbsError = 1e-4
+        self.simMaxSamples = 1 << 22
+        self.simSeed : Optional[int] = None  # None时每次仿真使用不同的随机流
+        self.simulationThread : Optional[MapSimulationThread] = None
+        # 仿真结果按管网哈希缓存在磁盘上，第一次仿真时才创建
+        self.resultCache : Optional[ResultCache] = None
+        self.importanceThread : Optional[MapImportanceThread] = None
+        # 供气充足性评估的样本数
+        self.adequacySamples = 1 << 14
+        self.adequacyThread : Optional[MapAdequacyThread] = None
+        # 自动保存的编辑日志，见enableAutosave
+        self.journal : Optional[EditJournal] = None
+        # 节点数超过virtualThreshold的地图按视野创建图元，见loadModel
+        self.virtual : Optional[MapVirtualizer] = None
+        self.virtualThreshold = 20000
+        # 拖动节点时待重算路径的管线，合并到下一次事件循环（下一帧之前）统一处理
+        self.dirtyPipes : set[PipeProxy] = set()
+        self.pipeTimer = QTimer(self)
+        self.pipeTimer.setSingleShot(True)
+        self.pipeTimer.setInterval(0)
+        self.pipeTimer.timeout.connect(self.flushPipes)
+
+    def addItem(self, item : QGraphicsItem) -> None:
+        super().addItem(item)
+        for target, items in self.registry.items():
+            if isinstance(item, target):
+                items[item] = None
+        if isinstance(item, MapProxyItemWidget):
+            self.nodesByCategory[item.category][item] = None
+
+    # 移出场景的节点同时注销编号
+    def removeItem(self, item : QGraphicsItem) -> None:
+        super().removeItem(item)
+        for items in self.registry.values():
+            items.pop(item, None)
+        if isinstance(item, MapProxyItemWidget):
+            self.nodesByCategory[item.category].pop(item, None)
+            if self.nodeById.get(item.nodeId) is item:
+                del self.nodeById[item.nodeId]
+
     def addItems(self, items : list):
         for i in items:
             self.addItem(i)
 
     # 场景中添加一个节点
-    def addProxyItemWidget(self, name: str, init_pos: QPointF, current : Optional[float] = None, errorp : Optional[float] = None)\
-            -> MapProxyItemWidget:
-        iconName = 'fa5s.gas-pump' if name == 'Gas' else 'fa5.user-circle'
-        proxy = MapProxyItemWidget(iconName, init_pos, self)
+    # nodeId为None或者已被占用时分配新的编号
+    def addProxyItemWidget(
+        self,
+        name: str,
+        init_pos: QPointF,
+        current : Optional[float] = None,
+        errorp : Optional[float] = None,
+        nodeId : Optional[int] = None,
+        proxy : Optional[MapProxyItemWidget] = None
+    ) -> MapProxyItemWidget:
+        # proxy为复用的同类节点图元（见MapVirtualizer），不再重新创建
+        if proxy is None:
+            iconName = 'fa5s.gas-pump' if name == 'Gas' else 'fa5.user-circle'
+            proxy = MapProxyItemWidget(iconName, init_pos, self)
         proxy.setPos(init_pos)
+        if nodeId is None or nodeId in self.nodeById:
+            nodeId = self.nextNodeId
+        proxy.nodeId = nodeId
+        self.nodeById[nodeId] = proxy
+        self.nextNodeId = max(self.nextNodeId, nodeId + 1)
         proxy.attr.connect(self.dock.setCurrentNodeAttr)
-        self.addItem(proxy)
+        # 加入场景之前设置属性，初始值随addNode记录，不再单独记录setNode
         if name == 'Gas':
             if current:
                 proxy.currentGasSource = current
@@ -56,14 +145,146 @@ class MapScene(QGraphicsScene):
         else:
             if current:
                 proxy.currentGasUser = current
-        self.update()
+        self.addItem(proxy)
+        if self.virtual is None:
+            self.connectivity.add_node(proxy, name == 'Gas')
+        self.recordEdit('addNode', **MapReaderObj.explain_node(proxy))
+        if not self.bulkDepth:
+            self.update()
         return proxy
 
+    # 启用自动保存；目录中已有快照或日志时先恢复上次的场景
+    def enableAutosave(self, directory : str) -> None:
+        self.journal = EditJournal(self, directory)
+        self.journal.failed.connect(self._autosaveFailed)
+        if self.journal.exists():
+            try:
+                self.loadModel(NetworkModel.from_dict(self.journal.restore()))
+            except Exception as e:
+                # 自动保存损坏不能妨碍程序启动：清空场景，坏文件改名保留
+                self.clearScene()
+                moved = self.journal.quarantine()
+                self.callStatus.emit(f'自动保存无法恢复（{e}），已另存为{"、".join(moved)}')
+            else:
+                self.callStatus.emit('已从自动保存中恢复场景')
+        self.journal.start()
+
+    # 自动保存写入失败：提示用户并停用日志，之后的编辑不再记录
+    def _autosaveFailed(self, message : str) -> None:
+        journal, self.journal = self.journal, None
+        if journal is not None:
+            journal.close()
+            journal.deleteLater()
+        self.callStatus.emit(f'自动保存已停用：{message}')
+        QMessageBox.warning(self.view, '自动保存失败', f'自动保存写入失败，之后的编辑不会被记录，请及时手动保存。\n{message}')
+
+    # 记录一次编辑；批量修改期间不逐条记录，结束时整体压缩
+    def recordEdit(self, op : str, **fields) -> None:
+        if self.journal is not None and not self.bulkDepth:
+            self.journal.record(op, **fields)
+
+    def recordLink(self, pipe : PipeProxy) -> None:
+        record = MapReaderObj.explain_pipe_path(pipe)
+        self.recordEdit('link', **{k: record[k] for k in ('a', 'b', 'bindIds', 'distance', 'errorp')})
+
+    # 拖动节点时由moveEvent调用，同一节点的连续移动在日志中合并
+    def recordMove(self, node : MapProxyItemWidget) -> None:
+        if self.journal is not None and not self.bulkDepth:
+            self.journal.record_move(node.nodeId, node.timing_pos.x(), node.timing_pos.y())
+
+    def markPipeDirty(self, pipe : PipeProxy) -> None:
+        self.dirtyPipes.add(pipe)
+        if not self.pipeTimer.isActive():
+            self.pipeTimer.start()
+
+    # 每条待更新的管线只重算一次；期间被删除或回收的管线跳过
+    def flushPipes(self) -> None:
+        pipes, self.dirtyPipes = self.dirtyPipes, set()
+        for pipe in pipes:
+            if pipe.scene() is self and pipe.endPort is not None:
+                pipe.update_pipe_path()
+
+    # 批量修改场景：期间停用BSP索引和视图重绘，结束时重建一次索引并整体重绘，可以嵌套
+    # compact为False表示不改变管网本身（例如虚拟模式下按视野增减图元），结束时不压缩自动保存日志
+    @contextmanager
+    def bulk(self, compact : bool = True) -> Iterator[None]:
+        if not self.bulkDepth:
+            self._bulkCompact = False
+            self._bulkIndexMethod = self.itemIndexMethod()
+            self.setItemIndexMethod(QGraphicsScene.NoIndex)
+            for view in self.views():
+                view.setUpdatesEnabled(False)
+        self._bulkCompact = self._bulkCompact or compact
+        self.bulkDepth += 1
+        try:
+            yield
+        finally:
+            self.bulkDepth -= 1
+            if not self.bulkDepth:
+                self.setItemIndexMethod(self._bulkIndexMethod)
+                for view in self.views():
+                    view.setUpdatesEnabled(True)
+                # 批量修改不逐条记日志，结束时直接压缩成快照
+                if self.journal is not None and self._bulkCompact:
+                    self.journal.compact()
+                self.update()
+
+    # 载入管网：规模较小时全部创建成图元；节点数超过virtualThreshold时清空场景并切换为虚拟模式，
+    # 只创建视野内的图元
+    def loadModel(self, model : NetworkModel) -> None:
+        if model.nodeCount <= self.virtualThreshold:
+            self.bulkInsert(model)
+            return
+        with self.bulk():
+            self.clearScene()
+            self.virtual = MapVirtualizer(self, model)
+            self.nextNodeId = int(model.nodeIds.max()) + 1
+            # 场景中只有视野附近的图元，场景范围按整张地图设定，否则无法滚动到其他区域
+            self.fitSceneRect(model)
+            self.virtual.refresh()
+            self.rebuildConnectivity()
+        self.callStatus.emit(f'共{model.nodeCount}个节点，已切换为按视野加载')
+
+    # 扩大场景范围以容纳整个管网，四周留出一半的余量；只扩大不缩小
+    def fitSceneRect(self, model : NetworkModel) -> None:
+        if not model.nodeCount:
+            return
+        x0, y0, x1, y1 = model.x.min(), model.y.min(), model.x.max(), model.y.max()
+        dx, dy = (x1 - x0) / 2 + NODE_W, (y1 - y0) / 2 + NODE_H
+        self.setSceneRect(QRectF(x0 - dx, y0 - dy, x1 - x0 + 2 * dx, y1 - y0 + 2 * dy).united(self.sceneRect()))
+
+    # 按紧凑管网模型的列数据一次性插入全部节点和管线，返回 (节点, 管线)，与模型中的下标一一对应
+    def bulkInsert(self, model : NetworkModel) -> tuple[list[MapProxyItemWidget], list[PipeProxy]]:
+        with self.bulk():
+            # 导入的坐标可能超出默认场景范围，超出部分无法滚动到
+            self.fitSceneRect(model)
+            nodes = [
+                self.addProxyItemWidget(
+                    CATEGORIES[category],
+                    QPointF(x, y),
+                    current=current,
+                    errorp=errorp if category == GAS else None,
+                    nodeId=nodeId
+                ) for x, y, category, current, errorp, nodeId in zip(
+                    model.x.tolist(), model.y.tolist(), model.category.tolist(),
+                    model.current.tolist(), model.errorp.tolist(), model.nodeIds.tolist()
+                )
+            ]
+            pipes = [
+                self.addPipeAndLink(nodes[src].bindPorts[a], nodes[dst].bindPorts[b], distance, errorp)
+                for src, dst, (a, b), distance, errorp in zip(
+                    model.src.tolist(), model.dst.tolist(), model.bindIds.tolist(),
+                    model.distance.tolist(), model.pipeErrorp.tolist()
+                )
+            ]
+        self.callStatus.emit(f'已载入 {len(nodes)} 个节点、{len(pipes)} 条管线')
+        return nodes, pipes
+
     # 场景中根据位置预先添加一个管线但是不连接（没添加到场景并且没绘制）
     def addPipeProxy(self, start_pos: QPointF, end_pos: QPointF, distance : Optional[float] = None, errorp : Optional[float] = None) \
             -> PipeProxy:
-        s : MixinPort | QGraphicsItem = self.itemAt(start_pos, QTransform())
-        e : MixinPort | QGraphicsItem = self.itemAt(end_pos, QTransform())
+        s = self.portAt(start_pos)
+        e = self.portAt(end_pos)
         p = PipeProxy(start_pos, s, e)
         if errorp:
             p.errorp = errorp
@@ -85,7 +306,8 @@ class MapScene(QGraphicsScene):
             -> PipeProxy:
         p = self.addPipeProxyByPort(startPort, endPort, distance, errorp)
         self.addItem(p)
-        print(f"连接了两个端口的位置：{p.mapToPortIds()}")
+        if not self.bulkDepth:
+            print(f"连接了两个端口的位置：{p.mapToPortIds()}")
         # 绑定管线自身事件
         p.pipeProxyObject.attr.connect(self.dock.setCurrentPipeAttr)
         nodeA = startPort.bind_node
@@ -93,10 +315,13 @@ class MapScene(QGraphicsScene):
         # 记录节点和管线，便于查询，而且只需要查询两次即可
         nodeA.records[nodeB] = p
         nodeB.records[nodeA] = p
+        if self.virtual is None:
+            self.connectivity.add_pipe(p, nodeA, nodeB)
         # 完成管道绘制后，此时管道存在两个端点，可以传入管道事件响应了，必须是双向绑定
-        nodeA.pipePathUpdate.connect(p.update_pipe_path)
-        nodeB.pipePathUpdate.connect(p.update_pipe_path)
+        nodeA.pipePathUpdate.connect(p.mark_dirty)
+        nodeB.pipePathUpdate.connect(p.mark_dirty)
         p.update_pipe_path()
+        self.recordLink(p)
         return p
 
     # 添加管线并且连接，通过端口位置
@@ -108,8 +333,8 @@ class MapScene(QGraphicsScene):
         errorp : Optional[float] = None
     ) -> PipeProxy:
         print(f'检测端口：{startPortPos, endPortPos}')
-        startPort : MixinPort | QGraphicsItem = self.itemAt(startPortPos, QTransform())
-        endPort: MixinPort | QGraphicsItem = self.itemAt(endPortPos, QTransform())
+        startPort = self.portAt(startPortPos)
+        endPort = self.portAt(endPortPos)
         print(f'startPort, endPort : {startPort, endPort}')
         nodeA = startPort.bind_node
         nodeB = endPort.bind_node
@@ -122,10 +347,13 @@ class MapScene(QGraphicsScene):
         # 记录节点和管线，便于查询，而且只需要查询两次即可
         nodeA.records[nodeB] = p
         nodeB.records[nodeA] = p
+        if self.virtual is None:
+            self.connectivity.add_pipe(p, nodeA, nodeB)
         # 完成管道绘制后，此时管道存在两个端点，可以传入管道事件响应了，必须是双向绑定
-        nodeA.pipePathUpdate.connect(p.update_pipe_path)
-        nodeB.pipePathUpdate.connect(p.update_pipe_path)
+        nodeA.pipePathUpdate.connect(p.mark_dirty)
+        nodeB.pipePathUpdate.connect(p.mark_dirty)
         p.update_pipe_path()
+        self.recordLink(p)
         return p
 
     def mouseMoveEvent(self, event: QGraphicsSceneMouseEvent) -> None:
@@ -134,7 +362,6 @@ class MapScene(QGraphicsScene):
         if self.current_pipe and self.is_pipe_edit:
             # 更新管道的目标位置
             self.current_pipe.set_dst(self.mouse_scene.x(), self.mouse_scene.y())
-            self.current_pipe.update()  # 刷新管道显示
         super().mouseMoveEvent(event)
 
     # 点击工具图标进行鼠标变换，变成Cross Cursor。
@@ -154,9 +381,9 @@ class MapScene(QGraphicsScene):
             self.view.setCursor(Qt.CursorShape.ArrowCursor)
             self.is_user_edit = False
 
-        elif event.button() == Qt.LeftButton and isinstance(self.itemAt(pos, QTransform()), MixinPort) and self.is_pipe_edit:
+        elif event.button() == Qt.LeftButton and self.is_pipe_edit and self.portAt(pos) is not None:
             # 选中起点端口
-            self.start_port : MixinPort | QGraphicsItem = self.itemAt(pos, QTransform())
+            self.start_port = self.portAt(pos)
             self.current_pipe = PipeProxy(pos, self.start_port, None)  # 创建管道对象
             self.addItem(self.current_pipe)  # 添加管道到场景
             self.view.setCursor(Qt.CrossCursor)  # 设置鼠标为十字
@@ -170,8 +397,8 @@ class MapScene(QGraphicsScene):
         pos = event.scenePos()
         if self.current_pipe and self.is_pipe_edit:
             # 检查释放的地方是否点击了目标端口
-            end_port = self.itemAt(pos, QTransform())
-            if isinstance(end_port, MixinPort) and end_port != self.start_port:
+            end_port = self.portAt(pos)
+            if end_port is not None and end_port != self.start_port:
                 nodeA = self.start_port.bind_node
                 nodeB = end_port.bind_node
                 # 约束：
@@ -189,16 +416,19 @@ class MapScene(QGraphicsScene):
                         return
                     # 这时候才成功地创建一条管道，这部分由于更早出现，防止逻辑错误，先不用addPipeAndLink方法代替
                     self.current_pipe.set_dst(pos.x(), pos.y())  # 更新终点坐标
-                    self.current_pipe.update()
+                    self.current_pipe.distance = QLineF(self.start_port.pos(), end_port.pos()).length()
                     print(f"连接了两个端口的位置：{self.current_pipe.mapToPortIds()}")
                     # 绑定管线自身事件
                     self.current_pipe.pipeProxyObject.attr.connect(self.dock.setCurrentPipeAttr)
                     # 记录节点和管线，便于查询，而且只需要查询两次即可
                     nodeA.records[nodeB] = self.current_pipe
                     nodeB.records[nodeA] = self.current_pipe
+                    if self.virtual is None:
+                        self.connectivity.add_pipe(self.current_pipe, nodeA, nodeB)
                     # 完成管道绘制后，此时管道存在两个端点，可以传入管道事件响应了，必须是双向绑定
-                    nodeA.pipePathUpdate.connect(self.current_pipe.update_pipe_path)
-                    nodeB.pipePathUpdate.connect(self.current_pipe.update_pipe_path)
+                    nodeA.pipePathUpdate.connect(self.current_pipe.mark_dirty)
+                    nodeB.pipePathUpdate.connect(self.current_pipe.mark_dirty)
+                    self.recordLink(self.current_pipe)
             else:
                 print("目标端口无效")
                 self.removeItem(self.current_pipe)
@@ -245,6 +475,10 @@ class MapScene(QGraphicsScene):
             rObj = MapReaderObj(self, self.views()[0])
             rObj.send.connect(lambda t : self.callStatus.emit(t))
             rObj.exporter_func()
+        elif msg == 'gis':
+            rObj = MapReaderObj(self, self.views()[0])
+            rObj.send.connect(lambda t : self.callStatus.emit(t))
+            rObj.importer_func()
         elif msg == 'inject':
             self.interfaceRequest.emit()
         elif msg == 'clear':
@@ -258,16 +492,233 @@ class MapScene(QGraphicsScene):
             self.update()
             self.view.update()
             self.callStatus.emit('已刷新场景！')
+        elif msg == 'simulate':
+            self.startSimulation()
+        elif msg == 'importance':
+            self.startImportance()
+        elif msg == 'cutsets':
+            self.analyzeCutSets()
+        elif msg == 'adequacy':
+            self.startAdequacy()
         elif msg == 'dev':
             s = self.addProxyItemWidget('Gas', QPointF(0, 0), 1000, 0.5)
             e = self.addProxyItemWidget('User', QPointF(100, 300), 1000)
             self.addPipeAndLink(s.topPort, e.leftPort, 100, 0.05)
 
+    # 启动后台仿真；正在运行时再次触发则提前停止
+    def startSimulation(self) -> None:
+        if self.simulationThread is not None and self.simulationThread.isRunning():
+            self.simulationThread.requestInterruption()
+            self.callStatus.emit('正在停止仿真...')
+            return
+        # 场景快照必须在GUI线程中读取
+        model = NetworkModel.from_scene(self)
+        if not len(model.userNodes):
+            self.callStatus.emit('场景中没有用户节点！')
+            return
+        if self.resultCache is None:
+            self.resultCache = ResultCache()
+        engine = MonteCarloEngine.from_model(model)
+        key = ResultCache.key(
+            network_digest(model.to_dict()),
+            'MonteCarloEngine.iterate',
+            {
+                'relError': self.simRelError, 'absError': self.simAbsError, 'maxSamples': self.simMaxSamples,
+                'seed': self.simSeed, 'version': ENGINE_VERSION
+            }
+        )
+        # 哈希与节点顺序无关，命中的结果按当前的用户编号重排
+        cached = self.resultCache.get(key, engine.userIds)
+        if cached is not None:
+            self.callStatus.emit('管网未变化，使用缓存的仿真结果')
+            self.simulationOver.emit(cached)
+            return
+        thread = MapSimulationThread(
+            engine, self.simRelError, self.simMaxSamples, self.simAbsError, self.simSeed, parent=self
+        )
+        thread.progress.connect(self.simulationProgress)
+        thread.copeOver.connect(self.simulationOver)
+        thread.copeOver.connect(lambda result : thread.interrupted or self.resultCache.put(key, result))
+        thread.finished.connect(self._simulationFinished)
+        self.simulationThread = thread
+        thread.start()
+
+    def _simulationFinished(self) -> None:
+        self.simulationThread.deleteLater()
+        self.simulationThread = None
+
+    # 后台计算全部气源和管线的重要度，元件顺序与MonteCarloEngine一致：先气源后管线
+    def startImportance(self) -> None:
+        if self.importanceThread is not None:
+            self.callStatus.emit('元件重要度正在计算中...')
+            return
+        if self.virtual is None:
+            nodes = self.findAllItems(MapProxyItemWidget)
+            pipes = self.findAllItems(PipeProxy)
+            model = NetworkModel.from_items(nodes, pipes)
+        else:
+            model = self.virtual.snapshot()
+        if not len(model.userNodes):
+            self.callStatus.emit('场景中没有用户节点！')
+            return
+        if self.virtual is None:
+            components = [nodes[i] for i in model.gasNodes.tolist()] + pipes
+        else:
+            # 虚拟模式下元件大多没有图元，以节点编号、两端节点编号代替，选中时再移入视野
+            ids = model.nodeIds
+            components = ids[model.gasNodes].tolist() + list(zip(ids[model.src].tolist(), ids[model.dst].tolist()))
+        names = [f'气源 ({model.x[i]:.0f}, {model.y[i]:.0f})' for i in model.gasNodes.tolist()]
+        names += [
+            f'管线 {CATEGORIES[model.category[a]]}-{CATEGORIES[model.category[b]]} #{k}'
+            for k, (a, b) in enumerate(zip(model.src.tolist(), model.dst.tolist()))
+        ]
+        thread = MapImportanceThread(MonteCarloEngine.from_model(model), parent=self)
+        thread.copeOver.connect(lambda measures : self.importanceOver.emit(measures, components, names))
+        thread.finished.connect(self._importanceFinished)
+        self.importanceThread = thread
+        self.callStatus.emit('正在计算元件重要度...')
+        thread.start()
+
+    def _importanceFinished(self) -> None:
+        self.importanceThread.deleteLater()
+        self.importanceThread = None
+
+    # 后台评估供气充足性：失效场景下气源储藏量能否满足用气量；地图中没有管线输送能力，按不受限计算
+    def startAdequacy(self) -> None:
+        if self.adequacyThread is not None:
+            self.callStatus.emit('供气充足性正在计算中...')
+            return
+        model = NetworkModel.from_scene(self)
+        if not len(model.userNodes):
+            self.callStatus.emit('场景中没有用户节点！')
+            return
+        if self.resultCache is None:
+            self.resultCache = ResultCache()
+        adequacy = SupplyAdequacy(model)
+        key = ResultCache.key(
+            network_digest(model.to_dict()),
+            'SupplyAdequacy.run',
+            {'samples': self.adequacySamples, 'seed': self.simSeed, 'version': ENGINE_VERSION}
+        )
+        cached = self.resultCache.get(key, adequacy.userIds)
+        if cached is not None:
+            self._adequacyOver(cached)
+            return
+        thread = MapAdequacyThread(adequacy, self.adequacySamples, self.simSeed, parent=self)
+        thread.copeOver.connect(lambda result : self.resultCache.put(key, result))
+        thread.copeOver.connect(self._adequacyOver)
+        thread.finished.connect(self._adequacyFinished)
+        self.adequacyThread = thread
+        self.callStatus.emit('正在评估供气充足性...')
+        thread.start()
+
+    # 选中缺供概率最高的用户，状态栏显示系统期望缺供量
+    def _adequacyOver(self, result) -> None:
+        worst = int(result.shortProbability.argmax())
+        self.selectComponent(int(result.userIds[worst]))
+        self.callStatus.emit(
+            f'供气充足性：系统期望缺供量 {result.totalExpectedUnserved:.4g}，'
+            f'缺供概率最高的用户 {result.shortProbability[worst]:.3e}（期望缺供 {result.expectedUnserved[worst]:.4g}）'
+        )
+
+    def _adequacyFinished(self) -> None:
+        self.adequacyThread.deleteLater()
+        self.adequacyThread = None
+
+    # 割集解析：按最小割集给出每个用户供气不可用度的估计值和上下界，选中上界最大的用户并在状态栏显示
+    # 割集按连通分量缓存，管网未变化时再次解析只重新读取失效率
+    def analyzeCutSets(self) -> None:
+        if self.virtual is not None:
+            self.virtual.sync()
+        result = self.cutSets.analyze_all()
+        if not result:
+            self.callStatus.emit('场景中没有用户节点！')
+            return
+        user, worst = max(result.items(), key=lambda kv: kv[1].upper)
+        self.selectComponent(user)
+        self.callStatus.emit(
+            f'割集解析：共{len(result)}个用户，最差用户不可用度 {worst.estimate:.3e} '
+            f'[{worst.lower:.3e}, {worst.upper:.3e}]，{self.cutSets.maxOrder}阶以内割集{len(worst.cutSets)}个'
+        )
+
+    # 选中并居中显示某个图元（来自重要度列表）；虚拟模式下item为元件编号
+    def selectComponent(self, item : Union[QGraphicsItem, int, tuple[int, int]]) -> None:
+        if not isinstance(item, QGraphicsItem):
+            if self.virtual is not None:
+                item = self.virtual.reveal(item)
+            elif isinstance(item, tuple):
+                item = self.pipeBetween(*item)
+            else:
+                item = self.nodeById.get(item)
+        if item is None or item.scene() is not self:
+            self.callStatus.emit('该元件已被删除！')
+            return
+        self.clearSelection()
+        item.setSelected(True)
+        for view in self.views():
+            view.centerOn(item)
+
+    # 场景坐标处的节点；端口由节点绘制，不是独立的图元
+    def nodeAt(self, pos : QPointF) -> Optional[MapProxyItemWidget]:
+        for item in self.items(pos):
+            if isinstance(item, MapProxyItemWidget):
+                return item
+        return None
+
+    # 场景坐标处的端口
+    def portAt(self, pos : QPointF) -> Optional[MixinPort]:
+        for item in self.items(pos):
+            if isinstance(item, MapProxyItemWidget):
+                port = item.portAt(item.mapFromScene(pos))
+                if port is not None:
+                    return port
+        return None
+
     # 从场景中筛选全部的XXX类型的图元
-    def findAllItems(self, target : Type[Union[MixinPort, MapProxyItemWidget, PipeProxy]])\
-            -> list[Union[MixinPort, MapProxyItemWidget, PipeProxy]]:
-        its = self.items()
-        return list(filter(lambda item: isinstance(item, target), its)) if its else []
+    # 场景中某一类图元，按加入场景的顺序；登记过的类型直接取登记表，其他类型退回遍历
+    def findAllItems(self, target : Type[Union[MapProxyItemWidget, PipeProxy]])\
+            -> list[Union[MapProxyItemWidget, PipeProxy]]:
+        if target in self.registry:
+            return list(self.registry[target])
+        return [item for item in self.items() if isinstance(item, target)]
+
+    # 某一类别（'Gas'/'User'）的全部节点
+    def findNodes(self, category : str) -> list[MapProxyItemWidget]:
+        return list(self.nodesByCategory[category])
+
+    # 两端节点编号之间的管线，不存在时返回None
+    def pipeBetween(self, a : int, b : int) -> Optional[PipeProxy]:
+        nodeA, nodeB = self.nodeById.get(a), self.nodeById.get(b)
+        return nodeA.records.get(nodeB) if nodeA is not None and nodeB is not None else None
+
+    # 远景档位下视图批量绘制用的几何：(气源节点中心, 用户节点中心, 管线两端节点中心 [ax, ay, bx, by])
+    def lodGeometry(self, rect : QRectF) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self.virtual is not None:
+            return self.virtual.lodGeometry(rect)
+        center = MapProxyItemWidget.FRAME.center()
+        gas, users, lines = [], [], []
+        for item in self.items(rect):
+            if isinstance(item, MapProxyItemWidget):
+                pos = item.pos() + center
+                (gas if item.category == 'Gas' else users).append((pos.x(), pos.y()))
+            elif isinstance(item, PipeProxy) and item.endPort is not None:
+                a = item.startPort.bind_node.pos() + center
+                b = item.endPort.bind_node.pos() + center
+                lines.append((a.x(), a.y(), b.x(), b.y()))
+        return (
+            np.array(gas, dtype=np.float64).reshape(-1, 2),
+            np.array(users, dtype=np.float64).reshape(-1, 2),
+            np.array(lines, dtype=np.float64).reshape(-1, 4)
+        )
+
+    # 虚拟模式下按模型重建connectivity和cutSets；之后用户的增删在MapVirtualizer.sync中增量同步，
+    # 按视野增减图元不影响索引。键：节点为节点编号，管线为 (a, b, 行号)，失效率在求值时从模型读取
+    def rebuildConnectivity(self) -> None:
+        if self.virtual is None:
+            return
+        self.virtual.sync()
+        self.virtual.build_index(self.connectivity)
+        self.cutSets = CutSetAnalyzer(self.connectivity, self.virtual.errorp)
 
     # 清理场景
     # 先清理管线再清理节点，最后清理场景中没考虑的图元
@@ -276,19 +727,15 @@ class MapScene(QGraphicsScene):
         for pipe in all_pipes:
             self.removeItem(pipe)
         self.clear()
-
-    def pipe_project(self, pipes : list) -> None:
-        for pipe in pipes:
-
-            pa = QPointF(pipe['ax'], pipe['ay'])
-            pb = QPointF(pipe['bx'], pipe['by'])
-
-            nodeA : MapProxyItemWidget = self.itemAt(pa, QTransform()).parentItem()
-            nodeB : MapProxyItemWidget = self.itemAt(pb, QTransform()).parentItem()
-            a, b = pipe['bindIds']
-            self.addPipeAndLink(
-                nodeA.bindPorts[a],
-                nodeB.bindPorts[b],
-                pipe.get('distance', None),
-                pipe['errorp']
-            )
\ No newline at end of file
+        for items in (*self.registry.values(), *self.nodesByCategory.values()):
+            items.clear()
+        self.connectivity.clear()
+        self.cutSets = CutSetAnalyzer(self.connectivity, lambda key: key.errorp)
+        if self.virtual is not None:
+            self.virtual.close()
+            self.virtual.deleteLater()
+            self.virtual = None
+        self.setSceneRect(self.SCENE_RECT)
+        self.nodeById.clear()
+        self.nextNodeId = 0
+        self.recordEdit('clear')
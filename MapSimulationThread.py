@@ -0,0 +1,79 @@
+# 后台可靠性仿真线程
+# 引擎在GUI线程中由场景快照构建，线程内只做numpy计算，每批结果通过信号交给界面
+
+from typing import Optional
+
+import numpy as np
+from PyQt5.QtCore import *
+
+from ReliabilityEngine import MonteCarloEngine, ReliabilityResult
+from ComponentImportance import ComponentImportance
+from SupplyAdequacy import SupplyAdequacy
+
+class MapSimulationThread(QThread):
+    progress = pyqtSignal(object, float)  # 累计结果, 估计完成比例
+    copeOver = pyqtSignal(object)  # 最终结果
+
+    def __init__(
+        self,
+        engine : MonteCarloEngine,
+        relError : Optional[float] = 1e-2,
+        maxSamples : int = 1 << 22,
+        absError : float = 1e-4,
+        seed : Optional[int] = None,
+        parent : Optional[QObject] = None
+    ):
+        super().__init__(parent)
+        self.engine = engine
+        self.relError = relError
+        self.maxSamples = maxSamples
+        self.absError = absError
+        self.seed = seed
+        self.interrupted = False  # 是否被提前停止，提前停止的结果不写入缓存
+
+    # 误差按 1/sqrt(n) 下降，据此估计达到目标还需要的比例；结构上不可达的用户不计入
+    def _fraction(self, result : ReliabilityResult) -> float:
+        fraction = result.samples / self.maxSamples
+        ratio = result.errorRatio(self.relError, self.absError)[self.engine.reachable] if self.relError else []
+        if len(ratio):
+            worst = float(ratio.max())
+            fraction = max(fraction, 1 / worst ** 2 if worst > 0 else 1.0)
+        return min(fraction, 1.0)
+
+    def run(self) -> None:
+        result = ReliabilityResult.empty(self.engine.userIds)
+        for result in self.engine.iterate(self.seed, self.relError, self.maxSamples, self.absError):
+            self.progress.emit(result, self._fraction(result))
+            # 外部调用requestInterruption()后在批次之间停下，已有的结果照常交出
+            if self.isInterruptionRequested():
+                self.interrupted = True
+                break
+        self.copeOver.emit(result)
+
+# 后台计算元件重要度，失效率较低时先用交叉熵法确定偏置失效率
+class MapImportanceThread(QThread):
+    copeOver = pyqtSignal(object)  # ImportanceMeasures
+
+    def __init__(self, engine : MonteCarloEngine, samples : int = 1 << 16, seed : Optional[int] = None, parent : Optional[QObject] = None):
+        super().__init__(parent)
+        self.engine = engine
+        self.samples = samples
+        self.seed = seed
+
+    def run(self) -> None:
+        ceSeq, mainSeq = np.random.SeedSequence(self.seed).spawn(2)
+        bias = self.engine.cross_entropy_bias(ceSeq)
+        self.copeOver.emit(ComponentImportance(self.engine, bias).run(self.samples, mainSeq))
+
+# 后台评估供气充足性，模型和流网络在GUI线程中构建好，线程内只做计算
+class MapAdequacyThread(QThread):
+    copeOver = pyqtSignal(object)  # AdequacyResult
+
+    def __init__(self, adequacy : SupplyAdequacy, samples : int = 1 << 14, seed : Optional[int] = None, parent : Optional[QObject] = None):
+        super().__init__(parent)
+        self.adequacy = adequacy
+        self.samples = samples
+        self.seed = seed
+
+    def run(self) -> None:
+        self.copeOver.emit(self.adequacy.run(self.samples, self.seed))
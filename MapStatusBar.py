@@ -18,6 +18,9 @@ class MapStatusBar(QStatusBar):
         self.cpulabel = QLabel("CPU 占用: 0%", self)
         self.memorylabel = QLabel("内存占用: 0", self)
         self.process = psutil.Process()
+        # 仿真进度，仅在仿真运行时显示
+        self.simulationLabel = QLabel(self)
+        self.simulationBar = QProgressBar(self)
 
         self.setUI()
 
@@ -29,6 +32,34 @@ class MapStatusBar(QStatusBar):
         self.addWidget(self.cpulabel)
         self.addWidget(self.memorylabel)
 
+        self.simulationBar.setRange(0, 1000)
+        self.simulationBar.setMaximumWidth(160)
+        self.simulationBar.setTextVisible(False)
+        self.addPermanentWidget(self.simulationLabel)
+        self.addPermanentWidget(self.simulationBar)
+        self.simulationLabel.hide()
+        self.simulationBar.hide()
+
+    # 仿真中间结果：样本数、最差用户的供气概率及置信区间、相对误差
+    def showSimulation(self, result, fraction : float) -> None:
+        self.simulationBar.show()
+        self.simulationLabel.show()
+        self.simulationBar.setValue(int(fraction * 1000))
+        if not len(result.userIds):
+            self.simulationLabel.setText(f"仿真样本: {result.samples}")
+            return
+        worst = int(result.probability.argmin())
+        low, high = result.interval()
+        self.simulationLabel.setText(
+            f"仿真样本: {result.samples}  "
+            f"最低供气概率: {result.probability[worst]:.6f} [{low[worst]:.6f}, {high[worst]:.6f}]  "
+            f"最大相对误差: {result.relativeError.max():.2e}"
+        )
+
+    def finishSimulation(self, result) -> None:
+        self.simulationBar.hide()
+        self.showMessage(f"仿真结束，共 {result.samples} 个样本", 5000)
+
     def __update_time(self):
         self.online_time = self.online_time.addSecs(1)
         self.timelabel.setText(f"在线时间: {self.online_time.toString()}")
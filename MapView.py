@@ -2,51 +2,108 @@
 
 import sys
 from typing import Optional
+
+import numpy as np
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 
+from MapLod import LOD_FULL, LOD_ICON, LOD_DOT, lod_tier
+
+# 各档的渲染选项，远景不做抗锯齿
+LOD_RENDER_HINTS = {
+    LOD_FULL: QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform,
+    LOD_ICON: QPainter.Antialiasing | QPainter.SmoothPixmapTransform,
+    LOD_DOT: QPainter.RenderHints()
+}
+
+GRID_SIZE = 50  # 背景网格的基本间距
+GRID_MIN_PIXELS = 10  # 屏幕上网格线的最小间距（像素）
+GRID_MAX_PIXELS = 80  # 屏幕上网格线的最大间距（像素），不小于GRID_MIN_PIXELS的两倍，两个方向的调整才不会来回振荡
+
+# (n, 2)的坐标数组直接写入QPolygonF的内存，避免逐点构造QPointF
+def _polygon(xy : np.ndarray) -> QPolygonF:
+    polygon = QPolygonF(len(xy))
+    buffer = polygon.data()
+    buffer.setsize(len(xy) * 16)
+    np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)[:] = xy
+    return polygon
+
 class MapView(QGraphicsView):
+    viewportChanged = pyqtSignal()  # 滚动、缩放或改变大小后，可见的场景范围变化
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         # 缩放控制
         self.zoom_level = 1.0
-        self.zoom_min = 0.2
+        self.zoom_min = 0.02
         self.zoom_max = 5.0
+        self.lod = LOD_FULL
 
         self.setUI()
 
     def setUI(self) -> None:
         # 场景拖拽
         self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
-        # 渲染模式
-        self.setRenderHints(QPainter.Antialiasing |  # 抗锯齿
-                            QPainter.HighQualityAntialiasing |  # 高品质抗锯齿
-                            QPainter.TextAntialiasing |  # 文字抗锯齿
-                            QPainter.SmoothPixmapTransform |  # 使图元变换更加平滑
-                            QPainter.LosslessImageRendering)  # 不失真的图片渲染
-        # 视窗更新模式
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        # 渲染模式随细节档位切换
+        self.setRenderHints(LOD_RENDER_HINTS[self.lod])
+        # 视窗更新模式：只重绘变化的区域
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        # 缓存背景网格，平移时只补画新露出的部分，缩放时自动失效重画
+        self.setCacheMode(QGraphicsView.CacheBackground)
+
+    # 缩放后按比例切换细节档位
+    def update_lod(self) -> None:
+        lod = lod_tier(self.transform().m11())
+        if lod != self.lod:
+            self.lod = lod
+            self.setRenderHints(LOD_RENDER_HINTS[lod])
+            self.viewport().update()
+
+    # 远景档位下由场景提供视野内的点和线，一次drawPoints/drawLines画完
+    def drawForeground(self, painter : QPainter, rect : QRectF) -> None:
+        super().drawForeground(painter, rect)
+        scene = self.scene()
+        if self.lod != LOD_DOT or not hasattr(scene, 'lodGeometry'):
+            return
+        gas, users, lines = scene.lodGeometry(rect)
+        scale = self.transform().m11()
+        # 不足一个像素长的管线被节点的点覆盖，不画
+        lines = lines[np.hypot(lines[:, 2] - lines[:, 0], lines[:, 3] - lines[:, 1]) * scale >= 1.0]
+        painter.setPen(QPen(Qt.darkGray, 0))
+        painter.drawLines(_polygon(lines.reshape(-1, 2)))
+        for xy, color in ((users, Qt.darkBlue), (gas, Qt.red)):
+            # 同一个像素里的节点只画一次
+            _, first = np.unique(np.floor(xy * scale).astype(np.int64), axis=0, return_index=True)
+            pen = QPen(color, 4)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.drawPoints(_polygon(xy[first]))
 
     def drawBackground(self, painter : QPainter, rect : QRectF) -> None:
-        """优化绘制网格的方法，避免重复创建 QGraphicsItem"""
-        grid_size = 50
-        pen = QPen(Qt.lightGray)
-        pen.setWidth(1)
-        painter.setPen(pen)
-
-        left = int(rect.left()) - (int(rect.left()) % grid_size)
-        top = int(rect.top()) - (int(rect.top()) % grid_size)
-        right = int(rect.right())
-        bottom = int(rect.bottom())
-        # 绘制竖直线
-        for x in range(left, right, grid_size):
-            painter.drawLine(x, top, x, bottom)
-
-        # 绘制水平线
-        for y in range(top, bottom, grid_size):
-            painter.drawLine(left, y, right, y)
+        """一次drawLines画出可见范围内的网格；缩小时网格间距成倍加大，放大时成倍减小，
+        屏幕上的线距保持在GRID_MIN_PIXELS和GRID_MAX_PIXELS之间"""
+        scale = self.transform().m11()
+        grid_size = GRID_SIZE
+        while grid_size * scale < GRID_MIN_PIXELS:
+            grid_size *= 2
+        while grid_size * scale > GRID_MAX_PIXELS:
+            grid_size /= 2
+        painter.setPen(QPen(Qt.lightGray, 0))
+
+        left = np.floor(rect.left() / grid_size) * grid_size
+        top = np.floor(rect.top() / grid_size) * grid_size
+        right = rect.right()
+        bottom = rect.bottom()
+        xs = np.arange(left, right, grid_size)
+        ys = np.arange(top, bottom, grid_size)
+        lines = np.empty((len(xs) + len(ys), 4))
+        # 竖直线
+        lines[:len(xs)] = np.column_stack((xs, np.full_like(xs, top), xs, np.full_like(xs, bottom)))
+        # 水平线
+        lines[len(xs):] = np.column_stack((np.full_like(ys, left), ys, np.full_like(ys, right), ys))
+        painter.drawLines(_polygon(lines.reshape(-1, 2)))
 
         super().drawBackground(painter, rect)
 
@@ -63,4 +120,21 @@ class MapView(QGraphicsView):
             if self.zoom_level > self.zoom_min:
                 self.scale(1 / zoom_factor, 1 / zoom_factor)
                 self.zoom_level /= zoom_factor
+        self.update_lod()
+        self.viewportChanged.emit()
+
+    # 直接设定缩放比例
+    def zoom_to(self, scale : float) -> None:
+        self.setTransform(QTransform.fromScale(scale, scale))
+        self.zoom_level = scale
+        self.update_lod()
+        self.viewportChanged.emit()
+
+    def scrollContentsBy(self, dx : int, dy : int) -> None:
+        super().scrollContentsBy(dx, dy)
+        self.viewportChanged.emit()
+
+    def resizeEvent(self, event : QResizeEvent) -> None:
+        super().resizeEvent(event)
+        self.viewportChanged.emit()
 
@@ -0,0 +1,370 @@
+# 大地图的虚拟化场景
+# 节点和管线保存在紧凑模型中，只有与视野（外加一圈余量）相交的部分才创建成图元。
+# 视野变化时释放移出视野的图元，节点图元放回对象池，下次直接复用，不再重新创建代理控件和端口；
+# 内存和交互开销只与视野内的元件数有关，与管网规模无关。
+# 模型是权威数据：释放图元时写回坐标和属性，取快照前再把场景中新增、删除的元件同步进模型
+
+from typing import Optional, Union
+
+import numpy as np
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+
+from MapProxyItemWidget import MapProxyItemWidget
+from MapLod import LOD_DOT, lod_tier
+from MapPipeProxy import PipeProxy
+from NetworkModel import NetworkModel, BINARY_COLUMNS, CATEGORIES, GAS
+from SpatialGrid import SpatialGrid
+from ConnectivityIndex import ConnectivityIndex
+
+# 节点图元的大致尺寸，查询范围按它向左上扩展（节点坐标是图元左上角）
+NODE_W = 135.0
+NODE_H = 80.0
+
+class MapVirtualizer(QObject):
+    # margin：视野四周额外创建的范围，占视野宽高的比例
+    # maxNodes：同时存在的节点图元上限，缩得很小时只创建离视野中心最近的这些节点
+    def __init__(
+        self,
+        bind_scene : 'MapScene',
+        model : NetworkModel,
+        margin : float = 0.5,
+        cellSize : float = 1024.0,
+        maxNodes : int = 4000
+    ):
+        super().__init__(bind_scene)
+        self.bind_scene = bind_scene
+        self.margin = margin
+        self.cellSize = cellSize
+        self.maxNodes = maxNodes
+        # 可修改的列副本，删除的元件只做标记，取快照时再压缩
+        self.model = NetworkModel(
+            **{name: np.array(getattr(model, name)) for name, _ in BINARY_COLUMNS},
+            version=model.version
+        )
+        self.nodeAlive = np.ones(model.nodeCount, dtype=bool)
+        self.pipeAlive = np.ones(model.pipeCount, dtype=bool)
+        # 节点编号 -> 行号，连通性索引按节点编号查失效率时使用
+        self.nodeRow : dict[int, int] = dict(zip(self.model.nodeIds.tolist(), range(model.nodeCount)))
+
+        # 已创建的图元：行号 <-> 图元
+        self.nodeItems : dict[int, MapProxyItemWidget] = {}
+        self.pipeItems : dict[int, PipeProxy] = {}
+        self.nodeRows : dict[MapProxyItemWidget, int] = {}
+        self.pipeRows : dict[PipeProxy, int] = {}
+        # 释放后待复用的节点图元
+        self.pool : dict[str, list[MapProxyItemWidget]] = {'Gas': [], 'User': []}
+
+        self.nodeGrid : Optional[SpatialGrid] = None
+        self.pipeGrid : Optional[SpatialGrid] = None
+        self.pipeGridRows = np.zeros(0, dtype=np.int64)
+        self.gridDirty = True
+
+        # 滚动、缩放时会连续触发，合并到下一次事件循环统一刷新
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.refresh)
+        for view in bind_scene.views():
+            if hasattr(view, 'viewportChanged'):
+                view.viewportChanged.connect(self.timer.start)
+
+    @property
+    def materializedCount(self) -> int:
+        return len(self.nodeItems)
+
+    # ---------------- 空间索引 ----------------
+
+    def _build_grids(self) -> None:
+        m = self.model
+        nodes = np.flatnonzero(self.nodeAlive)
+        self.nodeGrid = SpatialGrid(self.cellSize, m.x[nodes], m.y[nodes], nodes)
+        pipes = np.flatnonzero(self.pipeAlive)
+        src, dst = m.src[pipes], m.dst[pipes]
+        self.pipeGrid = SpatialGrid.from_segments(self.cellSize, m.x[src], m.y[src], m.x[dst], m.y[dst])
+        self.pipeGridRows = pipes
+        self.gridDirty = False
+
+    def visibleRect(self) -> QRectF:
+        rect = QRectF()
+        for view in self.bind_scene.views():
+            rect = rect.united(view.mapToScene(view.viewport().rect()).boundingRect())
+        dx, dy = rect.width() * self.margin, rect.height() * self.margin
+        return rect.adjusted(-dx - NODE_W, -dy - NODE_H, dx, dy)
+
+    # ---------------- 与场景同步 ----------------
+
+    def _write_node(self, row : int, node : MapProxyItemWidget) -> bool:
+        m = self.model
+        x, y = node.timing_pos.x(), node.timing_pos.y()
+        moved = x != m.x[row] or y != m.y[row]
+        m.x[row], m.y[row] = x, y
+        if node.category == 'Gas':
+            m.current[row], m.errorp[row] = node.currentGasSource, node.errorp
+        else:
+            m.current[row] = node.currentGasUser
+        return moved
+
+    def _write_pipe(self, row : int, pipe : PipeProxy) -> None:
+        self.model.distance[row] = pipe.distance
+        self.model.pipeErrorp[row] = pipe.errorp
+
+    # 写回已创建图元的坐标和属性，并把场景中的增删同步进模型；坐标或拓扑变化时标记索引需要重建
+    def sync(self) -> None:
+        scene = self.bind_scene
+        m = self.model
+        # 用户删除的节点，连带的管线在模型中一起删除
+        pipeAlive = self.pipeAlive.copy()
+        deleted = [row for row, node in self.nodeItems.items() if node.scene() is not scene]
+        if deleted:
+            for row in deleted:
+                del self.nodeRows[self.nodeItems.pop(row)]
+                del self.nodeRow[int(m.nodeIds[row])]
+            self.nodeAlive[deleted] = False
+            self.pipeAlive[np.isin(m.src, deleted) | np.isin(m.dst, deleted)] = False
+            self.gridDirty = True
+        for row, pipe in list(self.pipeItems.items()):
+            if not self.pipeAlive[row] or pipe.scene() is not scene:
+                self.pipeAlive[row] = False
+                del self.pipeRows[self.pipeItems.pop(row)]
+                self.gridDirty = True
+            else:
+                self._write_pipe(row, pipe)
+        removedPipes = np.flatnonzero(pipeAlive & ~self.pipeAlive)
+        for row, node in self.nodeItems.items():
+            if self._write_node(row, node):
+                self.gridDirty = True
+
+        # 用户新建的节点和管线追加到模型末尾
+        newNodes = [node for node in scene.nodeById.values() if node not in self.nodeRows]
+        if newNodes:
+            added = NetworkModel.from_items(newNodes, [])
+            first = m.nodeCount
+            for name in ('x', 'y', 'category', 'current', 'errorp', 'nodeIds'):
+                setattr(m, name, np.concatenate((getattr(m, name), getattr(added, name))))
+            self.nodeAlive = np.concatenate((self.nodeAlive, np.ones(len(newNodes), dtype=bool)))
+            for row, node in enumerate(newNodes, start=first):
+                self.nodeItems[row] = node
+                self.nodeRows[node] = row
+                self.nodeRow[node.nodeId] = row
+            self.gridDirty = True
+        newPipes = list({
+            pipe for node in self.nodeItems.values() for pipe in node.records.values()
+            if pipe not in self.pipeRows and pipe.scene() is scene
+        })
+        if newPipes:
+            first = m.pipeCount
+            m.src = np.concatenate((m.src, [self.nodeRows[p.startPort.bind_node] for p in newPipes]))
+            m.dst = np.concatenate((m.dst, [self.nodeRows[p.endPort.bind_node] for p in newPipes]))
+            m.bindIds = np.concatenate((m.bindIds, np.array([p.mapToPortIds() for p in newPipes], dtype=np.int8)))
+            m.distance = np.concatenate((m.distance, [p.distance for p in newPipes]))
+            m.pipeErrorp = np.concatenate((m.pipeErrorp, [p.errorp for p in newPipes]))
+            self.pipeAlive = np.concatenate((self.pipeAlive, np.ones(len(newPipes), dtype=bool)))
+            for row, pipe in enumerate(newPipes, start=first):
+                self.pipeItems[row] = pipe
+                self.pipeRows[pipe] = row
+            self.gridDirty = True
+        if deleted or len(removedPipes) or newNodes or newPipes:
+            self._index_edits(
+                deleted, removedPipes.tolist(),
+                range(m.nodeCount - len(newNodes), m.nodeCount), range(m.pipeCount - len(newPipes), m.pipeCount)
+            )
+
+    # ---------------- 连通性索引 ----------------
+
+    # 连通性索引中的键：节点为节点编号，管线为 (a, b, 行号)，并联管线各自是独立的元件
+    def pipeKey(self, row : int) -> tuple[int, int, int]:
+        m = self.model
+        return int(m.nodeIds[m.src[row]]), int(m.nodeIds[m.dst[row]]), row
+
+    # 元件的失效率，供CutSetAnalyzer求值时读取
+    def errorp(self, key : Union[int, tuple[int, int, int]]) -> float:
+        if isinstance(key, tuple):
+            return float(self.model.pipeErrorp[key[2]])
+        return float(self.model.errorp[self.nodeRow[key]])
+
+    # 按模型全部重建场景的连通性索引
+    def build_index(self, index : ConnectivityIndex) -> None:
+        m = self.model
+        index.clear()
+        for row in np.flatnonzero(self.nodeAlive).tolist():
+            index.add_node(int(m.nodeIds[row]), m.category[row] == GAS)
+        for row in np.flatnonzero(self.pipeAlive).tolist():
+            key = self.pipeKey(row)
+            index.add_pipe(key, key[0], key[1])
+
+    # 用户的增删（sync中发现的）同步进场景的连通性索引；按视野增减图元不改变管网，不经过这里
+    def _index_edits(self, removedNodes, removedPipes, addedNodes, addedPipes) -> None:
+        index = self.bind_scene.connectivity
+        m = self.model
+        for row in removedPipes:
+            index.remove_pipe(self.pipeKey(row))
+        for row in removedNodes:
+            index.remove_node(int(m.nodeIds[row]))
+        for row in addedNodes:
+            index.add_node(int(m.nodeIds[row]), m.category[row] == GAS)
+        for row in addedPipes:
+            key = self.pipeKey(row)
+            index.add_pipe(key, key[0], key[1])
+
+    # 当前管网的完整快照（去掉已删除的行），与非虚拟模式下NetworkModel.from_scene的结果等价
+    def snapshot(self) -> NetworkModel:
+        self.sync()
+        m = self.model
+        nodes = np.flatnonzero(self.nodeAlive)
+        pipes = np.flatnonzero(self.pipeAlive)
+        remap = np.full(m.nodeCount, -1, dtype=np.int64)
+        remap[nodes] = np.arange(len(nodes))
+        return NetworkModel(
+            x=m.x[nodes], y=m.y[nodes], category=m.category[nodes], current=m.current[nodes], errorp=m.errorp[nodes],
+            src=remap[m.src[pipes]], dst=remap[m.dst[pipes]], bindIds=m.bindIds[pipes],
+            distance=m.distance[pipes], pipeErrorp=m.pipeErrorp[pipes],
+            version=m.version, nodeIds=m.nodeIds[nodes]
+        )
+
+    # ---------------- 创建与回收 ----------------
+
+    def _release_pipe(self, row : int) -> None:
+        scene = self.bind_scene
+        pipe = self.pipeItems.pop(row)
+        del self.pipeRows[pipe]
+        self._write_pipe(row, pipe)
+        nodeA, nodeB = pipe.startPort.bind_node, pipe.endPort.bind_node
+        nodeA.records.inverse.pop(pipe, None)
+        nodeB.records.inverse.pop(pipe, None)
+        nodeA.pipePathUpdate.disconnect(pipe.mark_dirty)
+        nodeB.pipePathUpdate.disconnect(pipe.mark_dirty)
+        scene.removeItem(pipe)
+
+    def _release_node(self, row : int) -> None:
+        scene = self.bind_scene
+        node = self.nodeItems.pop(row)
+        del self.nodeRows[node]
+        if self._write_node(row, node):
+            self.gridDirty = True
+        node.attr.disconnect()
+        node.records.clear()
+        node.setSelected(False)
+        scene.removeItem(node)
+        self.pool[node.category].append(node)
+
+    def _create_node(self, row : int) -> None:
+        m = self.model
+        category = CATEGORIES[m.category[row]]
+        pool = self.pool[category]
+        node = self.bind_scene.addProxyItemWidget(
+            category,
+            QPointF(m.x[row], m.y[row]),
+            nodeId=int(m.nodeIds[row]),
+            proxy=pool.pop() if pool else None
+        )
+        if m.category[row] == GAS:
+            node.currentGasSource, node.errorp = float(m.current[row]), float(m.errorp[row])
+        else:
+            node.currentGasUser = float(m.current[row])
+        self.nodeItems[row] = node
+        self.nodeRows[node] = row
+
+    def _create_pipe(self, row : int) -> None:
+        m = self.model
+        a, b = m.bindIds[row].tolist()
+        pipe = self.bind_scene.addPipeAndLink(
+            self.nodeItems[int(m.src[row])].bindPorts[a],
+            self.nodeItems[int(m.dst[row])].bindPorts[b],
+            float(m.distance[row]),
+            float(m.pipeErrorp[row])
+        )
+        self.pipeItems[row] = pipe
+        self.pipeRows[pipe] = row
+
+    # 按当前视野增减图元
+    def refresh(self) -> None:
+        scene = self.bind_scene
+        m = self.model
+        self.sync()
+        if self.gridDirty:
+            self._build_grids()
+        rect = self.visibleRect()
+        box = (rect.left(), rect.top(), rect.right(), rect.bottom())
+        pipes = self.pipeGridRows[self.pipeGrid.query(*box)]
+        pipes = pipes[self.pipeAlive[pipes]]
+        nodes = self.nodeGrid.query(*box)
+        # 所有视图都在远景档位时由视图直接画模型数据，不需要创建图元
+        if all(lod_tier(view.transform().m11()) == LOD_DOT for view in scene.views()):
+            nodes, pipes = nodes[:0], pipes[:0]
+        # 与视野相交的管线，两端节点即使在视野外也要创建
+        nodes = np.union1d(nodes[self.nodeAlive[nodes]], np.concatenate((m.src[pipes], m.dst[pipes])))
+        if len(nodes) > self.maxNodes:
+            center = rect.center()
+            nearest = np.argsort(np.hypot(m.x[nodes] - center.x(), m.y[nodes] - center.y()), kind='stable')
+            nodes = np.sort(nodes[nearest[:self.maxNodes]])
+            pipes = pipes[np.isin(m.src[pipes], nodes) & np.isin(m.dst[pipes], nodes)]
+        # 选中或正在拖动的节点保留
+        grabber = scene.mouseGrabberItem()
+        keep = {row for row, node in self.nodeItems.items() if node.isSelected() or node is grabber}
+        wantNodes = set(nodes.tolist()) | keep
+        wantPipes = set(pipes.tolist())
+
+        with scene.bulk(compact=False):
+            for row in [row for row in self.pipeItems if row not in wantPipes]:
+                self._release_pipe(row)
+            for row in [row for row in self.nodeItems if row not in wantNodes]:
+                self._release_node(row)
+            for row in sorted(wantNodes - self.nodeItems.keys()):
+                self._create_node(row)
+            for row in sorted(wantPipes - self.pipeItems.keys()):
+                self._create_pipe(row)
+
+    # 远景档位下视图批量绘制用的几何，直接取自模型，格式同MapScene.lodGeometry
+    def lodGeometry(self, rect : QRectF) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        self.sync()
+        if self.gridDirty:
+            self._build_grids()
+        m = self.model
+        box = (rect.left() - NODE_W, rect.top() - NODE_H, rect.right(), rect.bottom())
+        nodes = self.nodeGrid.query(*box)
+        nodes = nodes[self.nodeAlive[nodes]]
+        pipes = self.pipeGridRows[self.pipeGrid.query(*box)]
+        pipes = pipes[self.pipeAlive[pipes]]
+        center = MapProxyItemWidget.FRAME.center()
+        cx, cy = center.x(), center.y()
+        xy = np.column_stack((m.x[nodes] + cx, m.y[nodes] + cy))
+        gas = m.category[nodes] == GAS
+        src, dst = m.src[pipes], m.dst[pipes]
+        lines = np.column_stack((m.x[src] + cx, m.y[src] + cy, m.x[dst] + cx, m.y[dst] + cy))
+        return xy[gas], xy[~gas], lines
+
+    # 把某个元件移入视野并返回它的图元；key为节点编号或者 (a, b) 两端节点编号，元件不存在时返回None
+    def reveal(self, key : Union[int, tuple[int, int]]) -> Optional[QGraphicsItem]:
+        self.sync()
+        m = self.model
+        if isinstance(key, tuple):
+            a, b = (np.flatnonzero((m.nodeIds == k) & self.nodeAlive) for k in key)
+            if not len(a) or not len(b):
+                return None
+            rows = np.flatnonzero(self.pipeAlive & (
+                ((m.src == a[0]) & (m.dst == b[0])) | ((m.src == b[0]) & (m.dst == a[0]))
+            ))
+            if not len(rows):
+                return None
+            center = QPointF((m.x[a[0]] + m.x[b[0]]) / 2, (m.y[a[0]] + m.y[b[0]]) / 2)
+        else:
+            rows = np.flatnonzero((m.nodeIds == key) & self.nodeAlive)
+            if not len(rows):
+                return None
+            center = QPointF(m.x[rows[0]] + NODE_W / 2, m.y[rows[0]] + NODE_H / 2)
+        for view in self.bind_scene.views():
+            # 远景档位不创建图元，先放大到能看清元件
+            if lod_tier(view.transform().m11()) == LOD_DOT:
+                view.zoom_to(1.0)
+            view.centerOn(center)
+        self.refresh()
+        row = int(rows[0])
+        return self.pipeItems.get(row) if isinstance(key, tuple) else self.nodeItems.get(row)
+
+    # 退出虚拟模式时断开视图信号，图元随场景一起清理
+    def close(self) -> None:
+        self.timer.stop()
+        for view in self.bind_scene.views():
+            if hasattr(view, 'viewportChanged'):
+                view.viewportChanged.disconnect(self.timer.start)
@@ -21,12 +21,17 @@ class MapToolBar(QToolBar):
 
         load_map = QAction(QAwesomeIcon('ei.folder-open'), '导入地图', self)
         export_map = QAction(QAwesomeIcon('fa5s.file-export'), '导出地图', self)
+        import_gis = QAction(QAwesomeIcon('fa5s.globe-asia'), '导入GIS数据', self)
         gas_source = QAction(QAwesomeIcon('fa5s.gas-pump'), '添加气源', self)
         user_agent = QAction(QAwesomeIcon('fa5.user-circle'), '添加用户', self)
         pipe_link = QAction(QAwesomeIcon('mdi6.pipe'), '供应管线', self)
         clear_all = QAction(QAwesomeIcon('mdi6.map-marker-remove-outline'), '清场', self)
         inject_api = QAction(QAwesomeIcon('fa5s.syringe'), '注入', self)
         update_scene = QAction(QAwesomeIcon('mdi6.update'), '刷新', self)
+        simulate_act = QAction(QAwesomeIcon('fa5s.play-circle'), '可靠性仿真', self)
+        importance_act = QAction(QAwesomeIcon('fa5s.sort-amount-down'), '元件重要度', self)
+        cutset_act = QAction(QAwesomeIcon('fa5s.cut'), '割集解析', self)
+        adequacy_act = QAction(QAwesomeIcon('fa5s.balance-scale'), '供气充足性', self)
         develop_act = QAction(QAwesomeIcon('fa5b.connectdevelop'), '开发', self)
 
         # 先不考虑点了gas又点user的锁冲突问题
@@ -35,12 +40,17 @@ class MapToolBar(QToolBar):
         pipe_link.triggered.connect(lambda : self.send.emit('pipe'))
         load_map.triggered.connect(lambda : self.send.emit('load'))
         export_map.triggered.connect(lambda : self.send.emit('export'))
+        import_gis.triggered.connect(lambda : self.send.emit('gis'))
         inject_api.triggered.connect(lambda : self.send.emit('inject'))
         clear_all.triggered.connect(lambda : self.send.emit('clear'))
         update_scene.triggered.connect(lambda : self.send.emit('update'))
+        simulate_act.triggered.connect(lambda : self.send.emit('simulate'))
+        importance_act.triggered.connect(lambda : self.send.emit('importance'))
+        cutset_act.triggered.connect(lambda : self.send.emit('cutsets'))
+        adequacy_act.triggered.connect(lambda : self.send.emit('adequacy'))
         develop_act.triggered.connect(lambda : self.send.emit('dev'))
 
-        self.addActions([load_map, export_map, gas_source, user_agent, pipe_link, clear_all, update_scene, inject_api, develop_act])
+        self.addActions([load_map, export_map, import_gis, gas_source, user_agent, pipe_link, clear_all, update_scene, simulate_act, importance_act, cutset_act, adequacy_act, inject_api, develop_act])
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
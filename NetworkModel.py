@@ -0,0 +1,373 @@
+# 脱离Qt的紧凑管网模型
+# 节点和管线全部以列数组保存，邻接关系采用CSR格式，不持有任何QGraphicsItem的引用，
+# 可以在非GUI线程或者子进程中直接交给求解器使用
+
+from typing import Optional, Iterable, Any
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import os
+import sys
+import json
+import struct
+import tempfile
+import json5
+import numpy as np
+
+# 节点类型编码
+GAS = 0
+USER = 1
+CATEGORIES = ('Gas', 'User')
+
+# 二进制地图格式（.mjb）：
+#   MAGIC(4字节) + 头部长度(uint32，小端) + JSON头部，之后是按ALIGN对齐的各列数据块
+#   头部记录版本、节点数、管线数以及每一列的dtype、shape、偏移
+# 各列直接用numpy.memmap打开，无需解析和复制
+MAGIC = b'MJB\x01'
+ALIGN = 64
+BINARY_COLUMNS = (
+    ('x', '<f8'),
+    ('y', '<f8'),
+    ('category', '<i1'),
+    ('current', '<f8'),
+    ('errorp', '<f8'),
+    ('src', '<i8'),
+    ('dst', '<i8'),
+    ('bindIds', '<i1'),
+    ('distance', '<f8'),
+    ('pipeErrorp', '<f8'),
+    ('nodeIds', '<i8'),
+)
+
+# 逐条生成记录时每次转换为Python对象的行数，内存占用与管网规模无关
+ITER_CHUNK = 1 << 16
+
+# 读取mj5文件：严格JSON内容（本程序导出的文件）直接用C实现的json模块解析，
+# 解析失败（含注释、键名不加引号等json5写法）才退回纯Python实现的json5
+def read_mj5(fp : str) -> dict[str, Any]:
+    with open(fp, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json5.loads(text)
+
+@dataclass(eq=False)
+class NetworkModel:
+    # 节点列
+    x : np.ndarray  # float64
+    y : np.ndarray  # float64
+    category : np.ndarray  # int8，见GAS/USER
+    current : np.ndarray  # float64，气源为储藏量，用户为用气量
+    errorp : np.ndarray  # float64，用户没有失效率，记为nan
+    # 管线列
+    src : np.ndarray  # int64，起点节点下标
+    dst : np.ndarray  # int64，终点节点下标
+    bindIds : np.ndarray  # int8，(管线数, 2)，两端所在的端口（上下左右 -> 0123）
+    distance : np.ndarray  # float64
+    pipeErrorp : np.ndarray  # float64
+    version : str = field(default='1.0.0')
+    nodeIds : Optional[np.ndarray] = None  # int64，地图文件中的节点编号，默认与下标相同
+
+    def __post_init__(self):
+        if self.nodeIds is None:
+            self.nodeIds = np.arange(len(self.x), dtype=np.int64)
+
+    @classmethod
+    def from_columns(
+        cls,
+        nodes : Iterable[tuple[float, float, int, float, float]],
+        pipes : Iterable[tuple[int, int, int, int, float, float]],
+        version : str = '1.0.0',
+        nodeIds : Optional[Iterable[int]] = None
+    ) -> 'NetworkModel':
+        # nodes: (x, y, category, current, errorp)
+        # pipes: (src, dst, bindA, bindB, distance, errorp)
+        n = np.array(list(nodes), dtype=np.float64).reshape(-1, 5)
+        p = np.array(list(pipes), dtype=np.float64).reshape(-1, 6)
+        return cls(
+            x=n[:, 0].copy(),
+            y=n[:, 1].copy(),
+            category=n[:, 2].astype(np.int8),
+            current=n[:, 3].copy(),
+            errorp=n[:, 4].copy(),
+            src=p[:, 0].astype(np.int64),
+            dst=p[:, 1].astype(np.int64),
+            bindIds=p[:, 2:4].astype(np.int8),
+            distance=p[:, 4].copy(),
+            pipeErrorp=p[:, 5].copy(),
+            version=version,
+            nodeIds=None if nodeIds is None else np.fromiter(nodeIds, dtype=np.int64, count=len(n))
+        )
+
+    # 从场景图元中一次性抽取，node和pipe的下标即传入列表中的顺序
+    @classmethod
+    def from_items(cls, nodes : list, pipes : list) -> 'NetworkModel':
+        index = {id(node): i for i, node in enumerate(nodes)}
+        return cls.from_columns(
+            (
+                (
+                    node.timing_pos.x(),
+                    node.timing_pos.y(),
+                    GAS if node.category == 'Gas' else USER,
+                    node.currentGasSource if node.category == 'Gas' else node.currentGasUser,
+                    node.errorp if node.category == 'Gas' else np.nan
+                ) for node in nodes
+            ),
+            (
+                (
+                    index[id(pipe.startPort.bind_node)],
+                    index[id(pipe.endPort.bind_node)],
+                    *pipe.mapToPortIds(),
+                    pipe.distance,
+                    pipe.errorp
+                ) for pipe in pipes
+            ),
+            nodeIds=(node.nodeId for node in nodes)
+        )
+
+    # 虚拟模式下场景中只有视野内的图元，以虚拟化模型的快照为准
+    @classmethod
+    def from_scene(cls, scene) -> 'NetworkModel':
+        if getattr(scene, 'virtual', None) is not None:
+            return scene.virtual.snapshot()
+        from MapProxyItemWidget import MapProxyItemWidget
+        from MapPipeProxy import PipeProxy
+        return cls.from_items(scene.findAllItems(MapProxyItemWidget), scene.findAllItems(PipeProxy))
+
+    # 从mj5结构中构建，管线端点按节点编号对应到节点，旧版本文件没有编号时按坐标对应
+    @classmethod
+    def from_dict(cls, data : dict[str, Any]) -> 'NetworkModel':
+        nodes = data['nodes']
+        ids = [node.get('id', i) for i, node in enumerate(nodes)]
+        byId = {nodeId: i for i, nodeId in enumerate(ids)}
+        byPos = {(node['x'], node['y']): i for i, node in enumerate(nodes)}
+
+        def ends(pipe):
+            if 'a' in pipe and 'b' in pipe:
+                return byId[pipe['a']], byId[pipe['b']]
+            return byPos[(pipe['ax'], pipe['ay'])], byPos[(pipe['bx'], pipe['by'])]
+
+        return cls.from_columns(
+            (
+                (
+                    node['x'],
+                    node['y'],
+                    CATEGORIES.index(node['category']),
+                    node['current'],
+                    node.get('errorp', np.nan)
+                ) for node in nodes
+            ),
+            (
+                (
+                    *ends(pipe),
+                    *pipe['bindIds'],
+                    pipe['distance'] if pipe.get('distance') is not None else np.hypot(pipe['bx'] - pipe['ax'], pipe['by'] - pipe['ay']),
+                    pipe['errorp']
+                ) for pipe in data['pipes']
+            ),
+            version=data.get('version', '1.0.0'),
+            nodeIds=ids
+        )
+
+    @classmethod
+    def from_mj5(cls, fp : str) -> 'NetworkModel':
+        return cls.from_dict(read_mj5(fp))
+
+    # 读取.mjb，mmap为True时各列为只读的numpy.memmap
+    @classmethod
+    def from_binary(cls, fp : str, mmap : bool = True) -> 'NetworkModel':
+        with open(fp, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'不是二进制地图文件：{fp}')
+            size, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(size).decode('utf-8'))
+        columns = {}
+        for name, column in header['columns'].items():
+            shape = tuple(column['shape'])
+            if mmap and np.prod(shape):
+                columns[name] = np.memmap(fp, dtype=column['dtype'], mode='r', offset=column['offset'], shape=shape)
+            else:
+                columns[name] = np.fromfile(fp, dtype=column['dtype'], count=int(np.prod(shape)), offset=column['offset']).reshape(shape)
+        return cls(version=header['version'], **columns)
+
+    # 写出.mjb
+    def to_binary(self, fp : str) -> None:
+        arrays, relative, offset = [], [], 0
+        for name, dtype in BINARY_COLUMNS:
+            arr = np.ascontiguousarray(getattr(self, name), dtype=dtype)
+            arrays.append(arr)
+            relative.append(offset)
+            offset += -(-arr.nbytes // ALIGN) * ALIGN
+        # 数据区紧跟在对齐后的头部之后，头部长度又取决于偏移的位数，反复计算直到不变
+        start = 0
+        while True:
+            header = {
+                'version': self.version,
+                'nodeCount': self.nodeCount,
+                'pipeCount': self.pipeCount,
+                'columns': {
+                    name: {'dtype': dtype, 'shape': list(arr.shape), 'offset': start + rel}
+                    for (name, dtype), arr, rel in zip(BINARY_COLUMNS, arrays, relative)
+                }
+            }
+            body = json.dumps(header).encode('utf-8')
+            need = -(-(len(MAGIC) + 4 + len(body)) // ALIGN) * ALIGN
+            if need <= start:
+                break
+            start = need
+        with open(fp, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(body)) + body)
+            for arr, rel in zip(arrays, relative):
+                f.write(b'\0' * (start + rel - f.tell()))
+                f.write(arr.tobytes())
+
+    # 逐条生成mj5节点记录，与MapReaderObj.explain_node导出的字段一致；按ITER_CHUNK行分块转换
+    def iter_nodes(self) -> Iterable[dict[str, Any]]:
+        for start in range(0, self.nodeCount, ITER_CHUNK):
+            rows = slice(start, start + ITER_CHUNK)
+            for nodeId, x, y, cat, current, errorp in zip(
+                self.nodeIds[rows].tolist(), self.x[rows].tolist(), self.y[rows].tolist(),
+                self.category[rows].tolist(), self.current[rows].tolist(), self.errorp[rows].tolist()
+            ):
+                node = {'id': nodeId, 'x': x, 'y': y, 'category': CATEGORIES[cat], 'current': current}
+                if cat == GAS:
+                    node['errorp'] = errorp
+                yield node
+
+    # 逐条生成mj5管线记录，与MapReaderObj.explain_pipe_path导出的字段一致；按ITER_CHUNK行分块转换
+    def iter_pipes(self) -> Iterable[dict[str, Any]]:
+        for start in range(0, self.pipeCount, ITER_CHUNK):
+            rows = slice(start, start + ITER_CHUNK)
+            src, dst = self.src[rows], self.dst[rows]
+            for a, b, (pa, pb), ax, ay, bx, by, distance, errorp in zip(
+                self.nodeIds[src].tolist(), self.nodeIds[dst].tolist(), self.bindIds[rows].tolist(),
+                self.x[src].tolist(), self.y[src].tolist(), self.x[dst].tolist(), self.y[dst].tolist(),
+                self.distance[rows].tolist(), self.pipeErrorp[rows].tolist()
+            ):
+                yield {
+                    'a': a,
+                    'b': b,
+                    'bindIds': [pa, pb],
+                    'ax': ax,
+                    'ay': ay,
+                    'bx': bx,
+                    'by': by,
+                    'distance': distance,
+                    'errorp': errorp
+                }
+
+    # 转换为mj5结构
+    def to_dict(self) -> dict[str, Any]:
+        return {'version': self.version, 'nodes': list(self.iter_nodes()), 'pipes': list(self.iter_pipes())}
+
+    # 各列设为只读，作为可以交给其他线程的不可变快照
+    def freeze(self) -> 'NetworkModel':
+        for name, _ in BINARY_COLUMNS:
+            getattr(self, name).flags.writeable = False
+        return self
+
+    # 按扩展名读取.mj5或.mjb
+    @classmethod
+    def from_file(cls, fp : str) -> 'NetworkModel':
+        return cls.from_binary(fp) if fp.lower().endswith('.mjb') else cls.from_mj5(fp)
+
+    # 按扩展名写出.mj5或.mjb
+    # 先写同目录下的临时文件再改名替换，写到一半失败时原文件保持不变
+    # strict为True时.mj5为严格JSON（仍然是合法的json5），载入时走json模块的快速路径
+    # meta为写在.mj5顶层的附加字段，载入时忽略
+    def to_file(self, fp : str, strict : bool = True, meta : Optional[dict[str, Any]] = None) -> None:
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(fp)))
+        os.close(fd)
+        try:
+            # mkstemp建立的文件只有所有者可读写，改名后会沿用；改为原文件的权限，新文件按umask取默认权限
+            try:
+                mode = os.stat(fp).st_mode & 0o7777
+            except FileNotFoundError:
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            os.chmod(tmp, mode)
+            if fp.lower().endswith('.mjb'):
+                self.to_binary(tmp)
+            else:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    self._write_mj5(f, strict, meta or {})
+            os.replace(tmp, fp)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    # 逐条写出节点和管线，每条记录一行，内存占用与管网规模无关
+    def _write_mj5(self, f, strict : bool, meta : dict[str, Any]) -> None:
+        dumps = (lambda record: json.dumps(record, ensure_ascii=False)) if strict else json5.dumps
+        f.write('{\n')
+        for key, value in {'version': self.version, **meta}.items():
+            f.write(f'    {dumps(key)}: {dumps(value)},\n')
+        for key, records in (('nodes', self.iter_nodes()), ('pipes', self.iter_pipes())):
+            f.write(f'    {dumps(key)}: [')
+            sep = '\n'
+            for record in records:
+                f.write(sep)
+                f.write('        ')
+                f.write(dumps(record))
+                sep = ',\n'
+            f.write('\n    ]' + (',\n' if key == 'nodes' else '\n'))
+        f.write('}\n')
+
+    @property
+    def nodeCount(self) -> int:
+        return len(self.x)
+
+    @property
+    def pipeCount(self) -> int:
+        return len(self.src)
+
+    @property
+    def gasNodes(self) -> np.ndarray:
+        return np.flatnonzero(self.category == GAS)
+
+    @property
+    def userNodes(self) -> np.ndarray:
+        return np.flatnonzero(self.category == USER)
+
+    # CSR邻接：节点i的邻居为indices[indptr[i]:indptr[i + 1]]，对应的管线为edges中同一段
+    @cached_property
+    def csr(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        tails = np.concatenate([self.src, self.dst])
+        heads = np.concatenate([self.dst, self.src])
+        edges = np.concatenate([np.arange(self.pipeCount), np.arange(self.pipeCount)])
+        order = np.argsort(tails, kind='stable')
+        indptr = np.zeros(self.nodeCount + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=self.nodeCount), out=indptr[1:])
+        return indptr, heads[order], edges[order]
+
+    @property
+    def indptr(self) -> np.ndarray:
+        return self.csr[0]
+
+    @property
+    def indices(self) -> np.ndarray:
+        return self.csr[1]
+
+    @property
+    def edges(self) -> np.ndarray:
+        return self.csr[2]
+
+    def neighbors(self, node : int) -> tuple[np.ndarray, np.ndarray]:
+        indptr, indices, edges = self.csr
+        s, e = indptr[node], indptr[node + 1]
+        return indices[s:e], edges[s:e]
+
+    def degree(self, node : Optional[int] = None) -> np.ndarray | int:
+        indptr = self.indptr
+        return np.diff(indptr) if node is None else int(indptr[node + 1] - indptr[node])
+
+# 地图格式互转：python NetworkModel.py 源文件 目标文件（按扩展名判断格式）
+def convert_map(src : str, dst : str) -> None:
+    NetworkModel.from_file(src).to_file(dst)
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(f'用法：python {os.path.basename(sys.argv[0])} 源文件 目标文件')
+    convert_map(sys.argv[1], sys.argv[2])
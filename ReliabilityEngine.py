@@ -0,0 +1,601 @@
+# 供气可靠性蒙特卡洛仿真引擎
+# 失效场景按批次一次性采样（元件 × 样本），样本维度按位打包成uint64，
+# 连通性沿管道在整批样本上同时传播，不存在逐场景的Python循环
+
+import os
+from typing import Optional, Sequence, Iterator, Any
+from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from AbstractObject import GasAgent, UserAgent, PipeAgent
+
+# 引擎版本，采样或统计方式改变时递增，使旧的缓存结果失效
+ENGINE_VERSION = 2
+
+# 读取targets中的端点，既可以是Agent本身也可以是ID
+def _agent_id(target : Any) -> int:
+    return int(target.ID) if hasattr(target, 'ID') else int(target)
+
+# 仿真统计量，同时也是分片的部分结果，只含计数和平方和，可以直接累加合并
+@dataclass
+class ReliabilityResult:
+    userIds : np.ndarray  # 用户ID，与下面的数组一一对应
+    samples : int  # 样本总数
+    supplied : np.ndarray  # 每个用户仍然有气的样本数
+    lostSum : int = 0  # 各样本停气用户数之和
+    lostSumSq : int = 0  # 各样本停气用户数的平方和
+
+    @classmethod
+    def empty(cls, userIds : np.ndarray) -> 'ReliabilityResult':
+        return cls(userIds=userIds.copy(), samples=0, supplied=np.zeros(len(userIds), dtype=np.int64))
+
+    # 合并另一份部分结果
+    def merge(self, other : 'ReliabilityResult') -> 'ReliabilityResult':
+        if not np.array_equal(self.userIds, other.userIds):
+            raise ValueError('只能合并同一管网的仿真结果')
+        return ReliabilityResult(
+            userIds=self.userIds,
+            samples=self.samples + other.samples,
+            supplied=self.supplied + other.supplied,
+            lostSum=self.lostSum + other.lostSum,
+            lostSumSq=self.lostSumSq + other.lostSumSq
+        )
+
+    # 供气概率
+    @property
+    def probability(self) -> np.ndarray:
+        if not self.samples:
+            return np.full(len(self.userIds), np.nan)
+        return self.supplied / self.samples
+
+    # 供气概率的标准误差（伯努利分布）
+    @property
+    def stderr(self) -> np.ndarray:
+        p = self.probability
+        return np.sqrt(p * (1 - p) / self.samples)
+
+    # 每个样本平均停气的用户数
+    @property
+    def expectedLost(self) -> float:
+        return self.lostSum / self.samples if self.samples else float('nan')
+
+    @property
+    def expectedLostStderr(self) -> float:
+        if self.samples < 2:
+            return float('nan')
+        mean = self.lostSum / self.samples
+        var = (self.lostSumSq - self.samples * mean * mean) / (self.samples - 1)
+        return float(np.sqrt(max(var, 0.0) / self.samples))
+
+    # 供气概率的相对误差 stderr / p
+    # 按 (supplied + 1) / (samples + 2) 估计方差，还没观测到停气的用户不会因为方差为0被误判为已收敛
+    @property
+    def relativeError(self) -> np.ndarray:
+        if not self.samples:
+            return np.full(len(self.userIds), np.inf)
+        p = (self.supplied + 1) / (self.samples + 2)
+        return np.sqrt((1 - p) / (p * self.samples))
+
+    # 收敛判据：标准误差与容许误差之比，不超过1即已收敛，方差同样按平滑后的概率估计
+    # 容许误差取 relError × min(供气概率, 停气概率) 与 absError 中较大者：相对误差按较小的概率衡量，
+    # 一批样本全部有气时不会因为供气概率接近1而提前收敛；absError是下限，概率接近0或1时所需样本数有界
+    def errorRatio(self, relError : float, absError : float) -> np.ndarray:
+        if not self.samples:
+            return np.full(len(self.userIds), np.inf)
+        p = (self.supplied + 1) / (self.samples + 2)
+        stderr = np.sqrt(p * (1 - p) / self.samples)
+        return stderr / np.maximum(relError * np.minimum(p, 1 - p), absError)
+
+    # 正态近似置信区间
+    def interval(self, z : float = 1.96) -> tuple[np.ndarray, np.ndarray]:
+        p, err = self.probability, self.stderr
+        return np.clip(p - z * err, 0.0, 1.0), np.clip(p + z * err, 0.0, 1.0)
+
+    def as_dict(self) -> dict[int, float]:
+        return dict(zip(self.userIds.tolist(), self.probability.tolist()))
+
+# 重要性抽样的统计量：停气指示乘以似然比后的和与平方和
+@dataclass
+class ImportanceResult:
+    userIds : np.ndarray
+    bias : np.ndarray  # 抽样使用的偏置失效率（元件顺序同MonteCarloEngine.errorp）
+    samples : int
+    weightedSum : np.ndarray  # Σ w·I(用户停气)
+    weightedSumSq : np.ndarray  # Σ (w·I)^2
+    weightSum : float = 0.0  # Σ w，期望为样本数，用于检查权重是否退化
+    weightSumSq : float = 0.0
+
+    @classmethod
+    def empty(cls, userIds : np.ndarray, bias : np.ndarray) -> 'ImportanceResult':
+        U = len(userIds)
+        return cls(userIds=userIds.copy(), bias=bias, samples=0, weightedSum=np.zeros(U), weightedSumSq=np.zeros(U))
+
+    def merge(self, other : 'ImportanceResult') -> 'ImportanceResult':
+        if not np.array_equal(self.userIds, other.userIds) or not np.array_equal(self.bias, other.bias):
+            raise ValueError('只能合并同一管网、同一偏置下的抽样结果')
+        return ImportanceResult(
+            userIds=self.userIds,
+            bias=self.bias,
+            samples=self.samples + other.samples,
+            weightedSum=self.weightedSum + other.weightedSum,
+            weightedSumSq=self.weightedSumSq + other.weightedSumSq,
+            weightSum=self.weightSum + other.weightSum,
+            weightSumSq=self.weightSumSq + other.weightSumSq
+        )
+
+    # 供气不可用度的无偏估计
+    @property
+    def unavailability(self) -> np.ndarray:
+        return self.weightedSum / self.samples
+
+    @property
+    def probability(self) -> np.ndarray:
+        return 1.0 - self.unavailability
+
+    @property
+    def stderr(self) -> np.ndarray:
+        n = self.samples
+        mean = self.unavailability
+        var = (self.weightedSumSq - n * mean * mean) / max(n - 1, 1)
+        return np.sqrt(np.maximum(var, 0.0) / n)
+
+    # 相对误差，未观测到停气的用户为inf
+    @property
+    def relativeError(self) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.weightedSum > 0, self.stderr / self.unavailability, np.inf)
+
+    # 有效样本数 (Σw)^2 / Σw^2
+    @property
+    def effectiveSamples(self) -> float:
+        return self.weightSum ** 2 / self.weightSumSq if self.weightSumSq else 0.0
+
+    # 正态近似置信区间
+    def interval(self, z : float = 1.96) -> tuple[np.ndarray, np.ndarray]:
+        mean, err = self.unavailability, self.stderr
+        return np.clip(mean - z * err, 0.0, 1.0), np.clip(mean + z * err, 0.0, 1.0)
+
+class MonteCarloEngine:
+    # 节点统一编号：0..nodeCount-1
+    # 元件统一编号：先气源（gasNodes的顺序），后管道（pipeSrc/pipeDst的顺序）
+    # 气源失效只代表不再供气，节点本身仍可作为管网中的汇接点
+    def __init__(
+        self,
+        nodeCount : int,
+        gasNodes : Sequence[int],
+        userNodes : Sequence[int],
+        pipeSrc : Sequence[int],
+        pipeDst : Sequence[int],
+        gasErrorp : Sequence[float],
+        pipeErrorp : Sequence[float],
+        userIds : Optional[Sequence[int]] = None
+    ):
+        self.nodeCount = int(nodeCount)
+        self.gasNodes = np.asarray(gasNodes, dtype=np.int64)
+        self.userNodes = np.asarray(userNodes, dtype=np.int64)
+        self.pipeSrc = np.asarray(pipeSrc, dtype=np.int64)
+        self.pipeDst = np.asarray(pipeDst, dtype=np.int64)
+        self.userIds = np.asarray(userIds if userIds is not None else self.userNodes, dtype=np.int64)
+        # 元件失效率：气源在前，管道在后
+        self.errorp = np.concatenate([
+            np.asarray(gasErrorp, dtype=np.float64),
+            np.asarray(pipeErrorp, dtype=np.float64)
+        ])
+        if len(self.gasNodes) + len(self.pipeSrc) != len(self.errorp) or len(self.pipeSrc) != len(self.pipeDst):
+            raise ValueError('元件数量与失效率数量不一致')
+        if len(np.unique(self.gasNodes)) != len(self.gasNodes):
+            raise ValueError('气源节点重复')
+        if np.any((self.errorp < 0) | (self.errorp > 1)):
+            raise ValueError('失效率必须位于[0, 1]之间')
+        self._arcs = self._order_arcs()
+        self.reachable = self._reachable_users()
+
+    @classmethod
+    def from_agents(
+        cls,
+        gasAgents : Sequence[GasAgent],
+        userAgents : Sequence[UserAgent],
+        pipeAgents : Sequence[PipeAgent]
+    ) -> 'MonteCarloEngine':
+        # 管道的targets就是两端节点（气源或用户）
+        index : dict[int, int] = {}
+        for agent in [*gasAgents, *userAgents]:
+            if agent.ID in index:
+                raise ValueError(f'节点ID重复：{agent.ID}')
+            index[agent.ID] = len(index)
+        src, dst = [], []
+        for pipe in pipeAgents:
+            if len(pipe.targets) != 2:
+                raise ValueError(f'管道{pipe.ID}必须连接两个节点')
+            a, b = (_agent_id(t) for t in pipe.targets)
+            if a not in index or b not in index:
+                raise ValueError(f'管道{pipe.ID}连接了不存在的节点：{a, b}')
+            src.append(index[a])
+            dst.append(index[b])
+        return cls(
+            nodeCount=len(index),
+            gasNodes=[index[g.ID] for g in gasAgents],
+            userNodes=[index[u.ID] for u in userAgents],
+            pipeSrc=src,
+            pipeDst=dst,
+            gasErrorp=[g.errorp for g in gasAgents],
+            pipeErrorp=[p.errorp for p in pipeAgents],
+            userIds=[u.ID for u in userAgents]
+        )
+
+    # 从紧凑管网模型构建，用户ID为地图中的节点编号（model.nodeIds），与节点在模型中的顺序无关
+    @classmethod
+    def from_model(cls, model) -> 'MonteCarloEngine':
+        gasNodes, userNodes = model.gasNodes, model.userNodes
+        return cls(
+            nodeCount=model.nodeCount,
+            gasNodes=gasNodes,
+            userNodes=userNodes,
+            pipeSrc=model.src,
+            pipeDst=model.dst,
+            gasErrorp=model.errorp[gasNodes],
+            pipeErrorp=model.pipeErrorp,
+            userIds=model.nodeIds[userNodes]
+        )
+
+    @property
+    def componentCount(self) -> int:
+        return len(self.errorp)
+
+    # 按完好管网中距气源的BFS层次给有向弧分组
+    # 同一组内的弧尾处于同一层且弧头互不相同，可以整组用花式索引一次传播；
+    # 按层次顺序扫描一遍就能沿最短路把气传到底，管道失效后需要绕路的情况再多扫几遍
+    def _order_arcs(self) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        adjacency : list[list[tuple[int, int]]] = [[] for _ in range(self.nodeCount)]
+        for p, (a, b) in enumerate(zip(self.pipeSrc.tolist(), self.pipeDst.tolist())):
+            adjacency[a].append((b, p))
+            adjacency[b].append((a, p))
+        level = [-1] * self.nodeCount
+        queue = deque()
+        for g in self.gasNodes.tolist():
+            level[g] = 0
+            queue.append(g)
+        while queue:
+            u = queue.popleft()
+            for v, _ in adjacency[u]:
+                if level[v] < 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        # 与气源不连通的节点永远不会有气，对应的弧直接丢掉
+        groups : dict[tuple[int, int], list[tuple[int, int, int]]] = {}
+        seen : dict[tuple[int, int], int] = {}
+        for u in sorted(range(self.nodeCount), key=lambda i: level[i]):
+            if level[u] < 0:
+                continue
+            for v, p in adjacency[u]:
+                rank = seen.get((level[u], v), 0)
+                seen[(level[u], v)] = rank + 1
+                groups.setdefault((level[u], rank), []).append((u, v, p))
+        return [
+            tuple(np.array(col, dtype=np.int64) for col in zip(*groups[key]))
+            for key in sorted(groups)
+        ]
+
+    # 每个用户在结构上能否通气：失效率小于1的元件全部完好时与某个可用气源连通
+    # 结构上不可达的用户供气概率恒为0，不参与收敛判据
+    def _reachable_users(self) -> np.ndarray:
+        G = len(self.gasNodes)
+        adjacency : list[list[int]] = [[] for _ in range(self.nodeCount)]
+        for a, b, q in zip(self.pipeSrc.tolist(), self.pipeDst.tolist(), self.errorp[G:].tolist()):
+            if q < 1:
+                adjacency[a].append(b)
+                adjacency[b].append(a)
+        seen = np.zeros(self.nodeCount, dtype=bool)
+        stack = [g for g, q in zip(self.gasNodes.tolist(), self.errorp[:G].tolist()) if q < 1]
+        seen[stack] = True
+        while stack:
+            for v in adjacency[stack.pop()]:
+                if not seen[v]:
+                    seen[v] = True
+                    stack.append(v)
+        return seen[self.userNodes]
+
+    # 按几何分布的间隔直接生成失效位置，工作量与失效次数成正比而不是与样本数成正比
+    # errorp为None时使用元件本身的失效率，重要性抽样时传入偏置后的失效率
+    def _sample_packed(self, rng : np.random.Generator, n : int, errorp : Optional[np.ndarray] = None) -> np.ndarray:
+        errorp = self.errorp if errorp is None else errorp
+        words = (n + 63) // 64
+        packed = np.zeros((self.componentCount, words * 8), dtype=np.uint8)
+        comps = np.flatnonzero(errorp > 0)
+        if not len(comps) or not n:
+            return packed.view(np.uint64)
+        q = errorp[comps]
+        lam = n * q
+        # 每个元件预留的间隔数足以以极高概率覆盖全部样本
+        need = np.ceil(lam + 6 * np.sqrt(lam) + 16).astype(np.int64)
+        owner = np.repeat(np.arange(len(comps)), need)
+        ends = np.cumsum(need)
+        total = np.cumsum(rng.geometric(q[owner]))
+        offset = np.concatenate([[0], total[ends[:-1] - 1]])
+        pos = total - offset[owner] - 1
+        keep = pos < n
+        self._set_bits(packed, comps[owner[keep]], pos[keep])
+        # 极少数元件预留的间隔不够，从上次结束的位置继续补采
+        # 几何分布无记忆，补采不改变分布
+        last = pos[ends - 1]
+        for i in np.flatnonzero(last < n - 1):
+            cursor = int(last[i]) + 1
+            while cursor < n:
+                pos = cursor + np.cumsum(rng.geometric(q[i], size=int(need[i]))) - 1
+                hit = pos[pos < n]
+                self._set_bits(packed, np.full(len(hit), comps[i]), hit)
+                cursor = int(pos[-1]) + 1
+        return packed.view(np.uint64)
+
+    # 样本i对应第i//8个字节的第(7 - i%8)位，与np.packbits一致
+    @staticmethod
+    def _set_bits(packed : np.ndarray, rows : np.ndarray, pos : np.ndarray) -> None:
+        np.bitwise_or.at(packed, (rows, pos >> 3), np.left_shift(1, 7 - (pos & 7)).astype(np.uint8))
+
+    # 在按位打包的样本上传播连通性，返回每个节点的是否有气（节点 × 字）
+    def _propagate(self, alive : np.ndarray) -> np.ndarray:
+        G = len(self.gasNodes)
+        words = alive.shape[1]
+        reached = np.zeros((self.nodeCount, words), dtype=np.uint64)
+        reached[self.gasNodes] = alive[:G]
+        pipeAlive = alive[G:]
+        # 正反向交替扫描，绕路的气流无论朝哪个方向都能较快收敛
+        order = self._arcs
+        while True:
+            before = reached.copy()
+            for u, v, p in order:
+                reached[v] |= reached[u] & pipeAlive[p]
+            if np.array_equal(before, reached):
+                return reached
+            order = order[::-1]
+
+    # 生成失效场景矩阵（样本 × 元件），True表示失效
+    def sample_failures(self, rng : np.random.Generator, n : int) -> np.ndarray:
+        packed = self._sample_packed(rng, n)
+        return np.unpackbits(packed.view(np.uint8), axis=1, count=n).astype(bool).T
+
+    # 根据失效场景矩阵（样本 × 元件）计算每个用户是否有气（样本 × 用户）
+    def supplied_matrix(self, failures : np.ndarray) -> np.ndarray:
+        failures = np.asarray(failures, dtype=bool)
+        n = failures.shape[0]
+        words = (n + 63) // 64
+        packed = np.zeros((self.componentCount, words * 8), dtype=np.uint8)
+        packed[:, :(n + 7) // 8] = np.packbits(failures.T, axis=1)
+        reached = self._propagate(~packed.view(np.uint64))
+        rows = reached[self.userNodes]
+        return np.unpackbits(rows.view(np.uint8), axis=1, count=n).astype(bool).T
+
+    # 一批样本的部分结果
+    def _simulate_batch(self, rng : np.random.Generator, n : int) -> ReliabilityResult:
+        reached = self._propagate(~self._sample_packed(rng, n))
+        bits = np.unpackbits(reached[self.userNodes].view(np.uint8), axis=1, count=n)
+        lost = len(self.userNodes) - bits.sum(axis=0, dtype=np.int64)
+        return ReliabilityResult(
+            userIds=self.userIds,
+            samples=n,
+            supplied=bits.sum(axis=1, dtype=np.int64),
+            lostSum=int(lost.sum()),
+            lostSumSq=int((lost * lost).sum())
+        )
+
+    # 一个分片：使用自己的随机流，内部再按batch分批控制内存
+    def run_shard(self, seedSeq : np.random.SeedSequence, n : int, batch : int = 1 << 13) -> ReliabilityResult:
+        rng = np.random.default_rng(seedSeq)
+        result = ReliabilityResult.empty(self.userIds)
+        done = 0
+        while done < n:
+            m = min(batch, n - done)
+            result = result.merge(self._simulate_batch(rng, m))
+            done += m
+        return result
+
+    # 把样本切成固定大小的分片，每个分片从SeedSequence派生独立的随机流
+    # 分片划分与进程数无关，所以串行或者任意进程数下结果逐位一致
+    @staticmethod
+    def _shards(
+        samples : int,
+        seed : Optional[int] | np.random.SeedSequence,
+        shardSize : int
+    ) -> list[tuple[np.random.SeedSequence, int]]:
+        sizes = [min(shardSize, samples - i) for i in range(0, samples, shardSize)]
+        root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        return list(zip(root.spawn(len(sizes)), sizes))
+
+    # 单进程运行仿真
+    def run(
+        self,
+        samples : int,
+        seed : Optional[int] = None,
+        batch : int = 1 << 13,
+        shardSize : int = 1 << 16
+    ) -> ReliabilityResult:
+        result = ReliabilityResult.empty(self.userIds)
+        for seedSeq, n in self._shards(samples, seed, shardSize):
+            result = result.merge(self.run_shard(seedSeq, n, batch))
+        return result
+
+    # 逐批次推进的仿真，每批之后产出累计结果
+    # 结构上可达的用户全部满足收敛判据（见ReliabilityResult.errorRatio，且样本数不少于minSamples）
+    # 或者样本数达到maxSamples时停止；relError为None时只按maxSamples停止。
+    # 分片及其随机流与run相同，同一seed下前N个样本的结果与run(N)一致
+    def iterate(
+        self,
+        seed : Optional[int] = None,
+        relError : Optional[float] = None,
+        maxSamples : int = 1 << 22,
+        absError : float = 1e-4,
+        minSamples : int = 1 << 12,
+        batch : int = 1 << 13,
+        shardSize : int = 1 << 16
+    ) -> Iterator[ReliabilityResult]:
+        root = np.random.SeedSequence(seed)
+        result = ReliabilityResult.empty(self.userIds)
+        while True:
+            # 分片的随机流按顺序逐个派生，与一次性spawn得到的序列相同
+            rng = np.random.default_rng(root.spawn(1)[0])
+            done = 0
+            while done < shardSize:
+                m = min(batch, shardSize - done, maxSamples - result.samples)
+                if m <= 0:
+                    return
+                result = result.merge(self._simulate_batch(rng, m))
+                done += m
+                yield result
+                if relError is not None and result.samples >= minSamples \
+                        and np.all(result.errorRatio(relError, absError)[self.reachable] <= 1):
+                    return
+
+    # 多进程运行仿真，子进程只回传计数和平方和
+    # seed为None时每次运行结果不同，需要复现请显式传入seed
+    def run_parallel(
+        self,
+        samples : int,
+        seed : Optional[int] = None,
+        workers : Optional[int] = None,
+        batch : int = 1 << 13,
+        shardSize : int = 1 << 16
+    ) -> ReliabilityResult:
+        shards = self._shards(samples, seed, shardSize)
+        return self._map_shards('run_shard', shards, batch, workers, ReliabilityResult.empty(self.userIds))
+
+    # 依次或者在进程池中执行分片，按分片顺序合并部分结果
+    def _map_shards(self, method : str, shards : list, batch : int, workers : Optional[int], result, extra : tuple = ()):
+        workers = min(workers or os.cpu_count() or 1, max(len(shards), 1))
+        if workers <= 1:
+            for seedSeq, n in shards:
+                result = result.merge(getattr(self, method)(seedSeq, n, batch, *extra))
+            return result
+        # 引擎只在每个子进程初始化时传一次，分片任务只携带种子和样本数
+        tasks = [(method, seedSeq, n, batch, extra) for seedSeq, n in shards]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as executor:
+            for part in executor.map(_run_worker_shard, tasks):
+                result = result.merge(part)
+        return result
+
+    # ---------------- 重要性抽样 ----------------
+
+    # 偏置失效率下的对数似然比 log(p(x) / p'(x)) = const + Σ_失效元件 delta_i
+    def _likelihood_terms(self, bias : np.ndarray) -> tuple[float, np.ndarray]:
+        q = self.errorp
+        moved = q != bias
+        with np.errstate(divide='ignore'):
+            keep = np.log1p(-q[moved]) - np.log1p(-bias[moved])
+            fail = np.log(q[moved]) - np.log(bias[moved])
+        delta = np.zeros(len(q))
+        delta[moved] = fail - keep
+        return float(keep.sum()), delta
+
+    # 一批偏置样本：失效的(元件, 样本)对、停气矩阵(用户 × 样本)、每个样本的对数似然比
+    def _weighted_batch(
+        self,
+        rng : np.random.Generator,
+        n : int,
+        bias : np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        packed = self._sample_packed(rng, n, bias)
+        reached = self._propagate(~packed)
+        out = np.unpackbits(~reached[self.userNodes].view(np.uint8), axis=1, count=n).astype(bool)
+        failComp, failSample = np.nonzero(np.unpackbits(packed.view(np.uint8), axis=1, count=n))
+        const, delta = self._likelihood_terms(bias)
+        logw = const + np.bincount(failSample, weights=delta[failComp], minlength=n)
+        return failComp, failSample, out, logw
+
+    # 交叉熵法确定偏置失效率，目标事件为"targets中至少一个用户停气"
+    # targets为用户在userNodes中的下标，默认全部用户；只关心少数关键用户时指定targets效果最好。
+    # 偏置率限制在[errorp, maxBias]之间，与目标事件无关的元件保持原失效率，似然比不会退化
+    def cross_entropy_bias(
+        self,
+        seed : Optional[int] | np.random.SeedSequence = None,
+        targets : Optional[Sequence[int]] = None,
+        pilot : int = 1 << 12,
+        iterations : int = 8,
+        rho : float = 0.1,
+        smoothing : float = 0.7,
+        maxBias : float = 0.5
+    ) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        q = self.errorp
+        bias = q.copy()
+        rows = slice(None) if targets is None else np.asarray(targets, dtype=np.int64)
+        for _ in range(iterations):
+            failComp, failSample, out, logw = self._weighted_batch(rng, pilot, bias)
+            hit = out[rows].any(axis=0)
+            if not hit.any():
+                # 试验样本中目标事件一次都没出现，整体放大失效率再试
+                bias = np.where(q > 0, np.clip(bias * 10, q, np.maximum(q, maxBias)), q)
+                continue
+            # 以似然比加权的精英样本中各元件的失效频率
+            w = np.where(hit, np.exp(logw - logw[hit].max()), 0.0)
+            update = np.bincount(failComp, weights=w[failSample], minlength=len(q)) / w.sum()
+            bias = np.clip(smoothing * update + (1 - smoothing) * bias, q, np.maximum(q, maxBias))
+            if hit.mean() >= rho:
+                break
+        return bias
+
+    def run_importance_shard(
+        self,
+        seedSeq : np.random.SeedSequence,
+        n : int,
+        batch : int,
+        bias : np.ndarray
+    ) -> 'ImportanceResult':
+        rng = np.random.default_rng(seedSeq)
+        result = ImportanceResult.empty(self.userIds, bias)
+        done = 0
+        while done < n:
+            m = min(batch, n - done)
+            _, _, out, logw = self._weighted_batch(rng, m, bias)
+            w = np.exp(logw)
+            user, sample = np.nonzero(out)
+            U = len(self.userNodes)
+            result = result.merge(ImportanceResult(
+                userIds=self.userIds,
+                bias=bias,
+                samples=m,
+                weightedSum=np.bincount(user, weights=w[sample], minlength=U),
+                weightedSumSq=np.bincount(user, weights=w[sample] ** 2, minlength=U),
+                weightSum=float(w.sum()),
+                weightSumSq=float((w * w).sum())
+            ))
+            done += m
+        return result
+
+    # 重要性抽样估计供气不可用度
+    # bias为None时先用交叉熵法从独立的随机流中确定偏置失效率，再正式抽样
+    def run_importance(
+        self,
+        samples : int,
+        seed : Optional[int] = None,
+        bias : Optional[Sequence[float]] = None,
+        targets : Optional[Sequence[int]] = None,
+        workers : Optional[int] = 1,
+        batch : int = 1 << 12,
+        shardSize : int = 1 << 15
+    ) -> 'ImportanceResult':
+        ceSeq, mainSeq = np.random.SeedSequence(seed).spawn(2)
+        if bias is None:
+            bias = self.cross_entropy_bias(ceSeq, targets)
+        bias = np.asarray(bias, dtype=np.float64)
+        if bias.shape != self.errorp.shape:
+            raise ValueError('偏置失效率的个数必须与元件数一致')
+        # 必然失效的元件固定偏置为1，似然比中对应的项为0，不参与偏置
+        certain = self.errorp >= 1
+        bias = np.where(certain, 1.0, bias)
+        if np.any((bias < 0) | ((bias >= 1) & ~certain)) or np.any((bias == 0) & (self.errorp > 0)):
+            raise ValueError('偏置失效率必须位于[0, 1)之间（必然失效的元件除外），且原失效率大于0的元件偏置失效率也必须大于0')
+        shards = self._shards(samples, mainSeq, shardSize)
+        return self._map_shards('run_importance_shard', shards, batch, workers, ImportanceResult.empty(self.userIds, bias), (bias,))
+
+# 子进程中的引擎实例
+_worker_engine : Optional[MonteCarloEngine] = None
+
+def _init_worker(engine : MonteCarloEngine) -> None:
+    global _worker_engine
+    _worker_engine = engine
+
+def _run_worker_shard(args : tuple[str, np.random.SeedSequence, int, int, tuple]):
+    method, seedSeq, n, batch, extra = args
+    return getattr(_worker_engine, method)(seedSeq, n, batch, *extra)
@@ -0,0 +1,161 @@
+# 按管网内容寻址的仿真结果磁盘缓存
+# 管网的规范哈希只取MapReaderObj.explain_node/explain_pipe_path导出的字段，与图元顺序、管线方向无关；
+# 缓存键再加上求解器名称和参数。结果以npz保存（不使用pickle），按访问时间做LRU淘汰，总大小不超过maxBytes
+
+import os
+import json
+import hashlib
+import zipfile
+import tempfile
+from typing import Optional, Callable, Any
+from dataclasses import fields, is_dataclass
+
+import numpy as np
+
+from ReliabilityEngine import ReliabilityResult, ImportanceResult
+from SupplyAdequacy import AdequacyResult
+from TimeSimulation import TimeSeriesResult
+
+# 允许缓存的结果类型，读取时按名称还原
+RESULT_TYPES = {cls.__name__: cls for cls in (ReliabilityResult, ImportanceResult, AdequacyResult, TimeSeriesResult)}
+
+# 各结果类型中按用户排列的字段及其用户所在的轴
+# 管网哈希与节点顺序无关，命中后按userIds把这些字段重排成调用方的用户顺序
+USER_AXES = {
+    'ReliabilityResult': {'supplied': 0},
+    'ImportanceResult': {'weightedSum': 0, 'weightedSumSq': 0},
+    'AdequacyResult': {'demand': 0, 'unservedSum': 0, 'unservedSumSq': 0, 'shortCount': 0},
+    'TimeSeriesResult': {'demand': 1, 'delivered': 1, 'unserved': 1, 'userStock': 1},
+}
+
+def _canonical(obj : Any) -> str:
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+# 节点编号只是标签，不影响管网本身，计算哈希时去掉
+_LABELS = ('id', 'a', 'b')
+
+# 数值统一为float，10与10.0（例如经过二进制格式转换后）得到相同的哈希
+def _record(record : dict) -> dict:
+    return {
+        k: [float(x) for x in v] if isinstance(v, (list, tuple)) else float(v) if isinstance(v, (int, float)) else v
+        for k, v in record.items() if k not in _LABELS
+    }
+
+# 管网的规范哈希，data为mj5结构 {'nodes': [...], 'pipes': [...]}
+def network_digest(data : dict) -> str:
+    nodes = sorted(_canonical(_record(node)) for node in data['nodes'])
+    pipes = []
+    for pipe in data['pipes']:
+        pipe = _record(pipe)
+        a = (pipe['ax'], pipe['ay'], pipe['bindIds'][0])
+        b = (pipe['bx'], pipe['by'], pipe['bindIds'][1])
+        # 管线无方向，端点按坐标排序
+        if b < a:
+            pipe['ax'], pipe['ay'], pipe['bx'], pipe['by'] = b[0], b[1], a[0], a[1]
+            pipe['bindIds'] = [b[2], a[2]]
+        pipes.append(_canonical(pipe))
+    pipes.sort()
+    h = hashlib.sha256()
+    for line in ('nodes', *nodes, 'pipes', *pipes):
+        h.update(line.encode('utf-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+class ResultCache:
+    def __init__(self, root : Optional[str] = None, maxBytes : int = 256 << 20):
+        self.root = root or os.path.join(os.path.expanduser('~'), '.suture', 'cache')
+        self.maxBytes = maxBytes
+        os.makedirs(self.root, exist_ok=True)
+
+    # 缓存键：管网哈希 + 求解器 + 参数
+    @staticmethod
+    def key(digest : str, solver : str, params : Optional[dict] = None) -> str:
+        return hashlib.sha256(_canonical([digest, solver, params or {}]).encode('utf-8')).hexdigest()
+
+    def _path(self, key : str) -> str:
+        return os.path.join(self.root, f'{key}.npz')
+
+    # userIds为当前管网的用户编号（地图中的节点编号）时，结果按这个顺序重排；
+    # 缓存的用户编号与之不一致（例如同一管网重新编号）时视为未命中
+    def get(self, key : str, userIds : Optional[np.ndarray] = None):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                cls = RESULT_TYPES[str(data['__type__'])]
+                values = {f.name: data[f.name] for f in fields(cls)}
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # 截断或损坏的缓存文件删除，之后重新计算
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        if userIds is not None:
+            values = self._reorder(cls.__name__, values, np.asarray(userIds))
+            if values is None:
+                return None
+        # 更新访问时间，作为LRU的依据
+        os.utime(path)
+        return cls(**{k: v.item() if v.ndim == 0 else v for k, v in values.items()})
+
+    @staticmethod
+    def _reorder(name : str, values : dict, userIds : np.ndarray) -> Optional[dict]:
+        cached = values['userIds']
+        if len(cached) != len(userIds) or len(np.unique(cached)) != len(cached):
+            return None
+        order = np.argsort(cached)
+        pos = np.searchsorted(cached, userIds, sorter=order)
+        pos = order[np.minimum(pos, len(cached) - 1)]
+        if not np.array_equal(cached[pos], userIds):
+            return None
+        values = dict(values, userIds=userIds.copy())
+        for field, axis in USER_AXES[name].items():
+            values[field] = np.take(values[field], pos, axis=axis)
+        return values
+
+    def put(self, key : str, result) -> None:
+        if not is_dataclass(result) or type(result).__name__ not in RESULT_TYPES:
+            raise ValueError(f'不支持缓存的结果类型：{type(result).__name__}')
+        arrays = {f.name: np.asarray(getattr(result, f.name)) for f in fields(result)}
+        # 先写临时文件再改名，读取方不会看到写了一半的文件
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, __type__=np.array(type(result).__name__), **arrays)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self._evict()
+
+    # 命中则直接返回，否则计算后写入缓存
+    def get_or_compute(self, key : str, compute : Callable[[], Any], userIds : Optional[np.ndarray] = None):
+        result = self.get(key, userIds)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result
+
+    # 按访问时间从旧到新删除，直到总大小不超过maxBytes
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.npz'):
+                os.remove(entry.path)
@@ -0,0 +1,116 @@
+# 均匀网格空间索引
+# 条目按所在网格排序存放，同一行网格的编号连续，矩形查询对每一行做一次二分查找，
+# 不需要为每个网格建立容器，百万级条目也只占两个整数数组
+
+from typing import Optional
+
+import numpy as np
+
+class SpatialGrid:
+    # xs、ys为条目坐标，ids为条目编号（默认为下标），同一编号可以出现多次（例如管线经过的多个网格）
+    def __init__(self, cellSize : float, xs : np.ndarray, ys : np.ndarray, ids : Optional[np.ndarray] = None):
+        if cellSize <= 0:
+            raise ValueError('网格尺寸必须为正数')
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        self.cellSize = float(cellSize)
+        self.x0 = float(xs.min()) if len(xs) else 0.0
+        self.y0 = float(ys.min()) if len(ys) else 0.0
+        cx = self._cell(xs, self.x0)
+        cy = self._cell(ys, self.y0)
+        self.cols = int(cx.max()) + 1 if len(cx) else 1
+        self.rows = int(cy.max()) + 1 if len(cy) else 1
+        keys = cy * self.cols + cx
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        ids = np.arange(len(xs), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.ids = ids[order]
+
+    def _cell(self, v : np.ndarray, origin : float) -> np.ndarray:
+        return np.floor((v - origin) / self.cellSize).astype(np.int64)
+
+    # 线段按网格尺寸采样后登记到经过的每个网格，长线段不会因为两端都在视野外而漏查
+    # 采样总数超过maxEntries时加倍网格尺寸，线段相对网格很长时也不会耗尽内存
+    @classmethod
+    def from_segments(
+        cls,
+        cellSize : float,
+        ax : np.ndarray,
+        ay : np.ndarray,
+        bx : np.ndarray,
+        by : np.ndarray,
+        maxEntries : int = 1 << 23
+    ) -> 'SpatialGrid':
+        ax, ay, bx, by = (np.asarray(v, dtype=np.float64) for v in (ax, ay, bx, by))
+        length = np.hypot(bx - ax, by - ay)
+        while True:
+            steps = np.ceil(length / (cellSize / 2)).astype(np.int64) + 1
+            if steps.sum() <= max(maxEntries, 2 * len(steps)):
+                break
+            cellSize *= 2
+        ids = np.repeat(np.arange(len(ax), dtype=np.int64), steps)
+        # 每条线段内的采样参数 0 ... 1
+        start = np.cumsum(steps) - steps
+        t = (np.arange(len(ids)) - np.repeat(start, steps)) / np.repeat(np.maximum(steps - 1, 1), steps)
+        xs = ax[ids] + (bx - ax)[ids] * t
+        ys = ay[ids] + (by - ay)[ids] * t
+        grid = cls(cellSize, xs, ys, ids)
+        # 稳定排序后同一网格内的编号保持递增，同一线段的重复采样相邻，只保留一条
+        keep = np.ones(len(grid.keys), dtype=bool)
+        keep[1:] = (grid.keys[1:] != grid.keys[:-1]) | (grid.ids[1:] != grid.ids[:-1])
+        grid.keys, grid.ids = grid.keys[keep], grid.ids[keep]
+        return grid
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # 与矩形 [x0, x1] × [y0, y1] 相交的网格中的全部条目编号（去重）
+    def query(self, x0 : float, y0 : float, x1 : float, y1 : float) -> np.ndarray:
+        c0 = max(int(np.floor((x0 - self.x0) / self.cellSize)), 0)
+        c1 = min(int(np.floor((x1 - self.x0) / self.cellSize)), self.cols - 1)
+        r0 = max(int(np.floor((y0 - self.y0) / self.cellSize)), 0)
+        r1 = min(int(np.floor((y1 - self.y0) / self.cellSize)), self.rows - 1)
+        if c0 > c1 or r0 > r1 or not len(self.keys):
+            return np.zeros(0, dtype=np.int64)
+        rows = np.arange(r0, r1 + 1, dtype=np.int64) * self.cols
+        lo = np.searchsorted(self.keys, rows + c0, side='left')
+        hi = np.searchsorted(self.keys, rows + c1, side='right')
+        hits = [self.ids[a:b] for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+        return np.unique(np.concatenate(hits)) if hits else np.zeros(0, dtype=np.int64)
+
+    # 每个查询点在radius范围内最近的条目，返回 (编号, 距离)，范围内没有条目时编号为-1、距离为inf
+    # 网格尺寸不小于radius时只需检查所在网格及周围8个网格；条目坐标由xs、ys按编号给出
+    def nearest(self, qx : np.ndarray, qy : np.ndarray, radius : float, xs : np.ndarray, ys : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if radius > self.cellSize:
+            raise ValueError('查找半径不能大于网格尺寸')
+        qx = np.asarray(qx, dtype=np.float64)
+        qy = np.asarray(qy, dtype=np.float64)
+        best = np.full(len(qx), -1, dtype=np.int64)
+        bestDist = np.full(len(qx), np.inf)
+        cx = self._cell(qx, self.x0)
+        cy = self._cell(qy, self.y0)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                ncx, ncy = cx + dx, cy + dy
+                valid = (ncx >= 0) & (ncx < self.cols) & (ncy >= 0) & (ncy < self.rows)
+                keys = np.where(valid, ncy * self.cols + ncx, -1)
+                lo = np.searchsorted(self.keys, keys, side='left')
+                hi = np.where(valid, np.searchsorted(self.keys, keys, side='right'), lo)
+                counts = hi - lo
+                if not counts.any():
+                    continue
+                # 展开为 (查询点, 候选条目) 对
+                query = np.repeat(np.arange(len(qx)), counts)
+                pos = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+                cand = self.ids[pos]
+                dist = np.hypot(xs[cand] - qx[query], ys[cand] - qy[query])
+                # 每个查询点取本轮最近的候选
+                order = np.lexsort((dist, query))
+                query, cand, dist = query[order], cand[order], dist[order]
+                first = np.ones(len(query), dtype=bool)
+                first[1:] = query[1:] != query[:-1]
+                query, cand, dist = query[first], cand[first], dist[first]
+                better = (dist <= radius) & (dist < bestDist[query])
+                best[query[better]] = cand[better]
+                bestDist[query[better]] = dist[better]
+        return best, bestDist
@@ -0,0 +1,420 @@
+# 供气充足性评估：在失效场景下用最大流检查气源储藏量能否满足用户用气量
+# 超级源点 -> 气源（容量为储藏量），管线双向（容量为管线输送能力），用户 -> 超级汇点（容量为用气量）。
+# 同一批样本中相同的存活子图只算一次，跨批次的最大流结果按 (分量, 分量内的失效元件) 缓存
+
+from typing import Optional, Sequence
+from dataclasses import dataclass
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from NetworkModel import NetworkModel
+from ReliabilityEngine import MonteCarloEngine
+
+# 统计量只含求和与平方和，可以按分片合并
+@dataclass
+class AdequacyResult:
+    userIds : np.ndarray  # 用户ID（地图中的节点编号）
+    demand : np.ndarray  # 每个用户的用气量
+    samples : int
+    unservedSum : np.ndarray  # 每个用户的缺供量之和
+    unservedSumSq : np.ndarray  # 每个用户的缺供量平方和
+    shortCount : np.ndarray  # 每个用户出现缺供的样本数
+
+    @classmethod
+    def empty(cls, userIds : np.ndarray, demand : np.ndarray) -> 'AdequacyResult':
+        U = len(userIds)
+        return cls(userIds, demand, 0, np.zeros(U), np.zeros(U), np.zeros(U, dtype=np.int64))
+
+    def merge(self, other : 'AdequacyResult') -> 'AdequacyResult':
+        return AdequacyResult(
+            userIds=self.userIds,
+            demand=self.demand,
+            samples=self.samples + other.samples,
+            unservedSum=self.unservedSum + other.unservedSum,
+            unservedSumSq=self.unservedSumSq + other.unservedSumSq,
+            shortCount=self.shortCount + other.shortCount
+        )
+
+    # 期望缺供量
+    @property
+    def expectedUnserved(self) -> np.ndarray:
+        return self.unservedSum / self.samples
+
+    @property
+    def expectedUnservedStderr(self) -> np.ndarray:
+        mean = self.expectedUnserved
+        var = (self.unservedSumSq - self.samples * mean * mean) / max(self.samples - 1, 1)
+        return np.sqrt(np.maximum(var, 0.0) / self.samples)
+
+    # 缺供概率
+    @property
+    def shortProbability(self) -> np.ndarray:
+        return self.shortCount / self.samples
+
+    # 系统期望缺供量
+    @property
+    def totalExpectedUnserved(self) -> float:
+        return float(self.unservedSum.sum() / self.samples)
+
+# 残量网络上的Dinic最大流，弧成对存放，a ^ 1为a的反向弧
+class _Dinic:
+    def __init__(self, nodeCount : int, tails : list[int], heads : list[int]):
+        self.n = nodeCount
+        self.to = heads
+        self.adj : list[list[int]] = [[] for _ in range(nodeCount)]
+        for a, u in enumerate(tails):
+            self.adj[u].append(a)
+
+    # cap为残量，原地修改
+    def max_flow(self, cap : list[float], s : int, t : int) -> float:
+        total = 0.0
+        while True:
+            level = self._levels(cap, s)
+            if level[t] < 0:
+                return total
+            ptr = [0] * self.n
+            while True:
+                f = self._augment(cap, level, ptr, s, t)
+                if not f:
+                    break
+                total += f
+
+    def _levels(self, cap : list[float], s : int) -> list[int]:
+        level = [-1] * self.n
+        level[s] = 0
+        queue = deque([s])
+        adj, to = self.adj, self.to
+        while queue:
+            u = queue.popleft()
+            for a in adj[u]:
+                v = to[a]
+                if cap[a] > 0 and level[v] < 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level
+
+    # 在分层图上找一条增广路，走不通的点剪掉
+    def _augment(self, cap : list[float], level : list[int], ptr : list[int], s : int, t : int) -> float:
+        adj, to = self.adj, self.to
+        path : list[int] = []
+        u = s
+        while True:
+            if u == t:
+                f = min(cap[a] for a in path)
+                for a in path:
+                    cap[a] -= f
+                    cap[a ^ 1] += f
+                return f
+            arcs = adj[u]
+            while ptr[u] < len(arcs):
+                a = arcs[ptr[u]]
+                if cap[a] > 0 and level[to[a]] == level[u] + 1:
+                    break
+                ptr[u] += 1
+            else:
+                if not path:
+                    return 0.0
+                level[u] = -1
+                a = path.pop()
+                u = to[a ^ 1]
+                ptr[u] += 1
+                continue
+            path.append(a)
+            u = to[a]
+
+# 完好管网中的一个连通分量上的流网络
+# 各分量之间没有管线，最大流可以逐个分量独立求解；失效场景只影响含有失效元件的分量
+class _FlowComponent:
+    def __init__(self, nodes : list[int], comps : list[int], users : list[int], tails : list[int], heads : list[int], caps : list[float]):
+        self.comps = comps  # 分量内的元件（全局编号），与compArcs一一对应
+        self.users = users  # 分量内的用户在userNodes中的位置，与userArcs一一对应
+        self.s, self.t = len(nodes), len(nodes) + 1
+        self.dinic = _Dinic(len(nodes) + 2, tails, heads)
+        self.cap0 = caps
+        self.compArcs : list[int] = []
+        self.userArcs : list[int] = []
+
+    # 完好状态下的最大流；之后每个失效场景都从这份流出发
+    def prepare(self, demand : np.ndarray) -> None:
+        self.capBase = list(self.cap0)
+        self.dinic.max_flow(self.capBase, self.s, self.t)
+        self.baseShort = self._short(self.capBase, demand)
+
+    # 缺供量，只保存非零项：(userNodes中的位置, 缺供量)
+    def _short(self, cap : list[float], demand : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        users = np.asarray(self.users, dtype=np.int64)
+        served = np.array([self.cap0[a] - cap[a] for a in self.userArcs])
+        short = demand[users] - served
+        keep = short > 1e-9 * np.maximum(demand[users], 1.0)
+        return users[keep], short[keep]
+
+    # 在残量网络中把x的流量从u送到v（BFS找到v就停），返回是否全部送到
+    def _reroute(self, cap : list[float], u : int, v : int, x : float) -> bool:
+        adj, to = self.dinic.adj, self.dinic.to
+        while x > 1e-12:
+            prev = {u: -1}
+            queue = deque([u])
+            while queue and v not in prev:
+                w = queue.popleft()
+                for a in adj[w]:
+                    if cap[a] > 1e-12 and to[a] not in prev:
+                        prev[to[a]] = a
+                        queue.append(to[a])
+            if v not in prev:
+                return False
+            path, w = [], v
+            while w != u:
+                a = prev[w]
+                path.append(a)
+                w = to[a ^ 1]
+            f = min(x, min(cap[a] for a in path))
+            for a in path:
+                cap[a] -= f
+                cap[a ^ 1] += f
+            x -= f
+        return True
+
+    # failed为分量内失效元件的下标（对应self.comps）
+    # 去掉失效的弧后，弧尾多出、弧头缺少的流量改走附近绕过它的路径；全部绕通时流量值与完好状态相同，
+    # 而失效只会让最大流变小，所以仍是最大流，不需要全局增广。绕不通时才从头运行Dinic
+    def solve(self, failed : list[int], demand : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        cap = list(self.capBase)
+        cut = []
+        for k in failed:
+            a = self.compArcs[k]
+            for b in (a, a ^ 1):
+                if cap[b] < self.cap0[b]:
+                    cut.append((self.dinic.to[b ^ 1], self.dinic.to[b], self.cap0[b] - cap[b]))
+            cap[a] = cap[a ^ 1] = 0.0
+        # 失效元件上没有流量，完好状态下的流仍然可行，也仍然最大
+        if not cut:
+            return self.baseShort
+        if all(self._reroute(cap, u, v, x) for u, v, x in cut):
+            return self._short(cap, demand)
+        cap = list(self.cap0)
+        for k in failed:
+            a = self.compArcs[k]
+            cap[a] = cap[a ^ 1] = 0.0
+        self.dinic.max_flow(cap, self.s, self.t)
+        return self._short(cap, demand)
+
+class SupplyAdequacy:
+    # pipeCapacity为None表示管线输送能力不受限，此时最大流退化为每个存活连通分量内
+    # min(气源储藏量之和, 用气量之和)，可以整批向量化计算，缺供量在分量内按用气量比例分摊；
+    # 给出管线容量时按完好管网的连通分量分别求最大流，每个分量从完好状态下的流出发做局部修补，
+    # 缓存的键只含该分量内的失效元件
+    def __init__(self, model : NetworkModel, pipeCapacity : Optional[Sequence[float]] = None, memoSize : int = 4096):
+        self.model = model
+        self.engine = MonteCarloEngine.from_model(model)
+        self.gasNodes = model.gasNodes
+        self.userNodes = model.userNodes
+        self.userIds = model.nodeIds[self.userNodes]
+        self.supply = model.current[self.gasNodes].astype(np.float64)
+        self.demand = model.current[self.userNodes].astype(np.float64)
+        self.pipeCapacity = None if pipeCapacity is None else np.asarray(pipeCapacity, dtype=np.float64)
+        self.memoSize = memoSize
+        self._memo : OrderedDict[tuple[int, bytes], tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        if self.pipeCapacity is not None:
+            self._build_flow_network()
+
+    # ---------------- Dinic ----------------
+
+    def _build_flow_network(self) -> None:
+        model = self.model
+        N = model.nodeCount
+        G = len(self.gasNodes)
+        src, dst = model.src.tolist(), model.dst.tolist()
+        # 完好管网的连通分量
+        parent = list(range(N))
+
+        def find(u):
+            while parent[u] != u:
+                parent[u] = parent[parent[u]]
+                u = parent[u]
+            return u
+
+        for u, v in zip(src, dst):
+            ru, rv = find(u), find(v)
+            if ru != rv:
+                parent[ru] = rv
+        roots = [find(u) for u in range(N)]
+        groups : dict[int, list[int]] = {}
+        for u, r in enumerate(roots):
+            groups.setdefault(r, []).append(u)
+        label = {r: i for i, r in enumerate(groups)}
+        # 元件编号与引擎一致：先气源后管线；compOwner为元件所在分量，compLocal为它在分量内的下标
+        compNodes = self.gasNodes.tolist() + src
+        self._compOwner = np.array([label[roots[u]] for u in compNodes], dtype=np.int64)
+        self._compLocal = np.zeros(len(compNodes), dtype=np.int64)
+        users = {u: i for i, u in enumerate(self.userNodes.tolist())}
+        self._flows : list[Optional[_FlowComponent]] = []
+        members : list[list[int]] = [[] for _ in groups]
+        for c, owner in enumerate(self._compOwner.tolist()):
+            self._compLocal[c] = len(members[owner])
+            members[owner].append(c)
+        for (root, nodes), comps in zip(groups.items(), members):
+            local = {u: i for i, u in enumerate(nodes)}
+            compUsers = [users[u] for u in nodes if u in users]
+            if not compUsers:
+                self._flows.append(None)
+                continue
+            s, t = len(nodes), len(nodes) + 1
+            tails, heads, caps = [], [], []
+
+            def pair(u, v, c, back):
+                tails.extend((u, v))
+                heads.extend((v, u))
+                caps.extend((c, back))
+                return len(tails) - 2
+
+            compArcs = []
+            for c in comps:
+                if c < G:
+                    compArcs.append(pair(s, local[self.gasNodes[c]], self.supply[c], 0.0))
+                else:
+                    cap = float(self.pipeCapacity[c - G])
+                    compArcs.append(pair(local[src[c - G]], local[dst[c - G]], cap, cap))
+            userArcs = [pair(local[self.userNodes[i]], t, float(self.demand[i]), 0.0) for i in compUsers]
+            flow = _FlowComponent(nodes, comps, compUsers, tails, heads, caps)
+            flow.compArcs, flow.userArcs = compArcs, userArcs
+            flow.prepare(self.demand)
+            self._flows.append(flow)
+
+    # 一个失效场景（元件的布尔向量）的缺供量，各分量的结果拼起来
+    def _solve_flow(self, failed : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        comps = np.flatnonzero(failed)
+        owners = self._compOwner[comps]
+        idx, val = [], []
+        for k, flow in enumerate(self._flows):
+            if flow is None:
+                continue
+            local = self._compLocal[comps[owners == k]]
+            if not len(local):
+                i, v = flow.baseShort
+            else:
+                key = (k, local.tobytes())
+                if key in self._memo:
+                    self._memo.move_to_end(key)
+                    i, v = self._memo[key]
+                else:
+                    i, v = flow.solve(local.tolist(), self.demand)
+                    self._memo[key] = (i, v)
+                    if len(self._memo) > self.memoSize:
+                        self._memo.popitem(last=False)
+            idx.append(i)
+            val.append(v)
+        if not idx:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.concatenate(idx), np.concatenate(val)
+
+    def _unserved_flow(self, failures : np.ndarray, unique : np.ndarray, inverse : np.ndarray) -> np.ndarray:
+        out = np.zeros((len(unique), len(self.userNodes)))
+        for i, row in enumerate(unique):
+            idx, val = self._solve_flow(np.unpackbits(row, count=failures.shape[1]).astype(bool))
+            out[i, idx] = val
+        return out[inverse]
+
+    # ---------------- 管线不限容量 ----------------
+
+    # 在存活管线上传播最小节点编号得到连通分量标号（节点 × 样本）
+    # 标号总是同一分量内编号更小的节点，每轮扫描后做一次指针跳跃 labels = labels[labels] 加速收敛
+    def _component_labels(self, pipeAlive : np.ndarray) -> np.ndarray:
+        n = pipeAlive.shape[1]
+        labels = np.repeat(np.arange(self.model.nodeCount, dtype=np.int32)[:, None], n, axis=1)
+        big = np.iinfo(np.int32).max
+        order = self.engine._arcs
+        while True:
+            before = labels.copy()
+            for u, v, p in order:
+                cand = np.where(pipeAlive[p], labels[u], big)
+                labels[v] = np.minimum(labels[v], cand)
+            labels = np.take_along_axis(labels, labels, axis=0)
+            if np.array_equal(before, labels):
+                return labels
+            order = order[::-1]
+
+    def _unserved_components(self, failures : np.ndarray) -> np.ndarray:
+        n = failures.shape[0]
+        N = self.model.nodeCount
+        G = len(self.gasNodes)
+        labels = self._component_labels(~failures[:, G:].T)
+        # 每个样本单独编号：样本k的分量c记为 k * N + c
+        offset = (np.arange(n, dtype=np.int64) * N)[None, :]
+        gasKey = (labels[self.gasNodes] + offset).ravel()
+        userKey = (labels[self.userNodes] + offset).ravel()
+        supply = np.bincount(gasKey, weights=(self.supply[:, None] * ~failures[:, :G].T).ravel(), minlength=n * N)
+        demand = np.bincount(userKey, weights=np.repeat(self.demand, n), minlength=n * N)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(demand > 0, np.minimum(supply / demand, 1.0), 1.0)
+        return (self.demand[:, None] * (1.0 - ratio[userKey].reshape(len(self.userNodes), n))).T
+
+    # ---------------- 对外接口 ----------------
+
+    # 根据失效场景矩阵（样本 × 元件）计算每个用户的缺供量（样本 × 用户）
+    def unserved(self, failures : np.ndarray) -> np.ndarray:
+        failures = np.asarray(failures, dtype=bool)
+        if not len(failures):
+            return np.zeros((0, len(self.userNodes)))
+        # 相同的失效场景对应相同的存活子图，只算一次
+        packed = np.packbits(failures, axis=1)
+        unique, first, inverse = np.unique(packed, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        if self.pipeCapacity is not None:
+            return self._unserved_flow(failures, unique, inverse)
+        return self._unserved_components(failures[first])[inverse]
+
+    def run_shard(self, seedSeq : np.random.SeedSequence, n : int, batch : int = 1024) -> AdequacyResult:
+        rng = np.random.default_rng(seedSeq)
+        result = AdequacyResult.empty(self.userIds, self.demand)
+        done = 0
+        while done < n:
+            m = min(batch, n - done)
+            short = self.unserved(self.engine.sample_failures(rng, m))
+            result = result.merge(AdequacyResult(
+                userIds=self.userIds,
+                demand=self.demand,
+                samples=m,
+                unservedSum=short.sum(axis=0),
+                unservedSumSq=(short * short).sum(axis=0),
+                shortCount=(short > 0).sum(axis=0)
+            ))
+            done += m
+        return result
+
+    # 分片方式与MonteCarloEngine.run相同，同一seed下结果可复现
+    def run(self, samples : int, seed : Optional[int] = None, batch : int = 1024, shardSize : int = 1 << 14) -> AdequacyResult:
+        result = AdequacyResult.empty(self.userIds, self.demand)
+        for seedSeq, n in self.engine._shards(samples, seed, shardSize):
+            result = result.merge(self.run_shard(seedSeq, n, batch))
+        return result
+
+# 基准：side × side的网格管网（默认约5000个节点、1万条管线），管线失效率0.05，给出管线容量
+# 用法：python SupplyAdequacy.py [网格边长] [样本数]
+if __name__ == '__main__':
+    import sys
+    import time
+
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 71
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rng = np.random.default_rng(0)
+    N = side * side
+    grid = np.arange(N).reshape(side, side)
+    category = np.ones(N, dtype=np.int8)
+    category[rng.choice(N, max(N // 500, 2), replace=False)] = 0
+    current = np.where(category == 0, 4000.0, rng.uniform(0.5, 2.0, N))
+    src = np.concatenate((grid[:, :-1].ravel(), grid[:-1, :].ravel()))
+    dst = np.concatenate((grid[:, 1:].ravel(), grid[1:, :].ravel()))
+    benchModel = NetworkModel(
+        x=(np.arange(N) % side) * 100.0, y=(np.arange(N) // side) * 100.0, category=category, current=current,
+        errorp=np.where(category == 0, 0.02, np.nan), src=src, dst=dst, bindIds=np.tile(np.array([3, 2], dtype=np.int8), (len(src), 1)),
+        distance=np.full(len(src), 100.0), pipeErrorp=np.full(len(src), 0.05)
+    )
+    start = time.perf_counter()
+    adequacy = SupplyAdequacy(benchModel, rng.uniform(200, 600, len(src)))
+    prepared = time.perf_counter()
+    result = adequacy.run(samples, seed=1)
+    done = time.perf_counter()
+    print(f'{N}个节点、{len(src)}条管线，构建流网络 {prepared - start:.2f} s')
+    print(f'{samples}个样本 {done - prepared:.2f} s，每个样本 {(done - prepared) / samples * 1000:.1f} ms')
+    print(f'系统期望缺供量 {result.totalExpectedUnserved:.4g}')
@@ -0,0 +1,159 @@
+# 按时间步推进的产气/用气仿真
+# GasAgent.productor、UserAgent.consumer都是随时间变化的速率函数，这里对整个时间轴一次性求值，
+# 得到 时间 × 主体 的数组；每一步的储气量递推在全部主体上向量化进行
+
+from typing import Optional, Sequence, Callable
+from dataclasses import dataclass
+
+import numpy as np
+
+from AbstractObject import GasAgent, UserAgent, PipeAgent
+from ReliabilityEngine import _agent_id
+
+# 一族参数化曲线：func(t, *params)对时间和参数都是向量化的，
+# 调用时t形如(T, 1)，每个参数形如(1, k)，返回(T, k)，例如
+# CurveFamily(lambda t, a, w: a * np.sin(w * t)).bind(100, 0.26)
+class CurveFamily:
+    def __init__(self, func : Callable[..., np.ndarray]):
+        self.func = func
+
+    # 绑定一组参数，得到可以直接放进productor/consumer的单条曲线
+    def bind(self, *params : float) -> '_BoundCurve':
+        return _BoundCurve(self, params)
+
+class _BoundCurve:
+    def __init__(self, family : CurveFamily, params : tuple):
+        self.family = family
+        self.params = params
+
+    # 单独调用时仍然是普通的随时间变化的函数
+    def __call__(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        values = self.family.func(t.reshape(-1, 1), *(np.full((1, 1), p, dtype=np.float64) for p in self.params))
+        return np.broadcast_to(values, (t.size, 1)).reshape(t.shape)
+
+# 对一组曲线在时间轴t上求值，返回(T, 主体数)
+# 同一个函数对象只调用一次；同一族的参数化曲线合并成一次调用；
+# 不支持数组输入的普通函数才退化为逐时刻调用
+def evaluate_curves(funcs : Sequence[Optional[Callable]], t : np.ndarray) -> np.ndarray:
+    t = np.asarray(t, dtype=np.float64)
+    out = np.zeros((len(t), len(funcs)))
+    groups : dict[int, list[int]] = {}
+    families : dict[int, list[int]] = {}
+    for i, f in enumerate(funcs):
+        if f is None:
+            continue
+        if isinstance(f, _BoundCurve):
+            families.setdefault(id(f.family), []).append(i)
+        else:
+            groups.setdefault(id(f), []).append(i)
+    for cols in families.values():
+        family = funcs[cols[0]].family
+        params = np.array([funcs[i].params for i in cols], dtype=np.float64).reshape(len(cols), -1)
+        values = family.func(t[:, None], *(params[None, :, j] for j in range(params.shape[1])))
+        out[:, cols] = np.broadcast_to(values, (len(t), len(cols)))
+    for cols in groups.values():
+        f = funcs[cols[0]]
+        try:
+            values = np.asarray(f(t), dtype=np.float64)
+            if values.ndim and values.shape[0] != len(t):
+                raise ValueError
+        except (TypeError, ValueError):
+            values = np.array([f(x) for x in t.tolist()], dtype=np.float64)
+        out[:, cols] = np.broadcast_to(values.reshape(len(t), -1) if values.ndim else values, (len(t), len(cols)))
+    return out
+
+@dataclass
+class TimeSeriesResult:
+    t : np.ndarray  # 时间轴，(T,)
+    gasIds : np.ndarray
+    userIds : np.ndarray
+    production : np.ndarray  # 各气源每步产气量，(T, 气源数)
+    demand : np.ndarray  # 各用户每步用气量，(T, 用户数)
+    delivered : np.ndarray  # 管网每步输送给各用户的气量，(T, 用户数)
+    unserved : np.ndarray  # 各用户每步缺气量，(T, 用户数)
+    gasStock : np.ndarray  # 气源储气量，(T + 1, 气源数)，第0行为初始值
+    userStock : np.ndarray  # 用户储气量，(T + 1, 用户数)
+
+    # 每个用户在整个时段内的满足率
+    @property
+    def satisfaction(self) -> np.ndarray:
+        total = self.demand.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total > 0, 1.0 - self.unserved.sum(axis=0) / total, 1.0)
+
+class TimeSimulation:
+    # 每一步：
+    # 1. 气源储气量加上本步产气量
+    # 2. 用户先用自己的储气，不够的部分向管网取气
+    # 3. 同一连通分量内的气源按储气量比例出气，缺口按需求比例分摊给用户
+    # 用户之间不互相供气（见AbstractObject中的规定），用户储气只供自己使用
+    def __init__(
+        self,
+        gasAgents : Sequence[GasAgent],
+        userAgents : Sequence[UserAgent],
+        pipeAgents : Sequence[PipeAgent]
+    ):
+        self.gasAgents = list(gasAgents)
+        self.userAgents = list(userAgents)
+        index = {a.ID: i for i, a in enumerate([*self.gasAgents, *self.userAgents])}
+        if len(index) != len(self.gasAgents) + len(self.userAgents):
+            raise ValueError('节点ID重复')
+        # 连通分量标号，只在构建时算一次
+        parent = list(range(len(index)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for pipe in pipeAgents:
+            a, b = (index[_agent_id(x)] for x in pipe.targets)
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[ra] = rb
+        roots = np.array([find(i) for i in range(len(index))], dtype=np.int64)
+        _, labels = np.unique(roots, return_inverse=True)
+        G = len(self.gasAgents)
+        self.gasComp = labels[:G]
+        self.userComp = labels[G:]
+        self.compCount = int(labels.max()) + 1 if len(labels) else 0
+
+    def run(self, horizon : float, dt : float = 1.0, t0 : float = 0.0) -> TimeSeriesResult:
+        t = t0 + dt * np.arange(int(round(horizon / dt)))
+        T, G, U, K = len(t), len(self.gasAgents), len(self.userAgents), self.compCount
+        production = evaluate_curves([g.productor for g in self.gasAgents], t) * dt
+        demand = np.maximum(evaluate_curves([u.consumer for u in self.userAgents], t) * dt, 0.0)
+        gasStock = np.empty((T + 1, G))
+        userStock = np.empty((T + 1, U))
+        gasStock[0] = [g.init for g in self.gasAgents]
+        userStock[0] = [u.init for u in self.userAgents]
+        delivered = np.empty((T, U))
+        unserved = np.empty((T, U))
+        gasComp, userComp = self.gasComp, self.userComp
+        for k in range(T):
+            stock = np.maximum(gasStock[k] + production[k], 0.0)
+            fromOwn = np.minimum(userStock[k], demand[k])
+            need = demand[k] - fromOwn
+            supply = np.bincount(gasComp, weights=stock, minlength=K)
+            want = np.bincount(userComp, weights=need, minlength=K)
+            drawn = np.minimum(supply, want)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                share = np.where(want > 0, drawn / want, 0.0)
+                left = np.where(supply > 0, 1.0 - drawn / supply, 0.0)
+            delivered[k] = need * share[userComp]
+            unserved[k] = need - delivered[k]
+            gasStock[k + 1] = stock * left[gasComp]
+            userStock[k + 1] = userStock[k] - fromOwn
+        return TimeSeriesResult(
+            t=t,
+            gasIds=np.array([g.ID for g in self.gasAgents]),
+            userIds=np.array([u.ID for u in self.userAgents]),
+            production=production,
+            demand=demand,
+            delivered=delivered,
+            unserved=unserved,
+            gasStock=gasStock,
+            userStock=userStock
+        )
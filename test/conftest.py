@@ -0,0 +1,6 @@
+# 模块都平铺在仓库根目录，测试从test/下运行时把根目录加入搜索路径
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,149 @@
+# CutSetAnalyzer与ConnectivityIndex.lost_users的对照测试：小管网上穷举失效状态和元件子集
+
+from collections import deque
+from itertools import combinations, product
+
+import numpy as np
+import pytest
+
+from ConnectivityIndex import ConnectivityIndex
+from CutSetAnalyzer import CutSetAnalyzer
+
+# 随机小管网，管线键为('p', 下标)，气源键为节点本身；返回 (索引, 失效率, 气源, 管线 -> 两端)
+def random_index(rng : np.random.Generator, n : int, m : int, gasCount : int) -> tuple[ConnectivityIndex, dict, set, dict]:
+    index = ConnectivityIndex()
+    gas = set(rng.choice(n, gasCount, replace=False).tolist())
+    errorp = {}
+    for u in range(n):
+        index.add_node(u, u in gas)
+        if u in gas:
+            errorp[u] = float(rng.uniform(0.05, 0.3))
+    pipes = {}
+    for i in range(m):
+        a = int(rng.integers(0, n))
+        b = int((a + rng.integers(1, n)) % n)
+        pipes[('p', i)] = (a, b)
+        index.add_pipe(('p', i), a, b)
+        errorp[('p', i)] = float(rng.uniform(0.05, 0.3))
+    return index, errorp, gas, pipes
+
+# 去掉failed中的管线和气源后，从其余气源出发能到达的节点
+def reached(n : int, gas : set, pipes : dict, failed : set) -> set:
+    adjacency = {u: [] for u in range(n)}
+    for key, (a, b) in pipes.items():
+        if key not in failed:
+            adjacency[a].append(b)
+            adjacency[b].append(a)
+    seen = {g for g in gas if g not in failed}
+    queue = deque(seen)
+    while queue:
+        for v in adjacency[queue.popleft()]:
+            if v not in seen:
+                seen.add(v)
+                queue.append(v)
+    return seen
+
+# 用户所在连通分量内的全部元件（管线和气源）
+def component_elements(n : int, gas : set, pipes : dict, user : int) -> list:
+    nodes = reached(n, {user}, pipes, set())
+    return [key for key, (a, b) in pipes.items() if a in nodes] + sorted(g for g in gas if g in nodes)
+
+def exact_unavailability(n, gas, pipes, errorp, user) -> float:
+    elements = component_elements(n, gas, pipes, user)
+    total = 0.0
+    for state in product((False, True), repeat=len(elements)):
+        failed = {e for e, f in zip(elements, state) if f}
+        if user not in reached(n, gas, pipes, failed):
+            p = 1.0
+            for e, f in zip(elements, state):
+                p *= errorp[e] if f else 1.0 - errorp[e]
+            total += p
+    return total
+
+def minimal_cuts(n, gas, pipes, user, maxOrder) -> set:
+    elements = component_elements(n, gas, pipes, user)
+    cuts = set()
+    for k in range(1, maxOrder + 1):
+        for subset in combinations(elements, k):
+            failed = set(subset)
+            if user in reached(n, gas, pipes, failed):
+                continue
+            # 单调：去掉任何一个元件都能恢复供气即为最小割集
+            if all(user in reached(n, gas, pipes, failed - {e}) for e in subset):
+                cuts.add(frozenset(subset))
+    return cuts
+
+@pytest.mark.parametrize('seed', range(30))
+def test_bounds_contain_exact(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(3, 8))
+    index, errorp, gas, pipes = random_index(rng, n, m=int(rng.integers(2, 10)), gasCount=int(rng.integers(1, 3)))
+    analyzer = CutSetAnalyzer(index, errorp.__getitem__, maxOrder=2)
+    result = analyzer.analyze_all()
+    assert set(result) == set(range(n)) - gas
+    for user, u in result.items():
+        exact = exact_unavailability(n, gas, pipes, errorp, user)
+        assert u.lower - 1e-12 <= exact <= u.upper + 1e-12
+        assert u.lower <= u.estimate + 1e-12 and u.estimate <= u.upper + 1e-12
+
+@pytest.mark.parametrize('seed', range(30))
+def test_cut_sets_are_all_minimal_cuts(seed):
+    rng = np.random.default_rng(1000 + seed)
+    n = int(rng.integers(3, 8))
+    index, errorp, gas, pipes = random_index(rng, n, m=int(rng.integers(2, 11)), gasCount=int(rng.integers(1, 3)))
+    analyzer = CutSetAnalyzer(index, errorp.__getitem__, maxOrder=2)
+    for user in set(range(n)) - gas:
+        if not reached(n, gas, pipes, set()) >= {user}:
+            # 完好时就没有气
+            assert analyzer.unavailability(user).upper == 1.0
+            continue
+        assert set(analyzer.cut_sets(user)) == minimal_cuts(n, gas, pipes, user, 2)
+
+def test_full_order_is_exact():
+    # 阶数不小于元件数时全部最小割集都被枚举，割集不多时估计值就是精确值
+    rng = np.random.default_rng(5)
+    for _ in range(10):
+        n = 4
+        index, errorp, gas, pipes = random_index(rng, n, m=4, gasCount=1)
+        analyzer = CutSetAnalyzer(index, errorp.__getitem__, maxOrder=len(pipes) + len(gas))
+        for user, u in analyzer.analyze_all().items():
+            exact = exact_unavailability(n, gas, pipes, errorp, user)
+            assert u.exact
+            assert u.estimate == pytest.approx(exact, abs=1e-12)
+            assert u.upper == pytest.approx(exact, abs=1e-12)
+
+@pytest.mark.parametrize('seed', range(20))
+def test_lost_users_matches_bfs(seed):
+    rng = np.random.default_rng(2000 + seed)
+    n = int(rng.integers(4, 12))
+    index, _, gas, pipes = random_index(rng, n, m=int(rng.integers(3, 14)), gasCount=int(rng.integers(1, 3)))
+    users = set(range(n)) - gas
+    before = reached(n, gas, pipes, set())
+    for _ in range(20):
+        failedPipes = {key for key in pipes if rng.random() < 0.25}
+        failedGas = {g for g in gas if rng.random() < 0.2}
+        after = reached(n, gas, pipes, failedPipes | failedGas)
+        expected = {u for u in users if u in before and u not in after}
+        assert index.lost_users(failedPipes, failedGas) == expected
+
+def test_lost_users_after_edits():
+    # 增删管线和节点之后，增量维护的索引与重新构建的索引结果相同
+    rng = np.random.default_rng(77)
+    n = 10
+    index, _, gas, pipes = random_index(rng, n, m=14, gasCount=2)
+    for step in range(30):
+        if pipes and rng.random() < 0.5:
+            key = list(pipes)[int(rng.integers(len(pipes)))]
+            index.remove_pipe(key)
+            del pipes[key]
+        else:
+            a = int(rng.integers(n))
+            b = int((a + rng.integers(1, n)) % n)
+            pipes[('q', step)] = (a, b)
+            index.add_pipe(('q', step), a, b)
+        users = set(range(n)) - gas
+        before = reached(n, gas, pipes, set())
+        assert index.unsupplied_users() == users - before
+        failedPipes = {key for key in pipes if rng.random() < 0.3}
+        after = reached(n, gas, pipes, failedPipes)
+        assert index.lost_users(failedPipes) == {u for u in users if u in before and u not in after}
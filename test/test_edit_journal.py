@@ -0,0 +1,118 @@
+# EditJournal的恢复：快照 + 日志回放，与手工推演的结果比较
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt5')
+from PyQt5.QtCore import QCoreApplication
+
+from EditJournal import EditJournal
+from NetworkModel import NetworkModel, GAS, USER
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+def node(nodeId : int, x : float, y : float, category : str, current : float, errorp : float = None) -> dict:
+    record = {'id': nodeId, 'x': x, 'y': y, 'category': category, 'current': current}
+    if errorp is not None:
+        record['errorp'] = errorp
+    return record
+
+def write_lines(fp : str, entries : list) -> None:
+    with open(fp, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(entry if isinstance(entry, str) else json.dumps(entry))
+            f.write('\n')
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = EditJournal(None, str(tmp_path))
+    yield journal
+    journal.close()
+
+def test_restore_without_files(journal):
+    assert not journal.exists()
+    assert journal.restore() == {'version': '1.0.0', 'nodes': [], 'pipes': []}
+    assert journal.seq == 0
+
+def test_restore_snapshot_and_journal(journal):
+    # 快照包含序号1~3的记录：节点1、2、3和管线1-2、2-3
+    snapshot = NetworkModel.from_columns(
+        [(0.0, 0.0, GAS, 100.0, 0.1), (10.0, 0.0, USER, 5.0, np.nan), (20.0, 0.0, USER, 6.0, np.nan)],
+        [(0, 1, 0, 1, 10.0, 0.01), (1, 2, 2, 3, 10.0, 0.02)],
+        nodeIds=[1, 2, 3]
+    )
+    snapshot.to_file(journal.snapshotPath, meta={'journalSeq': 3})
+    write_lines(journal.journalPath, [
+        # 已包含在快照中，跳过
+        {'seq': 2, 'op': 'delNode', 'id': 1},
+        # 缺少序号，无法判断，跳过
+        {'op': 'delNode', 'id': 2},
+        {'seq': 4, 'op': 'addNode', **node(4, 30.0, 5.0, 'User', 7.0)},
+        {'seq': 5, 'op': 'link', 'a': 3, 'b': 4, 'bindIds': [1, 0], 'distance': 11.0, 'errorp': 0.03},
+        {'seq': 6, 'op': 'moveNode', 'id': 2, 'x': 12.0, 'y': -3.0},
+        {'seq': 7, 'op': 'setNode', 'id': 4, 'current': 8.0},
+        # 管线按两端节点查找，与方向无关
+        {'seq': 8, 'op': 'setPipe', 'a': 4, 'b': 3, 'errorp': 0.05},
+        {'seq': 9, 'op': 'unlink', 'a': 2, 'b': 1},
+        # 字段不全，跳过
+        {'seq': 10, 'op': 'link', 'a': 1},
+        # 引用不存在的节点，忽略
+        {'seq': 11, 'op': 'moveNode', 'id': 99, 'x': 0.0, 'y': 0.0},
+        {'seq': 12, 'op': 'delNode', 'id': 1},
+        # 崩溃时写了一半的最后一行
+        '{"seq": 13, "op": "delNode", "i'
+    ])
+    data = journal.restore()
+    assert journal.seq == 12
+    nodes = {n['id']: n for n in data['nodes']}
+    assert set(nodes) == {2, 3, 4}
+    assert (nodes[2]['x'], nodes[2]['y']) == (12.0, -3.0)
+    assert nodes[4] == node(4, 30.0, 5.0, 'User', 8.0)
+    pipes = {frozenset((p['a'], p['b'])): p for p in data['pipes']}
+    assert set(pipes) == {frozenset((2, 3)), frozenset((3, 4))}
+    assert pipes[frozenset((3, 4))]['errorp'] == 0.05
+    assert pipes[frozenset((2, 3))]['errorp'] == 0.02
+    # 恢复的结构可以直接建成模型
+    model = NetworkModel.from_dict(data)
+    assert model.nodeCount == 3 and model.pipeCount == 2
+
+def test_clear_drops_snapshot_contents(journal):
+    NetworkModel.from_columns([(0.0, 0.0, GAS, 1.0, 0.1)], [], nodeIds=[5]).to_file(journal.snapshotPath, meta={'journalSeq': 1})
+    write_lines(journal.journalPath, [
+        {'seq': 2, 'op': 'clear'},
+        {'seq': 3, 'op': 'addNode', **node(0, 1.0, 2.0, 'Gas', 50.0, 0.2)}
+    ])
+    data = journal.restore()
+    assert data['nodes'] == [node(0, 1.0, 2.0, 'Gas', 50.0, 0.2)] and data['pipes'] == []
+
+def test_records_written_by_writer(tmp_path):
+    journal = EditJournal(None, str(tmp_path))
+    journal.start()
+    journal.record('addNode', **node(0, 0.0, 0.0, 'Gas', 10.0, 0.1))
+    journal.record('addNode', **node(1, 5.0, 5.0, 'User', 2.0))
+    # 同一节点的连续移动只保留最后一次
+    journal.record_move(1, 6.0, 6.0)
+    journal.record_move(1, 7.0, 8.0)
+    journal.record('link', a=0, b=1, bindIds=[0, 1], distance=3.0, errorp=0.01)
+    journal.close()
+    with open(journal.journalPath, encoding='utf-8') as f:
+        ops = [json.loads(line)['op'] for line in f]
+    assert ops == ['addNode', 'addNode', 'moveNode', 'link']
+
+    again = EditJournal(None, str(tmp_path))
+    data = again.restore()
+    again.close()
+    assert again.seq == 4
+    nodes = {n['id']: n for n in data['nodes']}
+    assert (nodes[1]['x'], nodes[1]['y']) == (7.0, 8.0)
+    assert data['pipes'] == [{'a': 0, 'b': 1, 'bindIds': [0, 1], 'distance': 3.0, 'errorp': 0.01}]
+
+def test_quarantine(journal):
+    write_lines(journal.journalPath, [{'seq': 1, 'op': 'clear'}])
+    moved = journal.quarantine()
+    assert moved == [journal.journalPath + '.bad']
+    assert not journal.exists() and os.path.exists(moved[0])
+    assert journal.seq == 0
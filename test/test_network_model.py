@@ -0,0 +1,111 @@
+# NetworkModel的文件往返与ResultCache.network_digest的不变性
+
+import os
+
+import numpy as np
+import pytest
+
+from NetworkModel import NetworkModel, BINARY_COLUMNS, GAS, USER
+from ResultCache import network_digest
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '12.mj5')
+
+# 随机管网，节点编号不连续、不从0开始
+def random_model(rng : np.random.Generator, n : int, m : int) -> NetworkModel:
+    category = np.where(rng.random(n) < 0.3, GAS, USER)
+    nodes = [
+        (float(x), float(y), int(c), float(cur), float(q) if c == GAS else np.nan)
+        for x, y, c, cur, q in zip(
+            rng.uniform(-5e4, 5e4, n), rng.uniform(-5e4, 5e4, n), category, rng.uniform(1, 1000, n), rng.uniform(0, 0.5, n)
+        )
+    ]
+    src = rng.integers(0, n, m)
+    dst = (src + rng.integers(1, n, m)) % n
+    pipes = [
+        (int(a), int(b), int(pa), int(pb), float(d), float(q))
+        for a, b, pa, pb, d, q in zip(src, dst, rng.integers(0, 4, m), rng.integers(0, 4, m), rng.uniform(1, 500, m), rng.uniform(0, 0.2, m))
+    ]
+    ids = rng.choice(10 * n, n, replace=False) + 7
+    return NetworkModel.from_columns(nodes, pipes, version='1.1.0', nodeIds=ids.tolist())
+
+def assert_same(a : NetworkModel, b : NetworkModel) -> None:
+    assert a.version == b.version
+    for name, dtype in BINARY_COLUMNS:
+        x, y = getattr(a, name), getattr(b, name)
+        assert x.shape == y.shape, name
+        assert np.array_equal(x, y, equal_nan=np.dtype(dtype).kind == 'f'), name
+
+@pytest.mark.parametrize('suffix', ['.mjb', '.mj5'])
+@pytest.mark.parametrize('seed', range(3))
+def test_round_trip(tmp_path, suffix, seed):
+    model = random_model(np.random.default_rng(seed), n=40, m=70)
+    fp = str(tmp_path / f'map{suffix}')
+    model.to_file(fp)
+    assert_same(model, NetworkModel.from_file(fp))
+
+def test_binary_without_mmap(tmp_path):
+    model = random_model(np.random.default_rng(3), n=10, m=12)
+    fp = str(tmp_path / 'map.mjb')
+    model.to_binary(fp)
+    loaded = NetworkModel.from_binary(fp, mmap=False)
+    assert_same(model, loaded)
+    assert not isinstance(loaded.x, np.memmap)
+
+def test_empty_round_trip(tmp_path):
+    model = NetworkModel.from_columns([], [])
+    for suffix in ('.mjb', '.mj5'):
+        fp = str(tmp_path / f'empty{suffix}')
+        model.to_file(fp)
+        loaded = NetworkModel.from_file(fp)
+        assert loaded.nodeCount == loaded.pipeCount == 0
+
+def test_sample_map_round_trip(tmp_path):
+    model = NetworkModel.from_file(SAMPLE)
+    mjb = str(tmp_path / '12.mjb')
+    mj5 = str(tmp_path / '12.mj5')
+    model.to_file(mjb)
+    NetworkModel.from_file(mjb).to_file(mj5)
+    again = NetworkModel.from_file(mj5)
+    assert_same(model, again)
+    assert model.to_dict() == again.to_dict()
+
+def test_not_binary_map(tmp_path):
+    fp = tmp_path / 'bad.mjb'
+    fp.write_bytes(b'{"nodes": []}')
+    with pytest.raises(ValueError):
+        NetworkModel.from_binary(str(fp))
+
+def test_failed_write_keeps_original(tmp_path):
+    model = random_model(np.random.default_rng(4), n=5, m=4)
+    fp = str(tmp_path / 'map.mj5')
+    model.to_file(fp)
+    before = open(fp, encoding='utf-8').read()
+    broken = random_model(np.random.default_rng(5), n=5, m=4)
+    broken.version = object()  # 无法序列化
+    with pytest.raises(TypeError):
+        broken.to_file(fp)
+    assert open(fp, encoding='utf-8').read() == before
+    assert os.listdir(tmp_path) == ['map.mj5']
+
+def test_digest_ignores_order_and_labels():
+    rng = np.random.default_rng(6)
+    model = random_model(rng, n=20, m=30)
+    data = model.to_dict()
+    digest = network_digest(data)
+    # 打乱节点和管线的顺序、交换管线两端、整体重新编号
+    relabel = {node['id']: 1000 + i for i, node in enumerate(data['nodes'])}
+    nodes = [dict(node, id=relabel[node['id']]) for node in data['nodes']][::-1]
+    pipes = []
+    for pipe in data['pipes']:
+        pipe = dict(pipe, a=relabel[pipe['a']], b=relabel[pipe['b']])
+        if rng.random() < 0.5:
+            pipe = dict(
+                pipe, a=pipe['b'], b=pipe['a'], ax=pipe['bx'], ay=pipe['by'], bx=pipe['ax'], by=pipe['ay'],
+                bindIds=pipe['bindIds'][::-1]
+            )
+        pipes.append(pipe)
+    rng.shuffle(pipes)
+    assert network_digest({'nodes': nodes, 'pipes': pipes}) == digest
+    # 改动任何一个属性都会改变哈希
+    changed = dict(data, pipes=[dict(data['pipes'][0], errorp=data['pipes'][0]['errorp'] + 0.01), *data['pipes'][1:]])
+    assert network_digest(changed) != digest
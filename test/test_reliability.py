@@ -0,0 +1,154 @@
+# MonteCarloEngine的对照测试：小管网上穷举全部失效状态得到精确值，与按位打包的传播、抽样和重要性抽样比较
+
+from collections import deque
+from itertools import product
+
+import numpy as np
+import pytest
+
+from ReliabilityEngine import MonteCarloEngine
+
+# 随机小管网：n个节点，其中gasCount个气源，m条管线（允许平行管线，不含自环）
+def random_engine(rng : np.random.Generator, n : int, m : int, gasCount : int, low : float = 0.05, high : float = 0.4) -> MonteCarloEngine:
+    gas = rng.choice(n, gasCount, replace=False)
+    users = np.setdiff1d(np.arange(n), gas)
+    src = rng.integers(0, n, m)
+    dst = (src + rng.integers(1, n, m)) % n
+    return MonteCarloEngine(
+        nodeCount=n,
+        gasNodes=gas,
+        userNodes=users,
+        pipeSrc=src,
+        pipeDst=dst,
+        gasErrorp=rng.uniform(low, high, gasCount),
+        pipeErrorp=rng.uniform(low, high, m)
+    )
+
+# 逐个节点BFS：从完好的气源出发，只走完好的管线，返回每个用户是否有气
+def supplied_bfs(engine : MonteCarloEngine, failed : np.ndarray) -> np.ndarray:
+    G = len(engine.gasNodes)
+    adjacency = [[] for _ in range(engine.nodeCount)]
+    for p, (a, b) in enumerate(zip(engine.pipeSrc.tolist(), engine.pipeDst.tolist())):
+        if not failed[G + p]:
+            adjacency[a].append(b)
+            adjacency[b].append(a)
+    seen = [False] * engine.nodeCount
+    queue = deque()
+    for i, g in enumerate(engine.gasNodes.tolist()):
+        if not failed[i] and not seen[g]:
+            seen[g] = True
+            queue.append(g)
+    while queue:
+        for v in adjacency[queue.popleft()]:
+            if not seen[v]:
+                seen[v] = True
+                queue.append(v)
+    return np.array([seen[u] for u in engine.userNodes.tolist()])
+
+# 穷举全部2^C个失效状态，返回 (状态矩阵, 各状态在errorp下的概率, 各状态下每个用户是否有气)
+def enumerate_states(engine : MonteCarloEngine, errorp : np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    q = engine.errorp if errorp is None else errorp
+    states = np.array(list(product((False, True), repeat=engine.componentCount)))
+    prob = np.prod(np.where(states, q, 1.0 - q), axis=1)
+    supplied = np.array([supplied_bfs(engine, s) for s in states])
+    return states, prob, supplied
+
+@pytest.mark.parametrize('seed', range(6))
+def test_supplied_matrix_matches_bfs(seed):
+    rng = np.random.default_rng(seed)
+    # 节点多、管线少时会出现不连通的部分和孤立的用户
+    engine = random_engine(rng, n=int(rng.integers(4, 12)), m=int(rng.integers(3, 16)), gasCount=int(rng.integers(1, 3)))
+    # 样本数不是64的倍数，检查末尾不完整的字
+    failures = rng.random((150, engine.componentCount)) < 0.3
+    expected = np.array([supplied_bfs(engine, row) for row in failures])
+    assert np.array_equal(engine.supplied_matrix(failures), expected)
+
+def test_supplied_matrix_detour():
+    # 一条长链加一条把末端接回气源的管线：链上断开后要反方向绕路才能送到
+    n = 8
+    src = list(range(n - 1)) + [n - 1]
+    dst = list(range(1, n)) + [0]
+    engine = MonteCarloEngine(n, [0], list(range(1, n)), src, dst, [0.0], [0.1] * n)
+    failures = np.zeros((n, engine.componentCount), dtype=bool)
+    for k in range(n):
+        failures[k, 1 + k] = True
+    assert engine.supplied_matrix(failures).all()
+
+@pytest.mark.parametrize('seed', range(3))
+def test_run_matches_exact_unavailability(seed):
+    rng = np.random.default_rng(100 + seed)
+    engine = random_engine(rng, n=6, m=8, gasCount=2)
+    _, prob, supplied = enumerate_states(engine)
+    exact = prob @ supplied
+    samples = 1 << 15
+    result = engine.run(samples, seed=seed)
+    tolerance = 5 * np.sqrt(exact * (1 - exact) / samples) + 1e-12
+    assert np.all(np.abs(result.probability - exact) <= tolerance)
+
+def test_sampler_marginals_and_padding():
+    rng = np.random.default_rng(7)
+    engine = MonteCarloEngine(2, [0], [1], [0, 0, 0, 0], [1, 1, 1, 1], [0.0], [1e-3, 0.3, 0.5, 1.0])
+    n = 20000
+    packed = engine._sample_packed(rng, n)
+    bits = np.unpackbits(packed.view(np.uint8), axis=1).astype(bool)
+    # 补齐到整字的位必须为0，否则会被当成失效样本
+    assert not bits[:, n:].any()
+    bits = bits[:, :n]
+    q = engine.errorp
+    freq = bits.mean(axis=1)
+    assert np.all(np.abs(freq - q) <= 5 * np.sqrt(q * (1 - q) / n) + 1e-12)
+    assert not bits[0].any() and bits[-1].all()
+    # 不同元件相互独立
+    for i, j in ((1, 3), (2, 3)):
+        expected = q[i] * q[j]
+        assert abs((bits[i] & bits[j]).mean() - expected) <= 5 * np.sqrt(expected * (1 - expected) / n)
+
+def test_sample_failures_shape():
+    rng = np.random.default_rng(8)
+    engine = random_engine(rng, n=5, m=6, gasCount=1)
+    failures = engine.sample_failures(rng, 77)
+    assert failures.shape == (77, engine.componentCount) and failures.dtype == bool
+
+@pytest.mark.parametrize('seed', range(3))
+def test_importance_weights_exact(seed):
+    # 穷举偏置分布下的全部状态：Σ p'(x)·w(x) = 1，Σ p'(x)·w(x)·I(停气) 等于精确不可用度
+    rng = np.random.default_rng(200 + seed)
+    engine = random_engine(rng, n=6, m=7, gasCount=2, low=0.01, high=0.1)
+    bias = np.clip(rng.uniform(1, 5, engine.componentCount) * engine.errorp, engine.errorp, 0.5)
+    states, biased, supplied = enumerate_states(engine, bias)
+    _, prob, _ = enumerate_states(engine)
+    const, delta = engine._likelihood_terms(bias)
+    w = np.exp(const + states @ delta)
+    assert np.allclose(w, prob / biased)
+    assert biased @ w == pytest.approx(1.0)
+    assert np.allclose(biased * w @ ~supplied, prob @ ~supplied)
+
+def test_importance_sampling_unbiased():
+    rng = np.random.default_rng(300)
+    engine = random_engine(rng, n=6, m=8, gasCount=2, low=0.01, high=0.05)
+    _, prob, supplied = enumerate_states(engine)
+    exact = prob @ ~supplied
+    bias = np.clip(4 * engine.errorp, engine.errorp, 0.5)
+    result = engine.run_importance(1 << 15, seed=1, bias=bias)
+    assert np.all(np.abs(result.unavailability - exact) <= 5 * result.stderr + 1e-12)
+    # 权重的均值为1
+    n = result.samples
+    mean = result.weightSum / n
+    var = result.weightSumSq / n - mean * mean
+    assert abs(mean - 1.0) <= 5 * np.sqrt(var / n)
+
+def test_iterate_prefix_matches_run():
+    rng = np.random.default_rng(9)
+    engine = random_engine(rng, n=7, m=9, gasCount=2)
+    results = list(engine.iterate(seed=11, maxSamples=3 << 13))
+    assert [r.samples for r in results] == [1 << 13, 2 << 13, 3 << 13]
+    for r in results:
+        assert np.array_equal(r.supplied, engine.run(r.samples, seed=11).supplied)
+
+def test_iterate_ignores_unreachable_users():
+    # 节点2与气源不连通，节点3只经过必然失效的管线连到气源：供气概率恒为0，不能拖住收敛判据
+    engine = MonteCarloEngine(4, [0], [1, 2, 3], [0, 0], [1, 3], [0.0], [0.01, 1.0])
+    assert engine.reachable.tolist() == [True, False, False]
+    *_, last = engine.iterate(seed=1, relError=0.05, maxSamples=1 << 22)
+    assert last.samples < 1 << 22
+    assert last.supplied[1] == last.supplied[2] == 0
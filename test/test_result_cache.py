@@ -0,0 +1,97 @@
+# ResultCache：写入读出、按用户编号重排、损坏文件和LRU淘汰
+
+import os
+import time
+from dataclasses import fields
+
+import numpy as np
+import pytest
+
+from ReliabilityEngine import MonteCarloEngine, ReliabilityResult
+from ResultCache import ResultCache
+
+def sample_result(seed : int = 0) -> ReliabilityResult:
+    engine = MonteCarloEngine(5, [0], [1, 2, 3, 4], [0, 1, 1, 0], [1, 2, 3, 4], [0.1], [0.2, 0.3, 0.1, 0.4], userIds=[11, 12, 13, 14])
+    return engine.run(4096, seed=seed)
+
+def assert_same(a, b) -> None:
+    assert type(a) is type(b)
+    for f in fields(a):
+        assert np.array_equal(getattr(a, f.name), getattr(b, f.name)), f.name
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path))
+
+def test_put_get(cache):
+    result = sample_result()
+    key = cache.key('digest', 'MonteCarloEngine.iterate', {'seed': 1})
+    assert cache.get(key) is None
+    cache.put(key, result)
+    assert_same(cache.get(key), result)
+    assert cache.get(key).samples == 4096
+
+def test_key_depends_on_everything():
+    keys = {
+        ResultCache.key('d1', 's'),
+        ResultCache.key('d2', 's'),
+        ResultCache.key('d1', 't'),
+        ResultCache.key('d1', 's', {'seed': 1}),
+        ResultCache.key('d1', 's', {'seed': 2}),
+    }
+    assert len(keys) == 5
+    assert ResultCache.key('d', 's', {'a': 1, 'b': 2}) == ResultCache.key('d', 's', {'b': 2, 'a': 1})
+
+def test_reorder_by_user_ids(cache):
+    result = sample_result()
+    cache.put('k', result)
+    order = np.array([3, 0, 2, 1])
+    loaded = cache.get('k', result.userIds[order])
+    assert np.array_equal(loaded.userIds, result.userIds[order])
+    assert np.array_equal(loaded.supplied, result.supplied[order])
+    assert loaded.lostSum == result.lostSum
+    # 编号集合不同（例如同一管网重新编号）视为未命中
+    assert cache.get('k', np.array([11, 12, 13, 99])) is None
+    assert cache.get('k', np.array([11, 12, 13])) is None
+
+def test_corrupt_file_is_dropped(cache):
+    cache.put('k', sample_result())
+    path = os.path.join(cache.root, 'k.npz')
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert cache.get('k') is None
+    assert not os.path.exists(path)
+
+def test_unsupported_type(cache):
+    with pytest.raises(ValueError):
+        cache.put('k', {'samples': 1})
+
+def test_get_or_compute(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return sample_result()
+
+    first = cache.get_or_compute('k', compute)
+    second = cache.get_or_compute('k', compute)
+    assert len(calls) == 1
+    assert_same(first, second)
+
+def test_lru_eviction(tmp_path):
+    result = sample_result()
+    probe = ResultCache(str(tmp_path / 'probe'))
+    probe.put('x', result)
+    size = os.path.getsize(os.path.join(probe.root, 'x.npz'))
+    cache = ResultCache(str(tmp_path / 'cache'), maxBytes=2 * size + size // 2)
+    cache.put('a', result)
+    cache.put('b', result)
+    # 按修改时间排序，拉开时间差避免同一时刻
+    past = time.time() - 100
+    os.utime(os.path.join(cache.root, 'a.npz'), (past, past))
+    os.utime(os.path.join(cache.root, 'b.npz'), (past + 1, past + 1))
+    # 访问a之后b成为最久未用的
+    assert cache.get('a') is not None
+    cache.put('c', result)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
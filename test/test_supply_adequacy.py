@@ -0,0 +1,84 @@
+# SupplyAdequacy的对照测试：每个失效场景单独求最大流（Edmonds-Karp），比较总缺供量
+
+from collections import deque
+
+import numpy as np
+import pytest
+
+from NetworkModel import NetworkModel, GAS, USER
+from SupplyAdequacy import SupplyAdequacy
+
+def random_model(rng : np.random.Generator, n : int, m : int) -> NetworkModel:
+    category = np.where(np.arange(n) < max(1, n // 4), GAS, USER)
+    nodes = [(float(i), 0.0, int(c), float(cur), 0.2 if c == GAS else np.nan) for i, (c, cur) in enumerate(zip(category, rng.uniform(1, 10, n)))]
+    src = rng.integers(0, n, m)
+    dst = (src + rng.integers(1, n, m)) % n
+    return NetworkModel.from_columns(nodes, [(int(a), int(b), 0, 1, 1.0, 0.2) for a, b in zip(src, dst)])
+
+# 总缺供量 = 总用气量 - 最大流；管线双向、容量cap
+def unserved_total(model : NetworkModel, capacity : np.ndarray, failed : np.ndarray) -> float:
+    N = model.nodeCount
+    s, t = N, N + 1
+    cap = np.zeros((N + 2, N + 2))
+    gas, users = model.gasNodes, model.userNodes
+    for i, g in enumerate(gas):
+        if not failed[i]:
+            cap[s, g] += model.current[g]
+    for p, (a, b) in enumerate(zip(model.src, model.dst)):
+        if not failed[len(gas) + p]:
+            cap[a, b] += capacity[p]
+            cap[b, a] += capacity[p]
+    for u in users:
+        cap[u, t] += model.current[u]
+    flow = 0.0
+    while True:
+        prev = {s: None}
+        queue = deque([s])
+        while queue and t not in prev:
+            u = queue.popleft()
+            for v in np.flatnonzero(cap[u] > 1e-12):
+                if v not in prev:
+                    prev[v] = u
+                    queue.append(v)
+        if t not in prev:
+            return float(model.current[users].sum() - flow)
+        path, v = [], t
+        while prev[v] is not None:
+            path.append((prev[v], v))
+            v = prev[v]
+        f = min(cap[u, v] for u, v in path)
+        for u, v in path:
+            cap[u, v] -= f
+            cap[v, u] += f
+        flow += f
+
+@pytest.mark.parametrize('seed', range(5))
+def test_capacity_limited_matches_max_flow(seed):
+    rng = np.random.default_rng(seed)
+    model = random_model(rng, n=10, m=16)
+    capacity = rng.uniform(0.5, 8, model.pipeCount)
+    adequacy = SupplyAdequacy(model, capacity)
+    failures = rng.random((60, len(model.gasNodes) + model.pipeCount)) < 0.25
+    unserved = adequacy.unserved(failures)
+    demand = model.current[model.userNodes]
+    assert np.all(unserved >= -1e-9) and np.all(unserved <= demand + 1e-9)
+    expected = [unserved_total(model, capacity, row) for row in failures]
+    assert np.allclose(unserved.sum(axis=1), expected, atol=1e-9)
+
+@pytest.mark.parametrize('seed', range(3))
+def test_unlimited_capacity_matches_flow(seed):
+    # 不限容量的向量化算法与容量足够大的最大流结果相同
+    rng = np.random.default_rng(10 + seed)
+    model = random_model(rng, n=12, m=18)
+    failures = rng.random((80, len(model.gasNodes) + model.pipeCount)) < 0.25
+    free = SupplyAdequacy(model).unserved(failures)
+    capacity = np.full(model.pipeCount, 1e6)
+    expected = [unserved_total(model, capacity, row) for row in failures]
+    assert np.allclose(free.sum(axis=1), expected, atol=1e-6)
+
+def test_run_reproducible():
+    model = random_model(np.random.default_rng(20), n=8, m=12)
+    adequacy = SupplyAdequacy(model, np.full(model.pipeCount, 5.0))
+    a, b = adequacy.run(2048, seed=3), adequacy.run(2048, seed=3)
+    assert np.array_equal(a.unservedSum, b.unservedSum)
+    assert np.array_equal(a.userIds, model.nodeIds[model.userNodes])